@@ -0,0 +1,176 @@
+import atexit
+import threading
+import time
+
+from ..compat import queue
+from .base import AbstractCompliance
+
+
+# Sink con il thread di scrittura attivo, chiusi all'uscita
+# dell'interprete se la sessione non l'ha già fatto
+_open_sinks = set()
+
+
+@atexit.register
+def _close_open_sinks():
+    for sink in list(_open_sinks):
+        sink.close()
+
+
+# Segnala al thread di scrittura di terminare
+_STOP = object()
+
+
+class AsyncCompliance(AbstractCompliance):
+    """
+    AsyncCompliance registra le transazioni di un altro componente
+    Compliance (ad es. ExampleCompliance) in un thread separato, così
+    che la latenza del disco non ritardi il ciclo degli eventi di una
+    sessione live.
+
+    record_trade si limita ad inserire il FillEvent in una coda
+    limitata a max_queue elementi; il thread di scrittura preleva
+    fino a batch_size transazioni alla volta, le passa a
+    compliance.record_trade e chiama compliance.flush() al termine di
+    ogni blocco. Se la coda è piena record_trade attende che si
+    liberi un posto (backpressure), contando l'attesa in blocked.
+
+    flush() attende che tutte le transazioni registrate siano state
+    scritte, mentre close() (chiamato da TradingSession al termine
+    della sessione) termina anche il thread e chiude il componente
+    sottostante: quando restituisce, ogni transazione è su disco.
+    Un errore del thread di scrittura viene stampato e quindi
+    sollevato da close().
+
+    Le statistiche del sink (profondità della coda, latenza di
+    scrittura, ecc.) sono restituite da metrics().
+    """
+
+    def __init__(self, compliance, max_queue=10000, batch_size=1000):
+        self.compliance = compliance
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._error = None
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.blocked = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.last_write_latency = 0.0
+        self.max_write_latency = 0.0
+        self.total_write_latency = 0.0
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="compliance-writer"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        _open_sinks.add(self)
+
+    def record_trade(self, fill):
+        """
+        Inserisce il FillEvent nella coda del thread di scrittura,
+        attendendo se la coda è piena.
+        """
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(fill)
+        except queue.Full:
+            self.blocked += 1
+            self._queue.put(fill)
+        self.recorded += 1
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def _write(self, batch):
+        """
+        Scrive un blocco di transazioni (nel thread di scrittura).
+        """
+        start = time.perf_counter()
+        try:
+            for fill in batch:
+                self.compliance.record_trade(fill)
+            self.compliance.flush()
+        except Exception as e:
+            self.errors += 1
+            if self._error is None:
+                self._error = e
+                print("Compliance writer failed: %s" % e)
+        latency = time.perf_counter() - start
+        self.written += len(batch)
+        self.batches += 1
+        self.last_write_latency = latency
+        self.total_write_latency += latency
+        if latency > self.max_write_latency:
+            self.max_write_latency = latency
+
+    def _run(self):
+        get = self._queue.get
+        get_nowait = self._queue.get_nowait
+        while True:
+            batch = [get()]
+            try:
+                while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                    batch.append(get_nowait())
+            except queue.Empty:
+                pass
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._write(batch)
+            for i in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """
+        Attende che tutte le transazioni registrate siano state scritte.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        Scrive le transazioni in coda, termina il thread di scrittura
+        e chiude il componente Compliance sottostante.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        _open_sinks.discard(self)
+        if hasattr(self.compliance, "close"):
+            self.compliance.close()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def metrics(self):
+        """
+        Restituisce un dizionario con le statistiche correnti del
+        sink: transazioni registrate e scritte, profondità corrente e
+        massima della coda, attese per coda piena, errori e latenza
+        (in secondi) della scrittura dei blocchi.
+        """
+        batches = self.batches
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "blocked": self.blocked,
+            "batches": batches,
+            "errors": self.errors,
+            "last_write_latency": self.last_write_latency,
+            "avg_write_latency": (
+                self.total_write_latency / batches if batches else 0.0
+            ),
+            "max_write_latency": self.max_write_latency,
+        }
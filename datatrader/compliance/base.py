@@ -26,3 +26,18 @@ class AbstractCompliance(object):
             transazione che è stata appena eseguita.
         """
         raise NotImplementedError("Should implement record_trade()")
+
+    def flush(self):
+        """
+        Scrive le transazioni eventualmente memorizzate in un
+        buffer. Per default non fa nulla.
+        """
+        pass
+
+    def close(self):
+        """
+        Chiamato da TradingSession al termine della sessione (anche
+        in caso di errore) per scrivere le transazioni rimaste e
+        rilasciare le risorse, ad es. i file aperti.
+        """
+        self.flush()
@@ -1,18 +1,35 @@
 import datetime
 import os
-import csv
-from datatrader.price_parser import PriceParser
+import time
 
 from .base import AbstractCompliance
+from .trade_log import LOG_FORMATS
 
 
 class ExampleCompliance(AbstractCompliance):
     """
     Un modulo Compliance di base che scrive le transazioni
     in un file CSV nella directory di output.
+
+    Il file resta aperto per tutta la sessione e le transazioni
+    vengono accumulate in memoria, per essere scritte insieme
+    quando il buffer raggiunge max_rows righe o max_bytes byte,
+    oppure quando sono trascorsi flush_interval secondi dalla
+    scrittura precedente (controllati ad ogni transazione; None
+    disabilita il controllo). TradingSession chiama close() al
+    termine della sessione, anche in caso di eccezione; i log
+    rimasti aperti vengono comunque chiusi all'uscita
+    dell'interprete.
+
+    Con log_format="binary" le transazioni vengono scritte in un
+    file binario colonnare (si veda ColumnarTradeLog), da leggere
+    con read_trade_log.
     """
 
-    def __init__(self, config):
+    def __init__(
+        self, config, log_format="csv",
+        max_rows=1000, max_bytes=1 << 20, flush_interval=1.0
+    ):
         """
         Cancella l'esistente log dei trade per un giorno, lasciando
         solo le intestazioni in un CSV vuoto.
@@ -23,38 +40,54 @@ class ExampleCompliance(AbstractCompliance):
 
         """
         self.config = config
-        # Cancella il precedente file CSV
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        try:
+            log_class = LOG_FORMATS[log_format]
+        except KeyError:
+            raise ValueError(
+                "Unknown trade log format '%s', use one of %s" % (
+                    log_format, ", ".join(sorted(LOG_FORMATS))
+                )
+            )
+        # Cancella il precedente file
         today = datetime.datetime.utcnow().date()
-        self.csv_filename = "tradelog_" + today.strftime("%Y-%m-%d") + ".csv"
-
+        self.csv_filename = (
+            "tradelog_" + today.strftime("%Y-%m-%d") + log_class.extension
+        )
+        fname = os.path.expanduser(os.path.join(config.OUTPUT_DIR, self.csv_filename))
         try:
-            fname = os.path.expanduser(os.path.join(config.OUTPUT_DIR, self.csv_filename))
             os.remove(fname)
         except (IOError, OSError):
             print("No tradelog files to clean.")
 
         # Scrive l'header del nuovo file
-        fieldnames = [
-            "timestamp", "ticker",
-            "action", "quantity",
-            "exchange", "price",
-            "commission"
-        ]
-        fname = os.path.expanduser(os.path.join(self.config.OUTPUT_DIR, self.csv_filename))
-        with open(fname, 'a') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+        self.log = log_class(fname)
+        self.flush()
 
     def record_trade(self, fill):
         """
-        Aggiungi tutti i dettagli del FillEvent al log CSV dei trade.
-        """
-        fname = os.path.expanduser(os.path.join(self.config.OUTPUT_DIR, self.csv_filename))
-        with open(fname, 'a') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                fill.timestamp, fill.ticker,
-                fill.action, fill.quantity,
-                fill.exchange, PriceParser.display(fill.price, 4),
-                PriceParser.display(fill.commission, 4)
-            ])
+        Aggiungi tutti i dettagli del FillEvent al log dei trade.
+        """
+        log = self.log
+        log.append(fill)
+        if log.rows >= self.max_rows or log.nbytes >= self.max_bytes or (
+            self.flush_interval is not None and
+            time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Scrive nel file le transazioni nel buffer.
+        """
+        self.log.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Scrive le transazioni nel buffer e chiude il file.
+        """
+        self.log.close()
+        self._last_flush = time.monotonic()
@@ -0,0 +1,199 @@
+import atexit
+import csv
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from ..position_book import PositionBook, timestamp_ns
+from ..price_parser import PriceParser
+
+
+# Colonne del log dei trade, nell'ordine dei campi di FillEvent
+FIELDS = (
+    "timestamp", "ticker",
+    "action", "quantity",
+    "exchange", "price",
+    "commission"
+)
+
+# Log con righe nel buffer o file aperti, chiusi all'uscita
+# dell'interprete se la sessione non l'ha già fatto
+_open_logs = set()
+
+
+@atexit.register
+def _close_open_logs():
+    for log in list(_open_logs):
+        log.close()
+
+
+class CsvTradeLog(object):
+    """
+    CsvTradeLog scrive le transazioni in un file CSV, nello stesso
+    formato del log di ExampleCompliance, mantenendo il file aperto
+    per tutta la sessione. Le righe sono formattate in un buffer in
+    memoria e scritte nel file solo da flush().
+    """
+
+    extension = ".csv"
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.rows = 0
+        self._fd = None
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(FIELDS)
+
+    @property
+    def nbytes(self):
+        """
+        Dimensione (in caratteri) delle righe nel buffer.
+        """
+        return self._buffer.tell()
+
+    def append(self, fill):
+        self._writer.writerow([
+            fill.timestamp, fill.ticker,
+            fill.action, fill.quantity,
+            fill.exchange, PriceParser.display(fill.price, 4),
+            PriceParser.display(fill.commission, 4)
+        ])
+        self.rows += 1
+        _open_logs.add(self)
+
+    def flush(self):
+        """
+        Scrive nel file le righe del buffer.
+        """
+        if self.nbytes == 0:
+            return
+        if self._fd is None:
+            self._fd = open(self.filename, "a")
+            _open_logs.add(self)
+        self._fd.write(self._buffer.getvalue())
+        self._fd.flush()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self.rows = 0
+
+    def close(self):
+        """
+        Scrive le righe del buffer e chiude il file. Un successivo
+        append lo riapre in modalità append.
+        """
+        self.flush()
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+        _open_logs.discard(self)
+
+
+class ColumnarTradeLog(object):
+    """
+    ColumnarTradeLog scrive le transazioni in un file binario
+    colonnare: ogni flush() aggiunge al file un blocco di righe,
+    salvato come una sequenza di array .npy, uno per colonna
+    (timestamp in nanosecondi UTC, ticker, azione +1/-1, quantità,
+    exchange, prezzo e commissione in unità intere di PriceParser).
+
+    Rispetto al CSV non vi è alcuna formattazione dei valori e i
+    prezzi non vengono arrotondati. Il file si legge con
+    read_trade_log.
+    """
+
+    extension = ".bin"
+
+    # Stima dei byte per riga delle colonne numeriche
+    _row_bytes = 5 * 8
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.rows = 0
+        self.nbytes = 0
+        self._fd = None
+        self._columns = tuple([] for field in FIELDS)
+
+    def append(self, fill):
+        columns = self._columns
+        columns[0].append(timestamp_ns(fill.timestamp))
+        columns[1].append(fill.ticker)
+        columns[2].append(PositionBook.ACTIONS[fill.action])
+        columns[3].append(fill.quantity)
+        columns[4].append(fill.exchange)
+        columns[5].append(fill.price)
+        columns[6].append(fill.commission)
+        self.rows += 1
+        self.nbytes += self._row_bytes + 4 * (len(fill.ticker) + len(fill.exchange))
+        _open_logs.add(self)
+
+    def flush(self):
+        """
+        Scrive nel file le righe del buffer come un nuovo blocco.
+        """
+        if self.rows == 0:
+            return
+        if self._fd is None:
+            self._fd = open(self.filename, "ab")
+            _open_logs.add(self)
+        for field, values in zip(FIELDS, self._columns):
+            if field in ("ticker", "exchange"):
+                array = np.array(values, dtype=str)
+            else:
+                array = np.array(values, dtype=np.int64)
+            np.save(self._fd, array, allow_pickle=False)
+            del values[:]
+        self._fd.flush()
+        self.rows = 0
+        self.nbytes = 0
+
+    def close(self):
+        """
+        Scrive le righe del buffer e chiude il file. Un successivo
+        append lo riapre in modalità append.
+        """
+        self.flush()
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+        _open_logs.discard(self)
+
+
+LOG_FORMATS = {
+    "csv": CsvTradeLog,
+    "binary": ColumnarTradeLog,
+}
+
+
+def read_trade_log(filename):
+    """
+    Legge un log dei trade, CSV o binario, come DataFrame con le
+    colonne di FIELDS (prezzo e commissione in unità di
+    visualizzazione). Per il formato binario i timestamp sono in UTC.
+    """
+    if filename.endswith(CsvTradeLog.extension):
+        df = pd.read_csv(filename)
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        return df
+    blocks = []
+    size = os.path.getsize(filename)
+    with open(filename, "rb") as fd:
+        while fd.tell() < size:
+            blocks.append([
+                np.load(fd, allow_pickle=False) for field in FIELDS
+            ])
+    if len(blocks) == 0:
+        return pd.DataFrame(columns=list(FIELDS))
+    columns = [np.concatenate(arrays) for arrays in zip(*blocks)]
+    df = pd.DataFrame({
+        "timestamp": pd.to_datetime(columns[0], utc=True),
+        "ticker": columns[1].astype(object),
+        "action": np.where(columns[2] == 1, "BOT", "SLD"),
+        "quantity": columns[3],
+        "exchange": columns[4].astype(object),
+        "price": PriceParser.display_array(columns[5], 4),
+        "commission": PriceParser.display_array(columns[6], 4),
+    })
+    return df
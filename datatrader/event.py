@@ -2,8 +2,31 @@ from __future__ import print_function
 
 from enum import Enum
 
+import numpy as np
 
-EventType = Enum("EventType", "TICK BAR SIGNAL ORDER FILL SENTIMENT")
+from .price_parser import PriceParser
+
+
+EventType = Enum("EventType", "TICK BAR SIGNAL ORDER FILL SENTIMENT BAR_SLICE")
+
+
+# Tabella di ricerca dei periodi leggibili dall'uomo
+# per BarEvent, con chiave il numero di secondi
+PERIOD_READABLE = {
+    1: "1sec",
+    5: "5sec",
+    10: "10sec",
+    15: "15sec",
+    30: "30sec",
+    60: "1min",
+    300: "5min",
+    600: "10min",
+    900: "15min",
+    1800: "30min",
+    3600: "1hr",
+    86400: "1day",
+    604800: "1wk"
+}
 
 
 class Event(object):
@@ -11,7 +34,14 @@ class Event(object):
     Event è la classe base che fornisce un'interfaccia per tutti
     i successivi eventi (ereditati), che attiveranno ulteriori
     eventi nell'infrastruttura di trading.
+
+    Gli eventi usano __slots__ e memorizzano il proprio "type" come
+    attributo di classe, così che ogni istanza non abbia un __dict__:
+    nei backtest intraday vengono creati decine di milioni di eventi.
     """
+
+    __slots__ = ()
+
     @property
     def typename(self):
         return self.type.name
@@ -24,6 +54,11 @@ class TickEvent(Event):
     ticker e la migliore offerta e domanda associate alla
     parte superiore del libro degli ordini.
     """
+
+    __slots__ = ("ticker", "time", "bid", "ask")
+
+    type = EventType.TICK
+
     def __init__(self, ticker, time, bid, ask):
         """
         Inizializza il TickEvent.
@@ -34,7 +69,6 @@ class TickEvent(Event):
         bid - Il miglior prezzo di offerta al momento del tick.
         ask - Il miglior prezzo ask al momento del tick.
         """
-        self.type = EventType.TICK
         self.ticker = ticker
         self.time = time
         self.bid = bid
@@ -56,6 +90,14 @@ class BarEvent(Event):
     OHLCV del mercato, come sarebbe generato tramite
     fornitori di dati comuni come Yahoo Finance.
     """
+
+    __slots__ = (
+        "ticker", "time", "period", "open_price", "high_price",
+        "low_price", "close_price", "volume", "adj_close_price"
+    )
+
+    type = EventType.BAR
+
     def __init__(
         self, ticker, time, period,
         open_price, high_price, low_price,
@@ -81,7 +123,6 @@ class BarEvent(Event):
         parola in Python.
 
         """
-        self.type = EventType.BAR
         self.ticker = ticker
         self.time = time
         self.period = period
@@ -91,7 +132,10 @@ class BarEvent(Event):
         self.close_price = close_price
         self.volume = volume
         self.adj_close_price = adj_close_price
-        self.period_readable = self._readable_period()
+
+    @property
+    def period_readable(self):
+        return self._readable_period()
 
     def _readable_period(self):
         """
@@ -108,23 +152,8 @@ class BarEvent(Event):
         il periodo leggibile dall'uomo viene semplicemente
         passato dal punto, in secondi.
         """
-        lut = {
-            1: "1sec",
-            5: "5sec",
-            10: "10sec",
-            15: "15sec",
-            30: "30sec",
-            60: "1min",
-            300: "5min",
-            600: "10min",
-            900: "15min",
-            1800: "30min",
-            3600: "1hr",
-            86400: "1day",
-            604800: "1wk"
-        }
-        if self.period in lut:
-            return lut[self.period]
+        if self.period in PERIOD_READABLE:
+            return PERIOD_READABLE[self.period]
         else:
             return "%ssec" % str(self.period)
 
@@ -144,12 +173,134 @@ class BarEvent(Event):
         return str(self)
 
 
+class BarSliceEvent(Event):
+    """
+    Gestisce l'evento di ricezione di tutte le barre OHLCV
+    con lo stesso timestamp (una "sezione trasversale" del mercato),
+    trasmesse come un unico evento invece di un BarEvent per ticker.
+
+    I prezzi (già scalati da PriceParser) e i volumi sono array
+    NumPy int64 allineati con la lista "tickers", così che le
+    strategie possano elaborare l'intero universo in modo vettoriale.
+    """
+
+    __slots__ = (
+        "time", "period", "tickers", "open_price", "high_price",
+        "low_price", "close_price", "volume", "adj_close_price", "_index"
+    )
+
+    type = EventType.BAR_SLICE
+
+    def __init__(
+        self, time, period, tickers,
+        open_price, high_price, low_price,
+        close_price, volume, adj_close_price
+    ):
+        """
+        Inizializza il BarSliceEvent.
+
+        Parametri:
+        time - Il timestamp comune delle barre
+        period - Il periodo di tempo coperto dalle barre in secondi
+        tickers - La lista dei simboli ticker presenti nella sezione
+        open_price, high_price, low_price, close_price,
+        volume, adj_close_price - Array int64 con i valori delle
+            barre di ogni ticker, nello stesso ordine di "tickers"
+        """
+        self.time = time
+        self.period = period
+        self.tickers = tickers
+        self.open_price = open_price
+        self.high_price = high_price
+        self.low_price = low_price
+        self.close_price = close_price
+        self.volume = volume
+        self.adj_close_price = adj_close_price
+        self._index = None
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @property
+    def period_readable(self):
+        return PERIOD_READABLE.get(self.period, "%ssec" % str(self.period))
+
+    @property
+    def index(self):
+        """
+        Dizionario con la posizione di ogni ticker negli array.
+        """
+        if self._index is None:
+            self._index = dict(
+                (ticker, i) for i, ticker in enumerate(self.tickers)
+            )
+        return self._index
+
+    def prices(self, tickers, field="adj_close_price"):
+        """
+        Restituisce un array float64 con i prezzi (divisi per
+        PRICE_MULTIPLIER) della colonna "field" per i ticker
+        richiesti, nell'ordine indicato. I ticker assenti dalla
+        sezione hanno valore NaN.
+        """
+        values = getattr(self, field)
+        index = self.index
+        positions = np.array(
+            [index.get(ticker, -1) for ticker in tickers], dtype=np.int64
+        )
+        result = np.full(len(positions), np.nan)
+        found = positions >= 0
+        result[found] = values[positions[found]] / PriceParser.PRICE_MULTIPLIER
+        return result
+
+    def bar(self, ticker):
+        """
+        Restituisce il BarEvent del ticker indicato.
+        """
+        i = self.index[ticker]
+        return BarEvent(
+            ticker, self.time, self.period,
+            self.open_price.item(i), self.high_price.item(i),
+            self.low_price.item(i), self.close_price.item(i),
+            self.volume.item(i), self.adj_close_price.item(i)
+        )
+
+    def bars(self):
+        """
+        Genera i BarEvent di tutti i ticker della sezione, nell'ordine
+        in cui sarebbero stati trasmessi singolarmente.
+        """
+        for ticker in self.tickers:
+            yield self.bar(ticker)
+
+    def __str__(self):
+        return "Type: %s, Time: %s, Period: %s, Tickers: %s" % (
+            str(self.type), str(self.time),
+            str(self.period_readable), len(self.tickers)
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
 class SignalEvent(Event):
     """
     Gestisce l'evento di invio di un segnale da un oggetto strategia.
     Questo viene ricevuto da un oggetto Portfolio e su cui si agisce.
     """
-    def __init__(self, ticker, action, suggested_quantity=None):
+
+    __slots__ = (
+        "ticker", "action", "suggested_quantity", "order_type",
+        "limit_price", "stop_price", "take_profit", "stop_loss"
+    )
+
+    type = EventType.SIGNAL
+
+    def __init__(
+        self, ticker, action, suggested_quantity=None,
+        order_type="MKT", limit_price=None, stop_price=None,
+        take_profit=None, stop_loss=None
+    ):
         """
         Inizializza il SignalEvent.
 
@@ -160,19 +311,46 @@ class SignalEvent(Event):
             positivo che rappresenta una quantità assoluta suggerita
             di unità di un asset in cui eseguire la transazione,
             utilizzato da PositionSizer e RiskManager.
+        order_type, limit_price, stop_price, take_profit, stop_loss -
+            Il tipo e i prezzi dell'ordine da generare (si veda
+            OrderEvent), per default un ordine a mercato.
         """
-        self.type = EventType.SIGNAL
         self.ticker = ticker
         self.action = action
         self.suggested_quantity = suggested_quantity
+        self.order_type = order_type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
 
 
 class OrderEvent(Event):
     """
     Gestisce l'evento di invio di un ordine a un sistema di esecuzione.
     L'ordine contiene un ticker (ad esempio GOOG), un'azione (BOT o SLD) e una quantità.
+
+    L'ordine è a mercato ("MKT") per default, oppure limite ("LMT"),
+    stop ("STP") o stop limite ("STP LMT"), con i prezzi (interi, in
+    unità di PriceParser) limit_price e stop_price. Se take_profit
+    e/o stop_loss sono indicati l'ordine è un bracket: una volta
+    eseguito, vengono inviati un ordine limite a take_profit e un
+    ordine stop a stop_loss di segno opposto, in cui l'esecuzione
+    di uno riduce (o annulla) l'altro.
     """
-    def __init__(self, ticker, action, quantity):
+
+    __slots__ = (
+        "ticker", "action", "quantity", "order_type",
+        "limit_price", "stop_price", "take_profit", "stop_loss"
+    )
+
+    type = EventType.ORDER
+
+    def __init__(
+        self, ticker, action, quantity,
+        order_type="MKT", limit_price=None, stop_price=None,
+        take_profit=None, stop_loss=None
+    ):
         """
         Inizializza l'OrderEvent.
 
@@ -180,19 +358,30 @@ class OrderEvent(Event):
         ticker - Il simbolo del ticker, ad es. "GOOG".
         action - "BOT" (per i long) o "SLD" (per gli short).
         quantity: la quantità di azioni da negoziare.
+        order_type - "MKT", "LMT", "STP" o "STP LMT".
+        limit_price - Il prezzo limite degli ordini LMT e STP LMT.
+        stop_price - Il prezzo di attivazione degli ordini STP e STP LMT.
+        take_profit - Il prezzo limite dell'ordine di chiusura in
+            profitto di un bracket.
+        stop_loss - Il prezzo stop dell'ordine di chiusura in
+            perdita di un bracket.
         """
-        self.type = EventType.ORDER
         self.ticker = ticker
         self.action = action
         self.quantity = quantity
+        self.order_type = order_type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
 
     def print_order(self):
         """
         Stampa dei valori che compongono l'OrderEvent.
         """
         print(
-            "Order: Ticker=%s, Action=%s, Quantity=%s" % (
-                self.ticker, self.action, self.quantity
+            "Order: Ticker=%s, Action=%s, Quantity=%s, Type=%s" % (
+                self.ticker, self.action, self.quantity, self.order_type
             )
         )
 
@@ -208,6 +397,13 @@ class FillEvent(Event):
     a prezzi diversi. Questo verrà simulato calcolando la media.
     """
 
+    __slots__ = (
+        "timestamp", "ticker", "action", "quantity",
+        "exchange", "price", "commission"
+    )
+
+    type = EventType.FILL
+
     def __init__(
         self, timestamp, ticker,
         action, quantity,
@@ -226,7 +422,6 @@ class FillEvent(Event):
         commission - La commissione del broker per lo svolgimento della transazione.
 
         """
-        self.type = EventType.FILL
         self.timestamp = timestamp
         self.ticker = ticker
         self.action = action
@@ -242,6 +437,11 @@ class SentimentEvent(Event):
     a un ticker. Può essere utilizzato per un servizio generico
     "data-ticker-sentiment", spesso fornito da molti fornitori di dati.
     """
+
+    __slots__ = ("timestamp", "ticker", "sentiment")
+
+    type = EventType.SENTIMENT
+
     def __init__(self, timestamp, ticker, sentiment):
         """
         Inizializza il SentimentEvent.
@@ -252,7 +452,6 @@ class SentimentEvent(Event):
         sentiment - Una stringa, un valore float o un valore intero
             di "sentiment", ad es. "rialzista", -1, 5.4, ecc.
         """
-        self.type = EventType.SENTIMENT
         self.timestamp = timestamp
         self.ticker = ticker
         self.sentiment = sentiment
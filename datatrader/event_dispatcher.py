@@ -0,0 +1,67 @@
+class _EveryNth(object):
+    """
+    Richiama un gestore solo una volta ogni "every" eventi ricevuti,
+    a partire dal primo.
+    """
+    def __init__(self, handler, every):
+        self.handler = handler
+        self.every = every
+        self.count = 0
+
+    def __call__(self, event):
+        if self.count == 0:
+            self.handler(event)
+        self.count += 1
+        if self.count == self.every:
+            self.count = 0
+
+
+class EventDispatcher(object):
+    """
+    EventDispatcher indirizza ogni evento ai gestori registrati per
+    il suo tipo (EventType), tramite una tabella di dispatch.
+
+    I componenti (strategia, portafoglio, statistiche, ecc.) sono
+    registrati solo per i tipi di evento che li riguardano, quindi
+    il costo di ogni evento dipende solo dai componenti collegati.
+    I gestori di uno stesso tipo sono richiamati nell'ordine di
+    registrazione.
+    """
+    def __init__(self):
+        self.handlers = {}
+
+    def subscribe(self, event_types, handler, every=1):
+        """
+        Registra handler, un callable che riceve l'evento, per
+        ciascuno dei tipi di evento in event_types. Se every è
+        maggiore di 1 il gestore viene richiamato solo una volta
+        ogni every eventi (ad es. per delle statistiche aggiornate
+        con una frequenza ridotta).
+        """
+        if every < 1:
+            raise ValueError("every must be a positive integer, got %s" % every)
+        if every > 1:
+            handler = _EveryNth(handler, every)
+        for event_type in event_types:
+            self.handlers[event_type] = self.handlers.get(event_type, ()) + (handler,)
+
+    def unsubscribe(self, event_types, handler):
+        """
+        Rimuove handler dai gestori dei tipi di evento in event_types.
+        """
+        for event_type in event_types:
+            self.handlers[event_type] = tuple(
+                h for h in self.handlers.get(event_type, ())
+                if h != handler and getattr(h, "handler", None) != handler
+            )
+
+    def dispatch(self, event):
+        """
+        Richiama tutti i gestori registrati per il tipo dell'evento.
+        """
+        try:
+            handlers = self.handlers[event.type]
+        except KeyError:
+            raise NotImplementedError("Unsupported event.type '%s'" % event.type)
+        for handler in handlers:
+            handler(event)
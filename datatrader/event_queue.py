@@ -0,0 +1,63 @@
+from collections import deque
+
+from .compat import queue
+
+
+class BacktestEventQueue(object):
+    """
+    BacktestEventQueue è una coda degli eventi per i backtest,
+    eseguiti in un singolo thread, basata su una deque.
+
+    Espone la stessa interfaccia put / get di queue.Queue, quindi
+    può essere passata a TradingSession, PortfolioHandler, strategie
+    e gestori di esecuzione al posto di queue.Queue, ma senza
+    acquisire alcun lock per ogni evento. Inoltre next_event()
+    restituisce None quando la coda è vuota, evitando di
+    sollevare un'eccezione queue.Empty ad ogni nuova barra.
+
+    Per le sessioni live, dove gli eventi possono arrivare da
+    altri thread, si deve continuare ad usare queue.Queue.
+    """
+    def __init__(self):
+        self._events = deque()
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Aggiunge un evento in fondo alla coda.
+        """
+        self._events.append(item)
+
+    def put_nowait(self, item):
+        self._events.append(item)
+
+    def get(self, block=True, timeout=None):
+        """
+        Rimuove e restituisce il primo evento della coda. Come per
+        queue.Queue, se la coda è vuota solleva queue.Empty (in un
+        singolo thread non ha senso attendere un nuovo evento).
+        """
+        try:
+            return self._events.popleft()
+        except IndexError:
+            raise queue.Empty
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def next_event(self):
+        """
+        Rimuove e restituisce il primo evento della coda,
+        oppure None se la coda è vuota.
+        """
+        if self._events:
+            return self._events.popleft()
+        return None
+
+    def empty(self):
+        return not self._events
+
+    def qsize(self):
+        return len(self._events)
+
+    def __len__(self):
+        return len(self._events)
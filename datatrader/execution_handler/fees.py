@@ -0,0 +1,355 @@
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+from ..price_parser import PriceParser
+
+
+def _round(fee):
+    """
+    Converte una commissione (float, in valuta) in un intero in
+    unità di PriceParser, arrotondando al più vicino.
+    """
+    return int(round(fee * PriceParser.PRICE_MULTIPLIER))
+
+
+def _round_array(fees):
+    return np.round(fees * PriceParser.PRICE_MULTIPLIER).astype(np.int64)
+
+
+def _sells(actions):
+    """
+    Array booleano delle vendite, con azioni "BOT"/"SLD" o +1/-1.
+    """
+    actions = np.asarray(actions)
+    if actions.dtype.kind in "iuf":
+        return actions < 0
+    return actions == "SLD"
+
+
+class AbstractFeeModel(object):
+    """
+    Un modello di commissioni calcola i costi di una transazione in
+    unità intere di PriceParser, a partire dai prezzi (anch'essi
+    interi) e dalla quantità eseguita.
+
+    Ogni modello espone due API che restituiscono gli stessi valori:
+
+    fee - per un singolo riempimento, chiamata dal gestore di
+        esecuzione nel ciclo degli eventi;
+    fees - vettoriale, per array di timestamp (datetime64 o
+        nanosecondi), ticker, azioni ("BOT"/"SLD" o +1/-1),
+        quantità e prezzi, utilizzata per analizzare o ricalcolare
+        i costi dell'intero log dei trade (si veda trade_fees).
+
+    I modelli che dipendono dalle transazioni precedenti (ad es. dal
+    volume mensile) assumono che fee sia chiamata, e che gli array
+    di fees siano ordinati, in ordine cronologico.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def fee(self, timestamp, ticker, action, quantity, price):
+        raise NotImplementedError("Should implement fee()")
+
+    @abstractmethod
+    def fees(self, timestamps, tickers, actions, quantities, prices):
+        raise NotImplementedError("Should implement fees()")
+
+    def reset(self):
+        """
+        Azzera lo stato accumulato da fee (ad es. all'inizio di
+        una nuova sessione). Per default non fa nulla.
+        """
+        pass
+
+
+class IBFixedFeeModel(AbstractFeeModel):
+    """
+    La commissione predefinita di IBSimulatedExecutionHandler, basata
+    sui prezzi fissi di Interactive Brokers per gli Stati Uniti
+    (https://www.interactivebrokers.co.uk/en/index.php?f=1590&p=stocks1):
+    0.005 per azione, con un minimo di 1.0. Il massimo (0.5 * prezzo * quantità) usa il
+    prezzo intero di PriceParser, per cui in pratica non si applica;
+    la tariffa fissa pubblicata da IB (massimo 1% del controvalore)
+    è PerShareFeeModel(0.005, minimum=1.0, maximum_pct=0.01).
+    """
+    def fee(self, timestamp, ticker, action, quantity, price):
+        commission = min(0.5 * price * quantity, max(1.0, 0.005 * quantity))
+        return int(commission * PriceParser.PRICE_MULTIPLIER)
+
+    def fees(self, timestamps, tickers, actions, quantities, prices):
+        quantities = np.asarray(quantities)
+        prices = np.asarray(prices)
+        commission = np.minimum(
+            0.5 * prices * quantities, np.maximum(1.0, 0.005 * quantities)
+        )
+        return (commission * PriceParser.PRICE_MULTIPLIER).astype(np.int64)
+
+
+class PerShareFeeModel(AbstractFeeModel):
+    """
+    rate per azione, con un eventuale minimo per ordine (minimum) e
+    un eventuale massimo in percentuale del controvalore
+    (maximum_pct, ad es. 0.01 per l'1%).
+    """
+    def __init__(self, rate=0.005, minimum=None, maximum_pct=None):
+        self.rate = rate
+        self.minimum = minimum
+        self.maximum_pct = maximum_pct
+
+    def _limit(self, fee, quantity, price):
+        if self.minimum is not None:
+            fee = max(fee, self.minimum)
+        if self.maximum_pct is not None:
+            fee = min(
+                fee, self.maximum_pct * (quantity * (price / PriceParser.PRICE_MULTIPLIER))
+            )
+        return fee
+
+    def _limit_array(self, fees, quantities, prices):
+        if self.minimum is not None:
+            fees = np.maximum(fees, self.minimum)
+        if self.maximum_pct is not None:
+            fees = np.minimum(
+                fees, self.maximum_pct * (quantities * (prices / PriceParser.PRICE_MULTIPLIER))
+            )
+        return fees
+
+    def fee(self, timestamp, ticker, action, quantity, price):
+        return _round(self._limit(self.rate * quantity, quantity, price))
+
+    def fees(self, timestamps, tickers, actions, quantities, prices):
+        quantities = np.asarray(quantities)
+        prices = np.asarray(prices)
+        return _round_array(
+            self._limit_array(self.rate * quantities, quantities, prices)
+        )
+
+
+class PercentageFeeModel(PerShareFeeModel):
+    """
+    rate in percentuale del controvalore (ad es. 0.001 per 10 punti
+    base), con gli stessi minimo e massimo di PerShareFeeModel.
+    """
+    def __init__(self, rate=0.001, minimum=None, maximum_pct=None):
+        PerShareFeeModel.__init__(self, rate, minimum, maximum_pct)
+
+    def fee(self, timestamp, ticker, action, quantity, price):
+        fee = self.rate * (quantity * (price / PriceParser.PRICE_MULTIPLIER))
+        return _round(self._limit(fee, quantity, price))
+
+    def fees(self, timestamps, tickers, actions, quantities, prices):
+        quantities = np.asarray(quantities)
+        prices = np.asarray(prices)
+        fees = self.rate * (quantities * (prices / PriceParser.PRICE_MULTIPLIER))
+        return _round_array(self._limit_array(fees, quantities, prices))
+
+
+class TieredFeeModel(PerShareFeeModel):
+    """
+    Commissione per azione a scaglioni in base al volume (azioni)
+    già eseguito nel mese solare: tiers è una lista di coppie
+    (volume mensile minimo, rate) in ordine crescente. Per default
+    sono gli scaglioni della tariffa "tiered" di IB per le azioni
+    USA, con minimo 0.35 e massimo 1% del controvalore.
+
+    Lo scaglione di ogni transazione è determinato dal volume del
+    mese precedente alla transazione stessa.
+    """
+
+    IB_TIERS = (
+        (0, 0.0035),
+        (300000, 0.002),
+        (3000000, 0.0015),
+        (20000000, 0.001),
+        (100000000, 0.0005),
+    )
+
+    def __init__(self, tiers=IB_TIERS, minimum=0.35, maximum_pct=0.01):
+        PerShareFeeModel.__init__(self, None, minimum, maximum_pct)
+        self.tiers = tuple(tiers)
+        self._starts = [start for start, rate in self.tiers]
+        self._rates = [rate for start, rate in self.tiers]
+        self.reset()
+
+    def reset(self):
+        self._month = None
+        self._volume = 0
+
+    def fee(self, timestamp, ticker, action, quantity, price):
+        timestamp = pd.Timestamp(timestamp)
+        month = timestamp.year * 12 + timestamp.month - 1
+        if month != self._month:
+            self._month = month
+            self._volume = 0
+        rate = self._rates[max(bisect_right(self._starts, self._volume) - 1, 0)]
+        self._volume += quantity
+        return _round(self._limit(rate * quantity, quantity, price))
+
+    def fees(self, timestamps, tickers, actions, quantities, prices):
+        quantities = np.asarray(quantities, dtype=np.int64)
+        prices = np.asarray(prices)
+        months = pd.DatetimeIndex(timestamps).tz_localize(None).values
+        months = months.astype("datetime64[M]").astype(np.int64)
+        # Volume del mese precedente ad ogni transazione
+        before = np.cumsum(quantities) - quantities
+        first = np.ones(len(months), dtype=bool)
+        first[1:] = months[1:] != months[:-1]
+        starts = np.flatnonzero(first)
+        block = np.cumsum(first) - 1
+        before = before - before[starts][block]
+        index = np.searchsorted(self._starts, before, side="right") - 1
+        rates = np.asarray(self._rates)[np.maximum(index, 0)]
+        return _round_array(
+            self._limit_array(rates * quantities, quantities, prices)
+        )
+
+
+class RegulatoryFeeModel(AbstractFeeModel):
+    """
+    Costi regolamentari USA sulle sole vendite: la SEC fee
+    (sec_rate del controvalore) e la FINRA TAF (taf_rate per azione,
+    fino ad un massimo di taf_max per transazione).
+    """
+    def __init__(self, sec_rate=0.0000278, taf_rate=0.000166, taf_max=8.30):
+        self.sec_rate = sec_rate
+        self.taf_rate = taf_rate
+        self.taf_max = taf_max
+
+    def fee(self, timestamp, ticker, action, quantity, price):
+        if action != "SLD" and action != -1:
+            return 0
+        fee = self.sec_rate * (quantity * (price / PriceParser.PRICE_MULTIPLIER))
+        return _round(fee + min(self.taf_rate * quantity, self.taf_max))
+
+    def fees(self, timestamps, tickers, actions, quantities, prices):
+        quantities = np.asarray(quantities)
+        prices = np.asarray(prices)
+        fees = self.sec_rate * (quantities * (prices / PriceParser.PRICE_MULTIPLIER))
+        fees = _round_array(
+            fees + np.minimum(self.taf_rate * quantities, self.taf_max)
+        )
+        return np.where(_sells(actions), fees, 0)
+
+
+class CompositeFeeModel(AbstractFeeModel):
+    """
+    La somma delle commissioni di più modelli, ad es. la commissione
+    del broker più le fee di exchange e regolamentari.
+    """
+    def __init__(self, models):
+        self.models = [create_fee_model(model) for model in models]
+
+    def fee(self, timestamp, ticker, action, quantity, price):
+        return sum(
+            model.fee(timestamp, ticker, action, quantity, price)
+            for model in self.models
+        )
+
+    def fees(self, timestamps, tickers, actions, quantities, prices):
+        total = np.zeros(len(quantities), dtype=np.int64)
+        for model in self.models:
+            total += model.fees(timestamps, tickers, actions, quantities, prices)
+        return total
+
+    def reset(self):
+        for model in self.models:
+            model.reset()
+
+
+FEE_MODELS = {
+    "ib_fixed": IBFixedFeeModel,
+    "per_share": PerShareFeeModel,
+    "percentage": PercentageFeeModel,
+    "tiered": TieredFeeModel,
+    "regulatory": RegulatoryFeeModel,
+}
+
+
+def register_fee_model(name, model_class):
+    """
+    Aggiunge un modello di commissioni al registro, così da poterlo
+    indicare per nome in create_fee_model.
+    """
+    FEE_MODELS[name] = model_class
+
+
+def create_fee_model(spec=None):
+    """
+    Crea un modello di commissioni da:
+    - None: IBFixedFeeModel, la commissione predefinita;
+    - un modello già creato, restituito invariato;
+    - il nome di un modello del registro, ad es. "tiered";
+    - un dizionario con il nome in "model" e i parametri, ad es.
+      {"model": "per_share", "rate": 0.005, "minimum": 1.0};
+    - una lista di specifiche, sommate da CompositeFeeModel.
+    """
+    if spec is None:
+        return IBFixedFeeModel()
+    if isinstance(spec, AbstractFeeModel):
+        return spec
+    if isinstance(spec, (list, tuple)):
+        return CompositeFeeModel(spec)
+    params = {}
+    if isinstance(spec, dict):
+        params = dict(spec)
+        spec = params.pop("model")
+    try:
+        model_class = FEE_MODELS[spec]
+    except KeyError:
+        raise ValueError(
+            "Unknown fee model '%s', use one of %s" % (
+                spec, ", ".join(sorted(FEE_MODELS))
+            )
+        )
+    return model_class(**params)
+
+
+def trade_fees(trades, fee_model):
+    """
+    Ricalcola le commissioni di un log dei trade (il DataFrame di
+    read_trade_log, in ordine cronologico) con un altro modello di
+    commissioni e le restituisce, in unità di visualizzazione, come
+    Series allineata alle righe di trades.
+    """
+    return pd.Series(
+        PriceParser.display_array(_trade_fees(trades, fee_model), 4),
+        index=trades.index, name="commission"
+    )
+
+
+def _trade_fees(trades, fee_model):
+    return create_fee_model(fee_model).fees(
+        trades["timestamp"].values, trades["ticker"].values,
+        trades["action"].values, trades["quantity"].values,
+        PriceParser.parse_array(trades["price"].values, exact=True)
+    )
+
+
+def reprice_equity(equity, trades, fee_model):
+    """
+    Restituisce la curva equity di un backtest concluso come sarebbe
+    stata con le commissioni di fee_model invece di quelle del log
+    dei trade, senza ripetere la sessione: ad ogni timestamp viene
+    sottratta la differenza cumulata delle commissioni dei trade
+    precedenti, perché un trade incide sull'equity registrata dal
+    timestamp successivo.
+
+    Il risultato coincide con quello della sessione solo per i
+    backtest con un solo ticker o con BarSliceEvent. Con i BarEvent
+    di più ticker le statistiche vengono aggiornate dopo la barra di
+    ogni ticker, per cui l'equity registrata al timestamp di un trade
+    include già le commissioni dei ticker trasmessi prima dell'ultimo
+    e la curva ricalcolata differisce a quei timestamp.
+    """
+    old = PriceParser.parse_array(trades["commission"].values, exact=True)
+    new = _trade_fees(trades, fee_model)
+    delta = np.concatenate(([0], np.cumsum(new - old)))
+    trade_ns = pd.DatetimeIndex(trades["timestamp"]).as_unit("ns").asi8
+    equity_ns = pd.DatetimeIndex(equity.index).as_unit("ns").asi8
+    applied = delta[np.searchsorted(trade_ns, equity_ns, side="left")]
+    return equity - PriceParser.display_array(applied, 4)
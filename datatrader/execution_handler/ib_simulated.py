@@ -1,6 +1,8 @@
 from .base import AbstractExecutionHandler
+from .fees import IBFixedFeeModel, create_fee_model
+from .trigger_book import PendingOrder, TriggerBook
 from ..event import (FillEvent, EventType)
-from ..price_parser import PriceParser
+from ..position_book import timestamp_ns
 
 
 class IBSimulatedExecutionHandler(AbstractExecutionHandler):
@@ -12,32 +14,57 @@ class IBSimulatedExecutionHandler(AbstractExecutionHandler):
 
     Ciò consente un semplice test "first go" di qualsiasi strategia,
     prima dell'implementazione con un gestore di esecuzione più sofisticato.
+
+    Gli ordini limite, stop e stop limite (si veda OrderEvent)
+    vengono invece inseriti in un TriggerBook ed eseguiti per intero,
+    da on_price, al primo TickEvent o BarEvent successivo che ne
+    attraversa il prezzo (high/low per le barre). Gli ordini bracket
+    inviano i due ordini di chiusura una volta eseguiti.
     """
 
-    def __init__(self, events_queue, price_handler, compliance=None):
+    def __init__(
+        self, events_queue, price_handler, compliance=None, fee_model=None
+    ):
         """
         Inizializza il gestore, impostando la coda degli eventi
         e l'accesso ai prezzi locali.
 
         Parametri:
         events_queue - La coda degli oggetti Event.
+        fee_model - Il modello delle commissioni, o la sua specifica
+            per create_fee_model (si veda fees.py); per default
+            IBFixedFeeModel.
         """
         self.events_queue = events_queue
         self.price_handler = price_handler
         self.compliance = compliance
+        self.fee_model = create_fee_model(fee_model)
+        self.exchange = "ARCA"
+        self.orders = {}
+        self.triggers = TriggerBook()
+        self._order_id = 0
+
+    def next_order_id(self):
+        self._order_id += 1
+        return self._order_id
+
+    def cancel_order(self, order_id):
+        """
+        Annulla la parte non ancora eseguita di un ordine.
+        Restituisce False se l'ordine non è più in attesa.
+        """
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return False
+        order.cancelled = True
+        return True
 
     def calculate_ib_commission(self, quantity, fill_price):
         """
-        Calcola la commissione di Interactive Brokers per una transazione.
-        Questo si basa sui prezzi fissi degli Stati Uniti, i cui dettagli
-        sono disponibili qui:
-        https://www.interactivebrokers.co.uk/en/index.php?f=1590&p=stocks1
+        Calcola la commissione di Interactive Brokers per una transazione,
+        secondo IBFixedFeeModel (si veda fees.py).
         """
-        commission = min(
-            0.5 * fill_price * quantity,
-            max(1.0, 0.005 * quantity)
-        )
-        return PriceParser.parse(commission)
+        return IBFixedFeeModel().fee(None, None, None, quantity, fill_price)
 
     def execute_order(self, event):
         """
@@ -50,6 +77,14 @@ class IBSimulatedExecutionHandler(AbstractExecutionHandler):
         if event.type == EventType.ORDER:
             # Ottenere valori dall'OrderEvent
             timestamp = self.price_handler.get_last_timestamp(event.ticker)
+            if event.order_type != "MKT":
+                order = PendingOrder.from_event(
+                    self.next_order_id(), event,
+                    timestamp, timestamp_ns(timestamp)
+                )
+                self.orders[order.order_id] = order
+                self.triggers.add(order)
+                return order.order_id
             ticker = event.ticker
             action = event.action
             quantity = event.quantity
@@ -67,7 +102,9 @@ class IBSimulatedExecutionHandler(AbstractExecutionHandler):
 
             # Imposta uno exchange fittizio e calcola la commissione dei trade
             exchange = "ARCA"
-            commission = self.calculate_ib_commission(quantity, fill_price)
+            commission = self.fee_model.fee(
+                timestamp, ticker, action, quantity, fill_price
+            )
 
             # Crea il FillEvent e lo posiziona nella coda degli eventi
             fill_event = FillEvent(
@@ -80,3 +117,119 @@ class IBSimulatedExecutionHandler(AbstractExecutionHandler):
 
             if self.compliance is not None:
                 self.compliance.record_trade(fill_event)
+
+            if event.take_profit is not None or event.stop_loss is not None:
+                self._submit_bracket(
+                    ticker, action, quantity,
+                    event.take_profit, event.stop_loss, timestamp
+                )
+
+    def _submit_bracket(self, ticker, action, quantity, take_profit, stop_loss, time):
+        """
+        Inserisce nel book gli ordini di chiusura di un bracket
+        eseguito: un ordine limite a take_profit e un ordine stop a
+        stop_loss, collegati in modo che l'esecuzione di uno riduca
+        l'altro.
+        """
+        exit_action = "SLD" if action == "BOT" else "BOT"
+        time_ns = timestamp_ns(time)
+        children = []
+        if take_profit is not None:
+            children.append(PendingOrder(
+                self.next_order_id(), ticker, exit_action, quantity,
+                time, time_ns, "LMT", limit_price=take_profit
+            ))
+        if stop_loss is not None:
+            children.append(PendingOrder(
+                self.next_order_id(), ticker, exit_action, quantity,
+                time, time_ns, "STP", stop_price=stop_loss
+            ))
+        if len(children) == 2:
+            children[0].oco = children[1]
+            children[1].oco = children[0]
+        for order in children:
+            self.orders[order.order_id] = order
+            self.triggers.add(order)
+
+    def _fill_order(self, time, order, quantity, fill_price):
+        """
+        Esegue quantity unità di un ordine in attesa, inviando il
+        FillEvent, riducendo l'eventuale ordine collegato e, quando
+        l'ordine è eseguito completamente, inviando gli ordini di
+        chiusura se si tratta di un bracket.
+        """
+        order.remaining -= quantity
+        if order.remaining == 0:
+            self.orders.pop(order.order_id, None)
+        fill_event = FillEvent(
+            time, order.ticker,
+            order.action, quantity,
+            self.exchange, fill_price,
+            self.fee_model.fee(
+                time, order.ticker, order.action, quantity, fill_price
+            )
+        )
+        self.events_queue.put(fill_event)
+
+        if self.compliance is not None:
+            self.compliance.record_trade(fill_event)
+
+        oco = order.oco
+        if oco is not None and not oco.cancelled:
+            oco.remaining -= quantity
+            if oco.remaining <= 0:
+                self.cancel_order(oco.order_id)
+        if order.remaining == 0 and (
+            order.take_profit is not None or order.stop_loss is not None
+        ):
+            self._submit_bracket(
+                order.ticker, order.action, order.quantity,
+                order.take_profit, order.stop_loss, time
+            )
+
+    def _match(self, event, ticker=None, i=None):
+        """
+        Restituisce gli ordini del book attraversati dai prezzi di
+        un TickEvent, di un BarEvent o del ticker in posizione i
+        di un BarSliceEvent, con il relativo prezzo di esecuzione.
+        """
+        if event.type == EventType.TICK:
+            ask = event.ask
+            bid = event.bid
+            return self.triggers.match(event.ticker, ask, ask, ask, bid, bid, bid)
+        if i is None:
+            ticker = event.ticker
+            open_price = event.open_price
+            high_price = event.high_price
+            low_price = event.low_price
+        else:
+            open_price = event.open_price.item(i)
+            high_price = event.high_price.item(i)
+            low_price = event.low_price.item(i)
+        return self.triggers.match(
+            ticker, open_price, high_price, low_price,
+            open_price, high_price, low_price
+        )
+
+    def on_price(self, event):
+        """
+        Esegue gli ordini limite e stop attraversati dai prezzi di un
+        TickEvent, BarEvent o BarSliceEvent.
+        """
+        triggers = self.triggers
+        if len(triggers) == 0:
+            return
+        if event.type == EventType.BAR_SLICE:
+            index = event.index
+            matches = []
+            for ticker in triggers.tickers():
+                i = index.get(ticker)
+                if i is not None:
+                    matches.extend(self._match(event, ticker, i))
+        elif event.ticker in triggers:
+            matches = self._match(event)
+        else:
+            return
+        for order, price in matches:
+            if not order.cancelled:
+                self._fill_order(event.time, order, order.remaining, price)
@@ -0,0 +1,204 @@
+from collections import deque
+import heapq
+import numbers
+
+import pandas as pd
+
+from .ib_simulated import IBSimulatedExecutionHandler
+from .slippage import NoSlippage
+from .trigger_book import PendingOrder
+from ..event import EventType
+from ..position_book import timestamp_ns
+
+
+class SimulatedExecutionHandler(IBSimulatedExecutionHandler):
+    """
+    Gestore di esecuzione simulato che, a differenza di
+    IBSimulatedExecutionHandler, non esegue gli ordini all'istante:
+    ogni OrderEvent viene inserito in un book degli ordini in attesa
+    ed eseguito, anche in più FillEvent, sulle barre o sui tick
+    successivi, ricevuti tramite on_price (TradingSession lo registra
+    per gli eventi di prezzo).
+
+    latency - Ritardo (secondi, o un timedelta) tra l'ordine e il
+        primo evento di prezzo a cui può essere eseguito.
+    participation - Quota massima del volume di ogni barra
+        (BarEvent.volume) che gli ordini di un ticker possono
+        eseguire, ad es. 0.1; None per nessun limite. Gli ordini
+        di un ticker condividono il volume in ordine di arrivo.
+        Non si applica ai tick, privi di volume.
+    slippage - Modello di slippage (si veda slippage.py), applicato
+        ad ogni riempimento; per default NoSlippage.
+    bar_price - Prezzo di riferimento delle barre, "open" o "close".
+        I tick vengono eseguiti all'ask per gli acquisti e al bid
+        per le vendite.
+    fee_model - Il modello delle commissioni (si veda fees.py),
+        applicato ad ogni riempimento.
+
+    Gli ordini limite e stop, trascorsa la latenza, passano nel
+    TriggerBook. Quando il prezzo li attraversa vengono eseguiti
+    al prezzo del book (con slippage), nel limite del volume
+    lasciato libero dagli ordini a mercato. La parte non eseguita
+    di un ordine stop prosegue come ordine a mercato, quella di un
+    ordine limite torna nel book. Gli ordini di chiusura dei
+    bracket entrano nel book senza latenza.
+
+    Gli ordini in attesa della latenza sono in un heap ordinato per
+    istante di esecuzione, quelli eseguibili in una coda FIFO per
+    ticker: ogni evento di prezzo considera solo gli ordini
+    diventati eseguibili e quelli dei ticker dell'evento, per cui
+    il costo non dipende dal numero di ordini in attesa.
+    """
+
+    def __init__(
+        self, events_queue, price_handler, compliance=None,
+        latency=0, participation=None, slippage=None, bar_price="open",
+        fee_model=None
+    ):
+        IBSimulatedExecutionHandler.__init__(
+            self, events_queue, price_handler, compliance, fee_model
+        )
+        if bar_price not in ("open", "close"):
+            raise ValueError("bar_price must be 'open' or 'close'")
+        if isinstance(latency, numbers.Number):
+            self.latency_ns = int(round(latency * 1e9))
+        else:
+            self.latency_ns = pd.Timedelta(latency).value
+        self.participation = participation
+        self.slippage = NoSlippage() if slippage is None else slippage
+        self.price_field = bar_price + "_price"
+        self.cur_time = None
+        self._waiting = []
+        self._active = {}
+
+    @property
+    def pending(self):
+        """
+        Numero di ordini non ancora eseguiti completamente.
+        """
+        return len(self.orders)
+
+    def execute_order(self, event):
+        """
+        Inserisce l'OrderEvent nel book degli ordini in attesa e
+        restituisce l'identificativo dell'ordine.
+
+        Parametri:
+        event - Un oggetto Event con informazioni sull'ordine.
+        """
+        if event.type != EventType.ORDER or event.quantity <= 0:
+            return None
+        time = self.cur_time
+        if time is None:
+            time = self.price_handler.get_last_timestamp(event.ticker)
+        order = PendingOrder.from_event(
+            self.next_order_id(), event, time,
+            timestamp_ns(time) + self.latency_ns
+        )
+        self.orders[order.order_id] = order
+        heapq.heappush(self._waiting, (order.eligible_ns, order.order_id, order))
+        return order.order_id
+
+    def on_price(self, event):
+        """
+        Esegue gli ordini in attesa ai prezzi di un TickEvent,
+        BarEvent o BarSliceEvent.
+        """
+        self.cur_time = event.time
+        waiting = self._waiting
+        if waiting:
+            now = timestamp_ns(event.time)
+            active = self._active
+            while waiting and waiting[0][0] <= now:
+                order = heapq.heappop(waiting)[2]
+                if order.cancelled:
+                    continue
+                if order.order_type != "MKT":
+                    self.triggers.add(order)
+                    continue
+                if order.ticker not in active:
+                    active[order.ticker] = deque()
+                active[order.ticker].append(order)
+        triggers = self.triggers
+        if not self._active and len(triggers) == 0:
+            return
+        if event.type == EventType.BAR_SLICE:
+            index = event.index
+            prices = getattr(event, self.price_field)
+            tickers = list(self._active)
+            tickers.extend(
+                ticker for ticker in triggers.tickers()
+                if ticker not in self._active
+            )
+            for ticker in tickers:
+                i = index.get(ticker)
+                if i is not None:
+                    matches = ()
+                    if ticker in triggers:
+                        matches = self._match(event, ticker, i)
+                    price = prices.item(i)
+                    self._fill(
+                        ticker, event.time, price, price,
+                        event.volume.item(i), matches
+                    )
+            return
+        ticker = event.ticker
+        if ticker not in self._active and ticker not in triggers:
+            return
+        matches = self._match(event) if ticker in triggers else ()
+        if event.type == EventType.BAR:
+            price = getattr(event, self.price_field)
+            self._fill(ticker, event.time, price, price, event.volume, matches)
+        else:
+            self._fill(ticker, event.time, event.ask, event.bid, None, matches)
+
+    def _fill(self, ticker, time, ask, bid, volume, matches=()):
+        """
+        Esegue, in ordine di arrivo, gli ordini a mercato eseguibili
+        di un ticker e quindi gli ordini attraversati del TriggerBook
+        (matches), fino ad esaurire il volume disponibile.
+        """
+        capacity = None
+        if volume is not None and self.participation is not None:
+            capacity = int(volume * self.participation)
+        orders = self._active.get(ticker)
+        while orders:
+            order = orders[0]
+            if order.cancelled:
+                orders.popleft()
+                continue
+            quantity = order.remaining
+            if capacity is not None:
+                if capacity <= 0:
+                    break
+                quantity = min(quantity, capacity)
+                capacity -= quantity
+            price = ask if order.action == "BOT" else bid
+            fill_price = self.slippage.fill_price(
+                order.action, price, quantity, volume
+            )
+            if quantity == order.remaining:
+                orders.popleft()
+            self._fill_order(time, order, quantity, fill_price)
+        if orders is not None and not orders:
+            del self._active[ticker]
+        for order, price in matches:
+            if order.cancelled:
+                continue
+            quantity = order.remaining
+            if capacity is not None:
+                quantity = min(quantity, max(capacity, 0))
+                capacity -= quantity
+            if quantity > 0:
+                fill_price = self.slippage.fill_price(
+                    order.action, price, quantity, volume
+                )
+                self._fill_order(time, order, quantity, fill_price)
+            if order.remaining > 0 and not order.cancelled:
+                if order.order_type == "STP":
+                    # Lo stop attivato prosegue come ordine a mercato
+                    if ticker not in self._active:
+                        self._active[ticker] = deque()
+                    self._active[ticker].append(order)
+                else:
+                    self.triggers.add(order)
@@ -0,0 +1,76 @@
+from abc import ABCMeta, abstractmethod
+
+
+class AbstractSlippageModel(object):
+    """
+    Un modello di slippage calcola il prezzo di esecuzione di un
+    riempimento a partire dal prezzo di riferimento (la chiusura o
+    l'apertura della barra, il bid/ask del tick), peggiorandolo
+    in funzione della quantità eseguita e del volume della barra.
+
+    I prezzi sono interi in unità di PriceParser.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def fill_price(self, action, price, quantity, volume=None):
+        """
+        Restituisce il prezzo di esecuzione.
+
+        Parametri:
+        action - "BOT" (per i long) o "SLD" (per gli short).
+        price - Il prezzo di riferimento.
+        quantity - La quantità eseguita.
+        volume - Il volume della barra, oppure None per i tick.
+        """
+        raise NotImplementedError("Should implement fill_price()")
+
+    @staticmethod
+    def _apply(action, price, rate):
+        """
+        Peggiora il prezzo di price * rate: in aumento per gli
+        acquisti, in diminuzione per le vendite.
+        """
+        slippage = int(round(price * rate))
+        return price + slippage if action == "BOT" else price - slippage
+
+
+class NoSlippage(AbstractSlippageModel):
+    """
+    Esegue al prezzo di riferimento.
+    """
+    def fill_price(self, action, price, quantity, volume=None):
+        return price
+
+
+class FixedSlippage(AbstractSlippageModel):
+    """
+    Slippage costante di bps punti base del prezzo, ad es. per
+    simulare metà dello spread sui dati a barre.
+    """
+    def __init__(self, bps=5.0):
+        self.bps = bps
+
+    def fill_price(self, action, price, quantity, volume=None):
+        return self._apply(action, price, self.bps / 10000.0)
+
+
+class VolumeShareSlippage(AbstractSlippageModel):
+    """
+    Impatto di mercato proporzionale alla quota del volume della
+    barra eseguita: il prezzo viene peggiorato di
+    impact * (quantity / volume) ** exponent, oltre agli eventuali
+    bps punti base fissi. Per i tick, privi di volume, si applicano
+    solo i punti base fissi.
+    """
+    def __init__(self, impact=0.1, exponent=2.0, bps=0.0):
+        self.impact = impact
+        self.exponent = exponent
+        self.bps = bps
+
+    def fill_price(self, action, price, quantity, volume=None):
+        rate = self.bps / 10000.0
+        if volume:
+            rate += self.impact * (float(quantity) / volume) ** self.exponent
+        return self._apply(action, price, rate)
@@ -0,0 +1,189 @@
+import heapq
+
+
+ORDER_TYPES = ("MKT", "LMT", "STP", "STP LMT")
+
+
+class PendingOrder(object):
+    """
+    Un ordine in attesa di esecuzione, eventualmente già eseguito
+    in parte (quantity - remaining).
+
+    triggered indica che lo stop di un ordine STP LMT è già stato
+    raggiunto, per cui l'ordine è ora un ordine limite; oco è
+    l'ordine collegato di un bracket, ridotto dalle esecuzioni di
+    questo.
+    """
+
+    __slots__ = (
+        "order_id", "ticker", "action", "quantity", "remaining",
+        "time", "eligible_ns", "cancelled", "order_type", "limit_price",
+        "stop_price", "take_profit", "stop_loss", "triggered", "oco"
+    )
+
+    def __init__(
+        self, order_id, ticker, action, quantity, time, eligible_ns,
+        order_type="MKT", limit_price=None, stop_price=None,
+        take_profit=None, stop_loss=None
+    ):
+        if order_type not in ORDER_TYPES:
+            raise ValueError(
+                "Unknown order type '%s', use one of %s" % (
+                    order_type, ", ".join(ORDER_TYPES)
+                )
+            )
+        if order_type in ("LMT", "STP LMT") and limit_price is None:
+            raise ValueError("%s orders need a limit_price" % order_type)
+        if order_type in ("STP", "STP LMT") and stop_price is None:
+            raise ValueError("%s orders need a stop_price" % order_type)
+        self.order_id = order_id
+        self.ticker = ticker
+        self.action = action
+        self.quantity = quantity
+        self.remaining = quantity
+        self.time = time
+        self.eligible_ns = eligible_ns
+        self.cancelled = False
+        self.order_type = order_type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.triggered = False
+        self.oco = None
+
+    @classmethod
+    def from_event(cls, order_id, event, time, eligible_ns):
+        """
+        Crea l'ordine in attesa di un OrderEvent.
+        """
+        return cls(
+            order_id, event.ticker, event.action, event.quantity,
+            time, eligible_ns, event.order_type, event.limit_price,
+            event.stop_price, event.take_profit, event.stop_loss
+        )
+
+    @property
+    def filled(self):
+        return self.quantity - self.remaining
+
+    @property
+    def is_stop(self):
+        """
+        True se l'ordine attende ancora il proprio prezzo stop.
+        """
+        return self.order_type == "STP" or (
+            self.order_type == "STP LMT" and not self.triggered
+        )
+
+
+class TriggerBook(object):
+    """
+    TriggerBook memorizza gli ordini limite e stop in attesa e
+    restituisce, ad ogni aggiornamento dei prezzi di un ticker, quelli
+    il cui prezzo è stato attraversato, con il relativo prezzo di
+    esecuzione.
+
+    Per ogni ticker gli ordini sono divisi in quattro heap ordinati
+    per prezzo: acquisti stop e vendite limite, attivati quando il
+    prezzo sale fino al loro livello (il più basso in cima), e
+    vendite stop e acquisti limite, attivati quando il prezzo scende
+    fino al loro livello (il più alto in cima). Ogni aggiornamento
+    esamina quindi solo la cima degli heap e gli ordini attivati,
+    indipendentemente dal numero di ordini nel book. Gli ordini
+    annullati vengono scartati quando raggiungono la cima.
+
+    I prezzi di esecuzione, per una barra, sono:
+    - stop: il prezzo stop, o l'apertura se la barra apre oltre lo stop;
+    - limite: il prezzo limite, o l'apertura se più favorevole.
+    Per un tick i prezzi di riferimento sono l'ask per gli acquisti e
+    il bid per le vendite. Un ordine STP LMT il cui prezzo di
+    attivazione rispetta il limite viene eseguito subito, altrimenti
+    diventa un ordine limite, valutato dall'aggiornamento successivo.
+    """
+
+    # Indici degli heap di ogni ticker
+    BUY_STOP, SELL_LIMIT, SELL_STOP, BUY_LIMIT = range(4)
+
+    def __init__(self):
+        self._books = {}
+        self._count = 0
+
+    def __len__(self):
+        """
+        Numero di ordini nel book, compresi gli annullati non
+        ancora scartati.
+        """
+        return self._count
+
+    def __contains__(self, ticker):
+        return ticker in self._books
+
+    def tickers(self):
+        return list(self._books)
+
+    def add(self, order):
+        """
+        Inserisce un ordine LMT, STP o STP LMT nel book.
+        """
+        buy = order.action == "BOT"
+        if order.is_stop:
+            level = order.stop_price
+            side = self.BUY_STOP if buy else self.SELL_STOP
+        else:
+            level = order.limit_price
+            side = self.BUY_LIMIT if buy else self.SELL_LIMIT
+        # Gli heap attivati dai ribassi sono ordinati per prezzo decrescente
+        key = -level if side in (self.SELL_STOP, self.BUY_LIMIT) else level
+        book = self._books.get(order.ticker)
+        if book is None:
+            book = self._books[order.ticker] = ([], [], [], [])
+        heapq.heappush(book[side], (key, order.order_id, order))
+        self._count += 1
+
+    def _pop_crossed(self, heap, bound):
+        """
+        Estrae dall'heap gli ordini con chiave <= bound.
+        """
+        crossed = []
+        while heap and heap[0][0] <= bound:
+            order = heapq.heappop(heap)[2]
+            self._count -= 1
+            if not order.cancelled:
+                crossed.append(order)
+        return crossed
+
+    def match(self, ticker, buy_open, buy_high, buy_low, sell_open, sell_high, sell_low):
+        """
+        Restituisce la lista (ordine, prezzo di esecuzione) degli ordini
+        del ticker attraversati dai prezzi indicati: open, high e low
+        della barra, oppure ask (acquisti) e bid (vendite) del tick.
+        Gli ordini restituiti sono rimossi dal book.
+        """
+        book = self._books.get(ticker)
+        if book is None:
+            return []
+        fills = []
+        stop_limits = []
+        for order in self._pop_crossed(book[self.BUY_STOP], buy_high):
+            fills.append((order, max(order.stop_price, buy_open)))
+        for order in self._pop_crossed(book[self.SELL_STOP], -sell_low):
+            fills.append((order, min(order.stop_price, sell_open)))
+        for order in self._pop_crossed(book[self.BUY_LIMIT], -buy_low):
+            fills.append((order, min(order.limit_price, buy_open)))
+        for order in self._pop_crossed(book[self.SELL_LIMIT], sell_high):
+            fills.append((order, max(order.limit_price, sell_open)))
+        matched = []
+        for order, price in fills:
+            if order.order_type == "STP LMT" and not order.triggered:
+                order.triggered = True
+                if (price > order.limit_price if order.action == "BOT"
+                        else price < order.limit_price):
+                    stop_limits.append(order)
+                    continue
+            matched.append((order, price))
+        for order in stop_limits:
+            self.add(order)
+        if not any(book):
+            del self._books[ticker]
+        return matched
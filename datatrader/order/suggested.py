@@ -10,7 +10,11 @@ class SuggestedOrder(object):
     e di gestione del rischio.
 
     """
-    def __init__(self, ticker, action, quantity=0):
+    def __init__(
+        self, ticker, action, quantity=0,
+        order_type="MKT", limit_price=None, stop_price=None,
+        take_profit=None, stop_loss=None
+    ):
         """
         Inizializza il SuggestedOrder. Il valore predefinito
         della quantità è zero poiché PortfolioHandler crea
@@ -24,8 +28,15 @@ class SuggestedOrder(object):
         action - "BOT" (per long) o "SLD" (per short)
             o "EXIT" (per la liquidazione).
         quantity - La quantità di azioni da negoziare.
+        order_type, limit_price, stop_price, take_profit, stop_loss -
+            Il tipo e i prezzi dell'ordine (si veda OrderEvent).
 
         """
         self.ticker = ticker
         self.action = action
         self.quantity = quantity
+        self.order_type = order_type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
@@ -1,8 +1,11 @@
-from .position import Position
+import numpy as np
+
+from .position_archive import ClosedPositionArchive
+from .position_book import PositionBook
 
 
 class Portfolio(object):
-    def __init__(self, price_handler, cash):
+    def __init__(self, price_handler, cash, closed_positions=None):
         """
         Alla creazione, l'oggetto Portfolio non contiene posizioni
         e tutti i valori vengono "ripristinati" con il capitale
@@ -11,14 +14,42 @@ class Portfolio(object):
         Nota : il pnl realizzato è il conteggio corrente del pnl
         da posizioni chiuse (pnl chiuso), così come il p&l realizzato
         calcolato da posizioni attualmente aperte.
+
+        Il capitale e il PnL non realizzato sono mantenuti come somme
+        correnti dei contributi di ogni posizione aperta, così che
+        ad ogni nuovo prezzo sia sufficiente rivalutare la sola
+        posizione del ticker aggiornato.
+
+        Le posizioni aperte sono memorizzate in un PositionBook, che
+        si comporta come un dizionario {ticker: posizione}, mentre
+        quelle chiuse in un ClosedPositionArchive (quello indicato
+        da closed_positions o uno in memoria), che mantiene anche
+        le statistiche dei trade.
         """
         self.price_handler = price_handler
         self.init_cash = cash
         self.equity = cash
         self.cur_cash = cash
-        self.positions = {}
-        self.closed_positions = []
+        self.positions = PositionBook()
+        if closed_positions is None:
+            closed_positions = ClosedPositionArchive()
+        self.closed_positions = closed_positions
         self.realised_pnl = 0
+        self.unrealised_pnl = 0
+        # Somma di (valore di mercato - costo base + PnL realizzato)
+        # delle posizioni aperte e contributo di ogni posizione
+        self._positions_value = 0
+        self._position_values = {}
+
+    def _get_bid_ask(self, ticker):
+        """
+        Restituisce il miglior bid / ask corrente di un ticker,
+        oppure due volte l'ultima chiusura per i dati a barre.
+        """
+        if self.price_handler.istick():
+            return self.price_handler.get_best_bid_ask(ticker)
+        close_price = self.price_handler.get_last_close(ticker)
+        return close_price, close_price
 
     def _update_portfolio(self):
         """
@@ -26,33 +57,65 @@ class Portfolio(object):
         PnL non realizzato, PnL realizzato, costo base ecc.)
         su i valori correnti per tutti i ticker.
 
-        Questo metodo viene chiamato dopo ogni modifica della posizione.
-
+        Rivaluta tutte le posizioni aperte con un'unica operazione
+        vettoriale e ricalcola da zero le somme correnti utilizzate
+        da _update_position_value.
         """
-        self.unrealised_pnl = 0
+        tickers = list(self.positions)
+        bids = np.zeros(len(tickers), dtype=np.int64)
+        asks = np.zeros(len(tickers), dtype=np.int64)
+        for i, ticker in enumerate(tickers):
+            bids[i], asks[i] = self._get_bid_ask(ticker)
+        values, unrealised_pnls = self.positions.mark_all(bids, asks)
+        values = values.tolist()
+        unrealised_pnls = unrealised_pnls.tolist()
+        self._position_values = dict(
+            zip(tickers, zip(values, unrealised_pnls))
+        )
+        self._positions_value = sum(values)
+        self.unrealised_pnl = sum(unrealised_pnls)
         self.equity = self.realised_pnl
         self.equity += self.init_cash
+        self.equity += self._positions_value
 
-        for ticker in self.positions:
-            pt = self.positions[ticker]
-            if self.price_handler.istick():
-                bid, ask = self.price_handler.get_best_bid_ask(ticker)
-            else:
-                close_price = self.price_handler.get_last_close(ticker)
-                bid = close_price
-                ask = close_price
-            pt.update_market_value(bid, ask)
-            self.unrealised_pnl += pt.unrealised_pnl
-            self.equity += (
-                pt.market_value - pt.cost_basis + pt.realised_pnl
-            )
+    def _mark_position(self, ticker):
+        """
+        Rivaluta la posizione aperta di un ticker ai prezzi correnti
+        e aggiunge il suo contributo alle somme correnti.
+        """
+        bid, ask = self._get_bid_ask(ticker)
+        value, unrealised_pnl = self.positions.mark(ticker, bid, ask)
+        self._position_values[ticker] = (value, unrealised_pnl)
+        self._positions_value += value
+        self.unrealised_pnl += unrealised_pnl
+
+    def _update_position_value(self, ticker):
+        """
+        Aggiorna i valori totali del portafoglio dopo una variazione
+        del prezzo o della posizione di un solo ticker, sostituendo
+        il suo contributo nelle somme correnti senza rivalutare le
+        altre posizioni, i cui prezzi non sono cambiati.
+
+        Il risultato coincide esattamente (in unità intere di
+        PriceParser) con quello di _update_portfolio.
+        """
+        old_value, old_unrealised_pnl = self._position_values.pop(
+            ticker, (0, 0)
+        )
+        self._positions_value -= old_value
+        self.unrealised_pnl -= old_unrealised_pnl
+        if ticker in self.positions:
+            self._mark_position(ticker)
+        self.equity = self.realised_pnl
+        self.equity += self.init_cash
+        self.equity += self._positions_value
 
     def _add_position(
         self, action, ticker,
-        quantity, price, commission
+        quantity, price, commission, timestamp=None
     ):
         """
-        Aggiunge un nuovo oggetto Position al Portfolio. Questo
+        Aggiunge una nuova posizione al Portfolio. Questo
         richiede di ottenere il miglior prezzo bid / ask dal
         gestore del prezzo al fine di calcolare un ragionevole
         "valore di mercato".
@@ -61,18 +124,12 @@ class Portfolio(object):
         vengono aggiornati.
         """
         if ticker not in self.positions:
-            if self.price_handler.istick():
-                bid, ask = self.price_handler.get_best_bid_ask(ticker)
-            else:
-                close_price = self.price_handler.get_last_close(ticker)
-                bid = close_price
-                ask = close_price
-            position = Position(
+            bid, ask = self._get_bid_ask(ticker)
+            self.positions.open(
                 action, ticker, quantity,
-                price, commission, bid, ask
+                price, commission, bid, ask, timestamp
             )
-            self.positions[ticker] = position
-            self._update_portfolio()
+            self._update_position_value(ticker)
         else:
             print(
                 "Ticker %s is already in the positions list. "
@@ -81,10 +138,10 @@ class Portfolio(object):
 
     def _modify_position(
         self, action, ticker,
-        quantity, price, commission
+        quantity, price, commission, timestamp=None
     ):
         """
-        Modifica un oggetto Posizione corrente nel Portafoglio.
+        Modifica una posizione corrente nel Portafoglio.
         Ciò richiede di ottenere il miglior prezzo bid / ask dal
         gestore del prezzo al fine di calcolare un ragionevole
         "valore di mercato".
@@ -93,23 +150,19 @@ class Portfolio(object):
         vengono aggiornati.
         """
         if ticker in self.positions:
-            self.positions[ticker].transact_shares(
-                action, quantity, price, commission
+            self.positions.transact(
+                ticker, action, quantity, price, commission
             )
-            if self.price_handler.istick():
-                bid, ask = self.price_handler.get_best_bid_ask(ticker)
-            else:
-                close_price = self.price_handler.get_last_close(ticker)
-                bid = close_price
-                ask = close_price
-            self.positions[ticker].update_market_value(bid, ask)
+            bid, ask = self._get_bid_ask(ticker)
+            self.positions.mark(ticker, bid, ask)
 
             if self.positions[ticker].quantity == 0:
-                closed = self.positions.pop(ticker)
+                open_time = self.positions.opened_at(ticker)
+                closed = self.positions.close(ticker)
                 self.realised_pnl += closed.realised_pnl
-                self.closed_positions.append(closed)
+                self.closed_positions.append(closed, open_time, timestamp)
 
-            self._update_portfolio()
+            self._update_position_value(ticker)
         else:
             print(
                 "Ticker %s not in the current position list. "
@@ -118,7 +171,7 @@ class Portfolio(object):
 
     def transact_position(
         self, action, ticker,
-        quantity, price, commission
+        quantity, price, commission, timestamp=None
     ):
         """
         Gestisce qualsiasi nuova posizione o modifica a
@@ -127,6 +180,8 @@ class Portfolio(object):
 
         Quindi, questo singolo metodo verrà chiamato da
         PortfolioHandler per aggiornare il Portfolio stesso.
+        timestamp è il momento dell'esecuzione, se noto, usato
+        per la durata dei trade.
         """
 
         if action == "BOT":
@@ -137,10 +192,10 @@ class Portfolio(object):
         if ticker not in self.positions:
             self._add_position(
                 action, ticker, quantity,
-                price, commission
+                price, commission, timestamp
             )
         else:
             self._modify_position(
                 action, ticker, quantity,
-                price, commission
+                price, commission, timestamp
             )
@@ -5,7 +5,8 @@ from .portfolio import Portfolio
 class PortfolioHandler(object):
     def __init__(
         self, initial_cash, events_queue,
-        price_handler, position_sizer, risk_manager
+        price_handler, position_sizer, risk_manager,
+        closed_positions=None
     ):
         """
         Il PortfolioHandler è progettato per interagire con un
@@ -24,13 +25,18 @@ class PortfolioHandler(object):
         PortfolioHandler prende anche un handle per il
         RiskManager, che viene utilizzato per modificare qualsiasi
         Ordine in modo da rimanere in linea con i parametri di rischio.
+
+        closed_positions è l'eventuale ClosedPositionArchive in cui
+        il Portfolio memorizza le posizioni chiuse.
         """
         self.initial_cash = initial_cash
         self.events_queue = events_queue
         self.price_handler = price_handler
         self.position_sizer = position_sizer
         self.risk_manager = risk_manager
-        self.portfolio = Portfolio(price_handler, initial_cash)
+        self.portfolio = Portfolio(
+            price_handler, initial_cash, closed_positions
+        )
 
     def _create_order_from_signal(self, signal_event):
         """
@@ -47,7 +53,12 @@ class PortfolioHandler(object):
         order = SuggestedOrder(
             signal_event.ticker,
             signal_event.action,
-            quantity=quantity
+            quantity=quantity,
+            order_type=signal_event.order_type,
+            limit_price=signal_event.limit_price,
+            stop_price=signal_event.stop_price,
+            take_profit=signal_event.take_profit,
+            stop_loss=signal_event.stop_loss
         )
         return order
 
@@ -80,7 +91,7 @@ class PortfolioHandler(object):
         # Create or modify the position from the fill info
         self.portfolio.transact_position(
             action, ticker, quantity,
-            price, commission
+            price, commission, fill_event.timestamp
         )
 
     def on_signal(self, signal_event):
@@ -119,10 +130,17 @@ class PortfolioHandler(object):
         """
         self._convert_fill_to_portfolio_update(fill_event)
 
-    def update_portfolio_value(self):
+    def update_portfolio_value(self, ticker=None):
         """
         Aggiorna il portafoglio per riflettere il valore di
         mercato corrente in base all'ultima offerta / domanda
         di ogni ticker.
+
+        Se viene specificato il ticker il cui prezzo è appena
+        cambiato, viene rivalutata solo la sua posizione,
+        altrimenti tutte le posizioni aperte.
         """
-        self.portfolio._update_portfolio()
+        if ticker is None:
+            self.portfolio._update_portfolio()
+        else:
+            self.portfolio._update_position_value(ticker)
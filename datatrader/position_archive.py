@@ -0,0 +1,278 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .position import Position
+from .position_book import NAT, PositionBook, timestamp_ns
+from .price_parser import PriceParser
+
+
+class TradeStatistics(object):
+    """
+    Statistiche dei trade chiusi aggiornate in modo incrementale ad
+    ogni nuova posizione chiusa, così da poterle leggere durante il
+    backtest senza scorrere tutte le posizioni.
+
+    Il PnL di un trade è il PnL realizzato della posizione chiusa
+    (commissioni incluse), in unità intere di PriceParser.
+    """
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0
+        self.gross_loss = 0
+        self.max_win = 0
+        self.max_loss = 0
+        self.timed_trades = 0
+        self.total_holding_ns = 0
+
+    def update(self, pnl, open_ns=NAT, close_ns=NAT):
+        self.trades += 1
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+            self.max_win = max(self.max_win, pnl)
+        else:
+            self.losses += 1
+            self.gross_loss += pnl
+            self.max_loss = min(self.max_loss, pnl)
+        if open_ns != NAT and close_ns != NAT:
+            self.timed_trades += 1
+            self.total_holding_ns += close_ns - open_ns
+
+    @property
+    def win_rate(self):
+        if self.trades == 0:
+            return None
+        return self.wins / float(self.trades)
+
+    @property
+    def avg_win(self):
+        if self.wins == 0:
+            return None
+        return PriceParser.display(self.gross_profit // self.wins)
+
+    @property
+    def avg_loss(self):
+        if self.losses == 0:
+            return None
+        return PriceParser.display(self.gross_loss // self.losses)
+
+    @property
+    def avg_trade(self):
+        if self.trades == 0:
+            return None
+        return PriceParser.display(
+            (self.gross_profit + self.gross_loss) // self.trades
+        )
+
+    @property
+    def avg_holding_time(self):
+        """
+        Durata media dei trade di cui sono noti apertura e chiusura,
+        come pandas Timedelta.
+        """
+        if self.timed_trades == 0:
+            return None
+        return pd.Timedelta(self.total_holding_ns // self.timed_trades, unit="ns")
+
+    def summary(self):
+        """
+        Restituisce un dizionario con le statistiche correnti, con
+        i valori monetari convertiti da PriceParser.display.
+        """
+        return {
+            "trades": self.trades,
+            "wins": self.wins,
+            "losses": self.losses,
+            "win_rate": self.win_rate,
+            "avg_trade": self.avg_trade,
+            "avg_win": self.avg_win,
+            "avg_loss": self.avg_loss,
+            "max_win": PriceParser.display(self.max_win),
+            "max_loss": PriceParser.display(self.max_loss),
+            "avg_holding_time": self.avg_holding_time,
+        }
+
+
+class ClosedPositionArchive(object):
+    """
+    ClosedPositionArchive memorizza le posizioni chiuse del
+    portafoglio in forma colonnare compatta, a blocchi di chunk_size
+    righe int64 (azione, ticker, campi di Position, timestamp di
+    apertura e chiusura), invece di mantenere in vita un oggetto
+    Position per ogni trade.
+
+    La memoria utilizzata può essere limitata in due modi:
+
+    spill_dir - ogni blocco completo viene scritto in un file .npy
+        all'interno di spill_dir e rimosso dalla memoria, per cui
+        tutte le posizioni restano disponibili;
+    max_rows - vengono mantenute solo le ultime max_rows posizioni
+        (buffer circolare), le precedenti sono scartate.
+
+    In ogni caso le statistiche dei trade (statistics) comprendono
+    tutte le posizioni chiuse, dato che sono aggiornate ad ogni
+    append. len() restituisce il numero totale di posizioni chiuse,
+    mentre l'iterazione e to_frame() quelle ancora disponibili.
+
+    close() cancella i file scritti in spill_dir; TradingSession lo
+    chiama al termine della sessione, ma l'archivio può essere usato
+    anche come context manager.
+    """
+
+    columns = (
+        ("action", "ticker") + PositionBook.fields + ("open_time", "close_time")
+    )
+
+    def __init__(self, chunk_size=4096, spill_dir=None, max_rows=None):
+        if spill_dir is not None and max_rows is not None:
+            raise ValueError("Use either spill_dir or max_rows, not both")
+        self.chunk_size = int(chunk_size)
+        self.max_rows = max_rows
+        self.spill_dir = None
+        if spill_dir is not None:
+            spill_dir = os.path.expanduser(spill_dir)
+            if not os.path.isdir(spill_dir):
+                os.makedirs(spill_dir)
+            self.spill_dir = tempfile.mkdtemp(
+                prefix="closed-positions-", dir=spill_dir
+            )
+        self.statistics = TradeStatistics()
+        self.tickers = []
+        self._ticker_ids = {}
+        self._spilled = []
+        self._chunks = []
+        self._chunk = self._new_chunk()
+        self._rows = 0
+        self._count = 0
+        self._dropped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Cancella la directory con i blocchi scritti su disco. Le
+        posizioni di quei blocchi non sono più disponibili, mentre
+        le statistiche dei trade restano complete e le posizioni
+        archiviate successivamente sono mantenute in memoria.
+        """
+        if self.spill_dir is None:
+            return
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        self.spill_dir = None
+        self._dropped += len(self._spilled) * self.chunk_size
+        self._spilled = []
+
+    def _new_chunk(self):
+        return np.zeros((self.chunk_size, len(self.columns)), dtype=np.int64)
+
+    def _ticker_id(self, ticker):
+        ticker_id = self._ticker_ids.get(ticker)
+        if ticker_id is None:
+            ticker_id = self._ticker_ids[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+        return ticker_id
+
+    def append(self, position, open_time=None, close_time=None):
+        """
+        Archivia una posizione chiusa (Position o PositionView) con i
+        timestamp, se noti, di apertura e chiusura.
+        """
+        open_ns = timestamp_ns(open_time)
+        close_ns = timestamp_ns(close_time)
+        row = [
+            PositionBook.ACTIONS[position.action],
+            self._ticker_id(position.ticker)
+        ]
+        row.extend(getattr(position, field) for field in PositionBook.fields)
+        row.append(open_ns)
+        row.append(close_ns)
+        self._chunk[self._rows] = row
+        self._rows += 1
+        self._count += 1
+        self.statistics.update(position.realised_pnl, open_ns, close_ns)
+        if self._rows == self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        """
+        Sposta il blocco corrente, completo, tra quelli archiviati.
+        """
+        chunk = self._chunk
+        self._chunk = self._new_chunk()
+        self._rows = 0
+        if self.spill_dir is not None:
+            path = os.path.join(
+                self.spill_dir, "%08d.npy" % len(self._spilled)
+            )
+            np.save(path, chunk)
+            self._spilled.append(path)
+            return
+        self._chunks.append(chunk)
+        if self.max_rows is not None:
+            # Scarta i blocchi più vecchi non più necessari
+            while self._chunks and (
+                (len(self._chunks) - 1) * self.chunk_size >= self.max_rows
+            ):
+                self._chunks.pop(0)
+                self._dropped += self.chunk_size
+
+    def _blocks(self):
+        """
+        Genera i blocchi di righe disponibili, in ordine di chiusura.
+        """
+        for path in self._spilled:
+            yield np.load(path, mmap_mode="r")
+        skip = 0
+        if self.max_rows is not None:
+            skip = max(self._count - self._dropped - self.max_rows, 0)
+        for chunk in self._chunks + [self._chunk[:self._rows]]:
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            yield chunk[skip:]
+            skip = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        """
+        Genera le posizioni disponibili come oggetti Position.
+        """
+        fields = PositionBook.fields
+        for block in self._blocks():
+            for values in block.tolist():
+                position = Position.__new__(Position)
+                position.action = PositionBook.ACTION_NAMES[values[0]]
+                position.ticker = self.tickers[values[1]]
+                position.__dict__.update(zip(fields, values[2:-2]))
+                yield position
+
+    def to_frame(self):
+        """
+        Restituisce le posizioni disponibili come DataFrame, con una
+        colonna per ogni attributo di Position seguita dai timestamp
+        di apertura e chiusura. Restituisce None se non ve ne sono.
+        """
+        blocks = [np.asarray(block) for block in self._blocks()]
+        blocks = [block for block in blocks if len(block) > 0]
+        if len(blocks) == 0:
+            return None
+        data = np.concatenate(blocks)
+        df = pd.DataFrame(data[:, 2:-2], columns=PositionBook.fields)
+        df.insert(0, "action", np.where(data[:, 0] == 1, "BOT", "SLD"))
+        df.insert(1, "ticker", np.array(self.tickers, dtype=object)[data[:, 1]])
+        for i, column in ((-2, "open_time"), (-1, "close_time")):
+            # NAT coincide con il valore int64 di NaT
+            df[column] = data[:, i].astype("datetime64[ns]")
+        return df
@@ -0,0 +1,279 @@
+import numpy as np
+import pandas as pd
+
+from .position import Position
+
+
+# Valore int64 utilizzato per i timestamp sconosciuti (come NaT)
+NAT = np.iinfo(np.int64).min
+
+
+def timestamp_ns(timestamp):
+    """
+    Converte un timestamp (datetime, pandas Timestamp, nanosecondi
+    da epoch o None) nei nanosecondi da epoch delle colonne int64.
+    """
+    if timestamp is None:
+        return NAT
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp is pd.NaT:
+        return NAT
+    return timestamp.value
+
+
+class PositionBook(object):
+    """
+    PositionBook memorizza le posizioni aperte del portafoglio come
+    colonne NumPy int64 parallele (quantità, prezzo medio, costo
+    base, PnL realizzato e non realizzato, acquisti, vendite,
+    commissioni, ecc.), una riga per ticker, invece di un oggetto
+    Position per ogni ticker.
+
+    In questo modo la rivalutazione di tutte le posizioni ad un
+    vettore di prezzi (mark_all) è un'unica operazione vettoriale.
+    Le colonne sono viste su un unico array (righe x campi), così
+    che leggere o scrivere tutti i campi di una posizione dopo una
+    transazione richieda una sola operazione.
+    I valori sono calcolati con la stessa aritmetica intera di
+    Position, per cui coincidono esattamente con quelli di Position.
+
+    Per compatibilità con l'API esistente il book si comporta come
+    il dizionario {ticker: Position} delle posizioni aperte: book[ticker]
+    restituisce un PositionView, con gli stessi attributi e metodi di
+    Position, mentre close() restituisce la posizione chiusa come un
+    normale oggetto Position, da memorizzare in closed_positions.
+    """
+
+    # Nello stesso ordine degli attributi di Position
+    fields = (
+        "quantity", "init_price", "init_commission",
+        "realised_pnl", "unrealised_pnl",
+        "buys", "sells", "avg_bot", "avg_sld",
+        "total_bot", "total_sld", "total_commission",
+        "avg_price", "cost_basis", "net", "net_total",
+        "net_incl_comm", "market_value"
+    )
+
+    ACTIONS = {"BOT": 1, "SLD": -1}
+    ACTION_NAMES = {1: "BOT", -1: "SLD"}
+
+    def __init__(self, capacity=16):
+        self.capacity = max(int(capacity), 1)
+        self.action = np.zeros(self.capacity, dtype=np.int8)
+        self.open_time = np.full(self.capacity, NAT, dtype=np.int64)
+        self._data = np.zeros((self.capacity, len(self.fields)), dtype=np.int64)
+        self._bind_columns()
+        self.tickers = [None] * self.capacity
+        # Righe delle posizioni aperte, nell'ordine di apertura
+        self._rows = {}
+        self._free_rows = list(range(self.capacity - 1, -1, -1))
+
+    def _bind_columns(self):
+        """
+        Espone ogni colonna di _data come attributo (ad es. self.quantity).
+        """
+        for i, field in enumerate(self.fields):
+            setattr(self, field, self._data[:, i])
+
+    def _grow(self):
+        """
+        Raddoppia la capacità di tutte le colonne.
+        """
+        old_capacity = self.capacity
+        self.capacity *= 2
+        action = np.zeros(self.capacity, dtype=np.int8)
+        action[:old_capacity] = self.action
+        self.action = action
+        open_time = np.full(self.capacity, NAT, dtype=np.int64)
+        open_time[:old_capacity] = self.open_time
+        self.open_time = open_time
+        data = np.zeros((self.capacity, len(self.fields)), dtype=np.int64)
+        data[:old_capacity] = self._data
+        self._data = data
+        self._bind_columns()
+        self.tickers.extend([None] * old_capacity)
+        self._free_rows.extend(range(self.capacity - 1, old_capacity - 1, -1))
+
+    def _store(self, row, position):
+        """
+        Copia i valori di un oggetto Position nella riga indicata.
+        """
+        values = position.__dict__
+        self.action[row] = self.ACTIONS[position.action]
+        self.tickers[row] = position.ticker
+        self._data[row] = [values[field] for field in self.fields]
+
+    def _position(self, row):
+        """
+        Restituisce i valori della riga indicata come oggetto Position.
+        """
+        position = Position.__new__(Position)
+        position.action = self.ACTION_NAMES[self.action.item(row)]
+        position.ticker = self.tickers[row]
+        position.__dict__.update(zip(self.fields, self._data[row].tolist()))
+        return position
+
+    def __contains__(self, ticker):
+        return ticker in self._rows
+
+    def __getitem__(self, ticker):
+        return PositionView(self, self._rows[ticker])
+
+    def __iter__(self):
+        return iter(list(self._rows))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, ticker, default=None):
+        if ticker in self._rows:
+            return self[ticker]
+        return default
+
+    def keys(self):
+        return list(self._rows)
+
+    def values(self):
+        return [self[ticker] for ticker in self._rows]
+
+    def items(self):
+        return [(ticker, self[ticker]) for ticker in self._rows]
+
+    def open(
+        self, action, ticker, quantity,
+        price, commission, bid, ask, timestamp=None
+    ):
+        """
+        Apre una nuova posizione, con gli stessi valori iniziali
+        di Position, e ne restituisce il PositionView. timestamp
+        è il momento dell'apertura, se noto.
+        """
+        if ticker in self._rows:
+            raise ValueError("Position for %s is already open" % ticker)
+        position = Position(
+            action, ticker, quantity, price, commission, bid, ask
+        )
+        if not self._free_rows:
+            self._grow()
+        row = self._free_rows.pop()
+        self._store(row, position)
+        self.open_time[row] = timestamp_ns(timestamp)
+        self._rows[ticker] = row
+        return PositionView(self, row)
+
+    def opened_at(self, ticker):
+        """
+        Restituisce il timestamp di apertura della posizione di un
+        ticker in nanosecondi da epoch (NAT se non noto).
+        """
+        return self.open_time.item(self._rows[ticker])
+
+    def transact(self, ticker, action, quantity, price, commission):
+        """
+        Aggiorna la posizione aperta di un ticker dopo un nuovo
+        acquisto o vendita (si veda Position.transact_shares).
+        """
+        row = self._rows[ticker]
+        position = self._position(row)
+        position.transact_shares(action, quantity, price, commission)
+        self._store(row, position)
+
+    def mark(self, ticker, bid, ask):
+        """
+        Rivaluta la posizione di un ticker al prezzo medio tra bid
+        e ask, come Position.update_market_value, e restituisce il suo
+        contributo al capitale (valore di mercato - costo base + PnL
+        realizzato) insieme al PnL non realizzato.
+        """
+        row = self._rows[ticker]
+        net = self.net.item(row)
+        market_value = self.quantity.item(row) * ((bid + ask) // 2) * (
+            (net > 0) - (net < 0)
+        )
+        cost_basis = self.cost_basis.item(row)
+        unrealised_pnl = market_value - cost_basis
+        self.market_value[row] = market_value
+        self.unrealised_pnl[row] = unrealised_pnl
+        return (
+            market_value - cost_basis + self.realised_pnl.item(row),
+            unrealised_pnl
+        )
+
+    def mark_all(self, bids, asks):
+        """
+        Rivaluta tutte le posizioni aperte con un'unica operazione
+        vettoriale. bids e asks sono allineati con l'ordine delle
+        posizioni (quello di iter(book)).
+
+        Restituisce gli array dei contributi al capitale e dei PnL
+        non realizzati, nello stesso ordine.
+        """
+        rows = np.fromiter(self._rows.values(), dtype=np.intp, count=len(self._rows))
+        midpoint = (
+            np.asarray(bids, dtype=np.int64) + np.asarray(asks, dtype=np.int64)
+        ) // 2
+        market_value = self.quantity[rows] * midpoint * np.sign(self.net[rows])
+        cost_basis = self.cost_basis[rows]
+        unrealised_pnl = market_value - cost_basis
+        self.market_value[rows] = market_value
+        self.unrealised_pnl[rows] = unrealised_pnl
+        return market_value - cost_basis + self.realised_pnl[rows], unrealised_pnl
+
+    def close(self, ticker):
+        """
+        Rimuove la posizione di un ticker dal book, liberandone la
+        riga, e la restituisce come oggetto Position.
+        """
+        row = self._rows.pop(ticker)
+        position = self._position(row)
+        self.tickers[row] = None
+        self._free_rows.append(row)
+        return position
+
+
+class PositionView(object):
+    """
+    Vista su una riga di PositionBook con gli stessi attributi e
+    metodi di Position. È valida finché la posizione resta aperta:
+    dopo close() la riga può essere riutilizzata da un altro ticker.
+    """
+
+    __slots__ = ("book", "row")
+
+    def __init__(self, book, row):
+        self.book = book
+        self.row = row
+
+    @property
+    def action(self):
+        return self.book.ACTION_NAMES[self.book.action.item(self.row)]
+
+    @property
+    def ticker(self):
+        return self.book.tickers[self.row]
+
+    def update_market_value(self, bid, ask):
+        self.book.mark(self.ticker, bid, ask)
+
+    def transact_shares(self, action, quantity, price, commission):
+        self.book.transact(self.ticker, action, quantity, price, commission)
+
+    def __repr__(self):
+        return "PositionView(%s, %s, quantity=%s)" % (
+            self.action, self.ticker, self.quantity
+        )
+
+
+def _column_property(field):
+    def fget(self):
+        return getattr(self.book, field).item(self.row)
+
+    def fset(self, value):
+        getattr(self.book, field)[self.row] = value
+    return property(fget, fset)
+
+
+for _field in PositionBook.fields:
+    setattr(PositionView, _field, _column_property(_field))
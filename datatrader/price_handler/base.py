@@ -2,6 +2,8 @@ from __future__ import print_function
 
 from abc import ABCMeta
 
+from ..event import EventType
+
 
 class AbstractPriceHandler(object):
     """
@@ -91,11 +93,24 @@ class AbstractBarPriceHandler(AbstractPriceHandler):
         """
         Memorizza il prezzo di chiusura e chiusura aggiustata dell'evento
         """
+        if event.type == EventType.BAR_SLICE:
+            self._store_slice_event(event)
+            return
         ticker = event.ticker
         self.tickers[ticker]["close"] = event.close_price
         self.tickers[ticker]["adj_close"] = event.adj_close_price
         self.tickers[ticker]["timestamp"] = event.time
 
+    def _store_slice_event(self, event):
+        """
+        Memorizza i prezzi di chiusura e chiusura aggiustata
+        di ogni ticker di un BarSliceEvent
+        """
+        for i, ticker in enumerate(event.tickers):
+            self.tickers[ticker]["close"] = event.close_price.item(i)
+            self.tickers[ticker]["adj_close"] = event.adj_close_price.item(i)
+            self.tickers[ticker]["timestamp"] = event.time
+
     def get_last_close(self, ticker):
         """
         Restituisce il prezzo di chiusura effettivo (non corretto) più recente
@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ..price_parser import PriceParser
+
+
+CACHE_VERSION = 2
+
+
+class ColumnCache(object):
+    """
+    ColumnCache memorizza su disco le colonne già analizzate e scalate
+    da PriceParser di ogni file CSV dei prezzi, in modo che i backtest
+    successivi non debbano analizzare nuovamente i CSV.
+
+    Ogni file sorgente ha una propria directory all'interno di
+    cache_dir contenente un file .npy per ogni colonna e un file
+    "meta.json" con il percorso, la data di modifica e la dimensione
+    del CSV. Se il CSV cambia (o cambia PRICE_MULTIPLIER) la voce
+    viene ricreata, altrimenti le colonne sono caricate tramite
+    memory-map, senza leggerle interamente in memoria.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def _entry_dir(self, path, kind):
+        """
+        Restituisce la directory della voce di cache per un file
+        sorgente e per il formato (kind) con cui è stato analizzato.
+        """
+        source = os.path.abspath(path)
+        digest = hashlib.sha1(
+            ("%s|%s" % (kind, source)).encode("utf-8")
+        ).hexdigest()[:16]
+        name = "%s-%s" % (os.path.splitext(os.path.basename(source))[0], digest)
+        return os.path.join(self.cache_dir, kind, name)
+
+    def _source_meta(self, path, kind, fields):
+        stat = os.stat(path)
+        return {
+            "version": CACHE_VERSION,
+            "kind": kind,
+            "source": os.path.abspath(path),
+            "mtime_ns": getattr(stat, "st_mtime_ns", int(stat.st_mtime * 1e9)),
+            "size": stat.st_size,
+            "price_multiplier": PriceParser.PRICE_MULTIPLIER,
+            "columns": ["time"] + list(fields),
+        }
+
+    def _read_entry(self, entry_dir, meta):
+        """
+        Restituisce le colonne memorizzate tramite memory-map se la
+        voce di cache è valida per il file sorgente, altrimenti None.
+        """
+        try:
+            with open(os.path.join(entry_dir, "meta.json")) as fd:
+                cached_meta = json.load(fd)
+        except (IOError, OSError, ValueError):
+            return None
+        if cached_meta != meta:
+            return None
+        try:
+            return dict(
+                (column, np.load(
+                    os.path.join(entry_dir, "%s.npy" % column), mmap_mode="r"
+                ))
+                for column in meta["columns"]
+            )
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_entry(self, entry_dir, meta, arrays):
+        """
+        Scrive le colonne in una directory temporanea e la rinomina
+        come voce di cache, così che un processo concorrente non
+        possa mai leggere una voce scritta a metà.
+        """
+        parent = os.path.dirname(entry_dir)
+        if not os.path.isdir(parent):
+            try:
+                os.makedirs(parent)
+            except OSError:
+                pass
+        tmp_dir = tempfile.mkdtemp(dir=parent)
+        try:
+            for column in meta["columns"]:
+                np.save(
+                    os.path.join(tmp_dir, "%s.npy" % column),
+                    np.ascontiguousarray(arrays[column])
+                )
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as fd:
+                json.dump(meta, fd)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.rename(tmp_dir, entry_dir)
+        except (IOError, OSError):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            print("Could not write the price cache entry '%s'" % entry_dir)
+
+    def load(self, kind, path, ticker, columns_cls, loader):
+        """
+        Restituisce un oggetto columns_cls (ad es. BarColumns) per
+        il file CSV in "path", analizzato nel formato "kind" (di
+        solito il nome del gestore dei prezzi). Se la cache non è
+        valida, le colonne vengono create tramite loader(path),
+        memorizzate su disco e restituite.
+        """
+        meta = self._source_meta(path, kind, columns_cls.fields)
+        entry_dir = self._entry_dir(path, kind)
+        arrays = self._read_entry(entry_dir, meta)
+        if arrays is not None:
+            return columns_cls.from_arrays(ticker, arrays)
+        columns = loader(path)
+        self._write_entry(entry_dir, meta, columns.arrays())
+        return columns
@@ -0,0 +1,355 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from ..event import BarEvent, BarSliceEvent, TickEvent
+from ..price_parser import PriceParser
+
+
+def sort_frame(df):
+    """
+    Restituisce il DataFrame ordinato per indice temporale, in modo
+    stabile, solo se non lo è già: merge_streams richiede che ogni
+    flusso sia ordinato nel tempo.
+    """
+    if df.index.is_monotonic_increasing:
+        return df
+    return df.sort_index(kind="mergesort")
+
+
+# Posizioni dei campi nel formato "%d.%m.%Y %H:%M:%S.%f"
+# dei tick, ad es. "01.02.2016 00:00:01.358"
+TICK_TIME_FORMAT = "%d.%m.%Y %H:%M:%S.%f"
+_TICK_TIME_SEPARATORS = ((2, b"."), (5, b"."), (10, b" "), (13, b":"), (16, b":"))
+_TICK_TIME_WIDTH = 19
+
+
+def _digits(chars, start, stop):
+    """
+    Converte le cifre ASCII nelle colonne [start, stop) di una
+    matrice di byte nel corrispondente valore intero.
+    """
+    value = np.zeros(len(chars), dtype=np.int64)
+    for k in range(start, stop):
+        value = value * 10 + chars[:, k]
+    return value
+
+
+def parse_tick_times(values):
+    """
+    Converte una colonna di stringhe nel formato a larghezza fissa
+    TICK_TIME_FORMAT (ad es. "01.02.2016 00:00:01.358") in un array
+    datetime64[ns], leggendo direttamente le cifre dai byte di ogni
+    stringa, senza inferenza del formato né oggetti datetime
+    intermedi. La parte frazionaria può avere da 0 a 9 cifre.
+    """
+    raw = np.asarray(values, dtype=object).astype(np.bytes_)
+    if len(raw) == 0:
+        return np.empty(0, dtype="datetime64[ns]")
+    width = raw.dtype.itemsize
+    if width < _TICK_TIME_WIDTH or width > _TICK_TIME_WIDTH + 10:
+        raise ValueError(
+            "Tick timestamps do not match the format '%s'" % TICK_TIME_FORMAT
+        )
+    chars = raw.view(np.uint8).reshape(len(raw), width).astype(np.int64)
+    ok = np.ones(len(raw), dtype=bool)
+    for pos, sep in _TICK_TIME_SEPARATORS:
+        ok &= chars[:, pos] == ord(sep)
+    digit_cols = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15, 17, 18]
+    fraction = chars[:, _TICK_TIME_WIDTH + 1:]
+    if width > _TICK_TIME_WIDTH:
+        # Le stringhe senza frazione o con frazione più corta sono
+        # completate da byte nulli, che valgono zero
+        ok &= (chars[:, _TICK_TIME_WIDTH] == ord(".")) | (
+            chars[:, _TICK_TIME_WIDTH] == 0
+        )
+        fraction = np.where(fraction == 0, ord("0"), fraction)
+    chars -= ord("0")
+    ok &= ((chars[:, digit_cols] >= 0) & (chars[:, digit_cols] <= 9)).all(axis=1)
+    fraction = fraction - ord("0")
+    ok &= ((fraction >= 0) & (fraction <= 9)).all(axis=1)
+    if not ok.all():
+        raise ValueError(
+            "Tick timestamps do not match the format '%s'" % TICK_TIME_FORMAT
+        )
+    day = _digits(chars, 0, 2)
+    month = _digits(chars, 3, 5)
+    year = _digits(chars, 6, 10)
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]").view(np.int64) + day - 1
+    nanos = np.zeros(len(raw), dtype=np.int64)
+    for k in range(fraction.shape[1]):
+        nanos += fraction[:, k] * 10 ** (8 - k)
+    seconds = (
+        days * 86400 + _digits(chars, 11, 13) * 3600 +
+        _digits(chars, 14, 16) * 60 + _digits(chars, 17, 19)
+    )
+    return (seconds * 1000000000 + nanos).view("datetime64[ns]")
+
+
+def merge_chunked_streams(streams, start_date=None, end_date=None):
+    """
+    Interlaccia in modo pigro le righe di più flussi, ciascuno
+    costituito da un iterabile di blocchi di colonne consecutivi
+    e ordinati nel tempo (di solito un flusso per ticker), tramite
+    un heap con chiave (timestamp, ticker).
+
+    Restituisce un generatore di coppie (columns, i) nello stesso
+    ordinamento deterministico di un ordinamento completo per
+    (timestamp, ticker), ma con memoria di lavoro proporzionale
+    al numero di flussi e senza attendere un ordinamento globale
+    prima del primo evento. Il blocco successivo di un flusso viene
+    richiesto solo quando quello corrente è esaurito.
+    """
+    def next_entry(index, chunks):
+        for columns in chunks:
+            start, end = columns.bounds(start_date, end_date)
+            if start < end:
+                times = columns.times.view(np.int64)
+                return (
+                    times.item(start), columns.ticker,
+                    index, start, end, times, columns, chunks
+                )
+        return None
+
+    heap = []
+    for index, stream in enumerate(streams):
+        entry = next_entry(index, iter(stream))
+        if entry is not None:
+            heap.append(entry)
+    heapq.heapify(heap)
+    while heap:
+        time, ticker, index, i, end, times, columns, chunks = heap[0]
+        yield columns, i
+        i += 1
+        if i < end:
+            heapq.heapreplace(
+                heap,
+                (times.item(i), ticker, index, i, end, times, columns, chunks)
+            )
+        else:
+            entry = next_entry(index, chunks)
+            if entry is not None:
+                heapq.heapreplace(heap, entry)
+            else:
+                heapq.heappop(heap)
+
+
+def merge_streams(columns_list, start_date=None, end_date=None):
+    """
+    Interlaccia in modo pigro le righe di più insiemi di colonne,
+    ciascuno già ordinato nel tempo (di solito uno per ticker).
+    Vedi merge_chunked_streams.
+    """
+    return merge_chunked_streams(
+        [[columns] for columns in columns_list], start_date, end_date
+    )
+
+
+def iter_bar_slices(columns_list, period, start_date=None, end_date=None):
+    """
+    Raggruppa le righe unite da merge_streams per timestamp e genera
+    un BarSliceEvent per ogni timestamp, con i ticker nello stesso
+    ordine (timestamp, ticker) dei singoli BarEvent.
+    """
+    rows = []
+    current = None
+    for columns, i in merge_streams(columns_list, start_date, end_date):
+        time = columns.times.view(np.int64).item(i)
+        if time != current and rows:
+            yield _bar_slice(rows, period)
+            rows = []
+        current = time
+        rows.append((columns, i))
+    if rows:
+        yield _bar_slice(rows, period)
+
+
+def _bar_slice(rows, period):
+    """
+    Crea il BarSliceEvent delle righe (columns, i) di un timestamp.
+    """
+    def column(field):
+        return np.array(
+            [getattr(columns, field).item(i) for columns, i in rows],
+            dtype=np.int64
+        )
+    columns, i = rows[0]
+    return BarSliceEvent(
+        columns.timestamp(i), period,
+        [columns.ticker for columns, i in rows],
+        column("open_price"), column("high_price"), column("low_price"),
+        column("close_price"), column("volume"), column("adj_close_price")
+    )
+
+class AbstractPriceColumns(object):
+    """
+    AbstractPriceColumns memorizza la serie di prezzi di un ticker
+    come colonne NumPy parallele: i timestamp e un insieme
+    di colonne int64 (prezzi già scalati da PriceParser o volumi)
+    elencate in "fields" dalle classi derivate.
+
+    La conversione viene eseguita una sola volta, quindi gli eventi
+    vengono generati accedendo alle colonne tramite un indice intero,
+    senza costruire alcuna pandas Series per ogni riga.
+    """
+
+    fields = ()
+
+    def __init__(self, ticker, times, *columns):
+        self.ticker = ticker
+        self.times = np.asarray(times, dtype="datetime64[ns]")
+        for field, column in zip(self.fields, columns):
+            setattr(self, field, column)
+
+    def arrays(self):
+        """
+        Restituisce un dizionario con tutte le colonne (incluso
+        "time"), utilizzato per la memorizzazione su disco.
+        """
+        arrays = dict(
+            (field, getattr(self, field)) for field in self.fields
+        )
+        arrays["time"] = self.times
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, ticker, arrays):
+        """
+        Crea le colonne di un singolo ticker a partire dal
+        dizionario restituito da arrays().
+        """
+        return cls(
+            ticker, arrays["time"],
+            *[arrays[field] for field in cls.fields]
+        )
+
+    def __len__(self):
+        return len(self.times)
+
+    def bounds(self, start_date=None, end_date=None):
+        """
+        Restituisce gli indici interi [start, end) delle righe
+        comprese tra start_date (incluso) ed end_date (escluso).
+        """
+        start = 0
+        end = len(self)
+        if start_date is not None:
+            start = int(self.times.searchsorted(
+                np.datetime64(pd.Timestamp(start_date), "ns")
+            ))
+        if end_date is not None:
+            end = int(self.times.searchsorted(
+                np.datetime64(pd.Timestamp(end_date), "ns")
+            ))
+        return start, end
+
+    def timestamp(self, i):
+        """
+        Restituisce il timestamp della riga i-esima come pandas Timestamp.
+        """
+        return pd.Timestamp(self.times.view(np.int64).item(i))
+
+
+class BarColumns(AbstractPriceColumns):
+    """
+    Colonne di barre OHLCV: prezzi di apertura, massimo, minimo,
+    chiusura e chiusura aggiustata scalati da PriceParser e volume.
+    """
+
+    fields = (
+        "open_price", "high_price", "low_price",
+        "close_price", "adj_close_price", "volume"
+    )
+
+    @classmethod
+    def from_frame(
+        cls, df, ticker,
+        open_col="Open", high_col="High", low_col="Low",
+        close_col="Close", adj_close_col="Adj Close",
+        volume_col="Volume", exact=False
+    ):
+        """
+        Crea le colonne a partire dal DataFrame di un singolo ticker,
+        indicizzato per data (anche in ordine decrescente, come
+        nei CSV scaricati da Yahoo). Se adj_close_col è None viene
+        usato il prezzo di chiusura come prezzo di chiusura aggiustato.
+        exact viene passato a PriceParser.parse_array.
+        """
+        df = sort_frame(df)
+        close_price = PriceParser.parse_array(df[close_col].values, exact)
+        if adj_close_col is None:
+            adj_close_price = close_price
+        else:
+            adj_close_price = PriceParser.parse_array(
+                df[adj_close_col].values, exact
+            )
+        return cls(
+            ticker, df.index.values,
+            PriceParser.parse_array(df[open_col].values, exact),
+            PriceParser.parse_array(df[high_col].values, exact),
+            PriceParser.parse_array(df[low_col].values, exact),
+            close_price, adj_close_price,
+            np.asarray(df[volume_col].values).astype(np.int64)
+        )
+
+    def event(self, i, period):
+        """
+        Crea il BarEvent corrispondente alla riga i-esima.
+        """
+        return BarEvent(
+            self.ticker, self.timestamp(i), period,
+            self.open_price.item(i), self.high_price.item(i),
+            self.low_price.item(i), self.close_price.item(i),
+            self.volume.item(i), self.adj_close_price.item(i)
+        )
+
+    def iter_events(self, period, start_date=None, end_date=None):
+        """
+        Genera in ordine i BarEvent compresi tra start_date ed end_date.
+        """
+        start, end = self.bounds(start_date, end_date)
+        for i in range(start, end):
+            yield self.event(i, period)
+
+
+class TickColumns(AbstractPriceColumns):
+    """
+    Colonne di tick: miglior prezzo bid e ask scalati da PriceParser.
+    """
+
+    fields = ("bid", "ask")
+
+    @classmethod
+    def from_frame(
+        cls, df, ticker, bid_col="Bid", ask_col="Ask", exact=False
+    ):
+        """
+        Crea le colonne a partire dal DataFrame dei tick di un
+        singolo ticker, indicizzato per timestamp. exact viene
+        passato a PriceParser.parse_array.
+        """
+        df = sort_frame(df)
+        return cls(
+            ticker, df.index.values,
+            PriceParser.parse_array(df[bid_col].values, exact),
+            PriceParser.parse_array(df[ask_col].values, exact)
+        )
+
+    def event(self, i):
+        """
+        Crea il TickEvent corrispondente alla riga i-esima.
+        """
+        return TickEvent(
+            self.ticker, self.timestamp(i),
+            self.bid.item(i), self.ask.item(i)
+        )
+
+    def iter_events(self, start_date=None, end_date=None):
+        """
+        Genera in ordine i TickEvent compresi tra start_date ed end_date.
+        """
+        start, end = self.bounds(start_date, end_date)
+        for i in range(start, end):
+            yield self.event(i)
@@ -2,9 +2,9 @@ import os
 
 import pandas as pd
 
-from ..price_parser import PriceParser
 from .base import AbstractBarPriceHandler
-from ..event import BarEvent
+from .cache import ColumnCache
+from .columnar import BarColumns, iter_bar_slices, merge_streams
 
 
 class IQFeedIntradayCsvBarPriceHandler(AbstractBarPriceHandler):
@@ -18,18 +18,37 @@ class IQFeedIntradayCsvBarPriceHandler(AbstractBarPriceHandler):
     def __init__(
         self, csv_dir, events_queue,
         init_tickers=None,
-        start_date=None, end_date=None
+        start_date=None, end_date=None,
+        cache_dir=None, bar_slices=False, exact_prices=False
     ):
         """
         Prende la directory CSV, la coda degli eventi e un possibile
         elenco di simboli ticker iniziali, quindi crea un elenco
         (opzionale) di sottoscrizioni di ticker e prezzi associati.
+
+        Se viene specificata una cache_dir, le colonne analizzate
+        di ogni CSV sono memorizzate in formato binario e riutilizzate
+        nei backtest successivi finché il CSV non viene modificato.
+
+        Se bar_slices è True, per ogni timestamp viene trasmesso un
+        unico BarSliceEvent con le barre di tutti i ticker, invece
+        di un BarEvent per ticker.
+
+        Se exact_prices è True i prezzi letti dal CSV vengono
+        arrotondati al valore scalato più vicino invece di essere
+        troncati (si veda PriceParser.parse_array), così che ad
+        esempio 0.41 diventi 4.100.000 e non 4.099.999.
         """
         self.csv_dir = csv_dir
         self.events_queue = events_queue
         self.continue_backtest = True
         self.tickers = {}
         self.tickers_data = {}
+        self.bar_slices = bar_slices
+        self.exact_prices = exact_prices
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = ColumnCache(cache_dir)
         if init_tickers is not None:
             for ticker in init_tickers:
                 self.subscribe_ticker(ticker)
@@ -37,15 +56,13 @@ class IQFeedIntradayCsvBarPriceHandler(AbstractBarPriceHandler):
         self.end_date = end_date
         self.bar_stream = self._merge_sort_ticker_data()
 
-    def _open_ticker_price_csv(self, ticker):
+    def _read_ticker_price_csv(self, ticker_path, ticker):
         """
-        Apre i file CSV contenenti i tick delle azioni dalla
-        directory dei dati CSV specificata, convertendoli
-        in un DataFrame panda, memorizzato in un dizionario.
+        Legge il file CSV di un ticker in un Pandas DataFrame e lo
+        converte in colonne con i prezzi scalati da PriceParser.
+        Il prezzo di chiusura è usato anche come chiusura aggiustata.
         """
-        ticker_path = os.path.join(self.csv_dir, "%s.csv" % ticker)
-
-        self.tickers_data[ticker] = pd.read_csv(
+        df = pd.read_csv(
             ticker_path,
             names=[
                 "Date", "Open", "Low", "High",
@@ -53,51 +70,70 @@ class IQFeedIntradayCsvBarPriceHandler(AbstractBarPriceHandler):
             ],
             index_col="Date", parse_dates=True
         )
-        self.tickers_data[ticker]["Ticker"] = ticker
+        return BarColumns.from_frame(
+            df, ticker, adj_close_col=None, exact=self.exact_prices
+        )
+
+    def _open_ticker_price_csv(self, ticker):
+        """
+        Apre i file CSV contenenti i tick delle azioni dalla
+        directory dei dati CSV specificata, convertendoli
+        in colonne di prezzi, memorizzate in un dizionario.
+        """
+        ticker_path = os.path.join(self.csv_dir, "%s.csv" % ticker)
+        if self.cache is None:
+            self.tickers_data[ticker] = self._read_ticker_price_csv(
+                ticker_path, ticker
+            )
+        else:
+            kind = self.__class__.__name__
+            if self.exact_prices:
+                kind += "-exact"
+            self.tickers_data[ticker] = self.cache.load(
+                kind, ticker_path, ticker, BarColumns,
+                lambda path: self._read_ticker_price_csv(path, ticker)
+            )
 
     def _merge_sort_ticker_data(self):
         """
-        Concatena tutti i diversi DataFrame di azioni in un singolo
-        DataFrame ordinato nel tempo, consentendo di aggiungere eventi
-        di dati tick alla coda in modo cronologico.
+        Unisce le colonne di tutte le azioni in un unico insieme
+        colonnare ordinato per (timestamp, ticker), consentendo
+        di aggiungere eventi di dati tick alla coda in modo
+        cronologico e deterministico.
 
         Nota che questa è una situazione idealizzata, utilizzata
         esclusivamente per il backtest. Nel trading live i tick
         possono arrivare "fuori servizio".
         """
-        df = pd.concat(self.tickers_data.values()).sort_index()
-        start = None
-        end = None
-        if self.start_date is not None:
-            start = df.index.searchsorted(self.start_date)
-        if self.end_date is not None:
-            end = df.index.searchsorted(self.end_date)
-        # Determina come fare lo spostamento
-        if start is None and end is None:
-            return df.iterrows()
-        elif start is not None and end is None:
-            return df.ix[start:].iterrows()
-        elif start is None and end is not None:
-            return df.ix[:end].iterrows()
-        else:
-            return df.ix[start:end].iterrows()
+        period = 60  # Secondi in un minuto
+        if self.bar_slices:
+            return iter_bar_slices(
+                list(self.tickers_data.values()), period,
+                self.start_date, self.end_date
+            )
+        return (
+            columns.event(i, period) for columns, i in merge_streams(
+                list(self.tickers_data.values()),
+                self.start_date, self.end_date
+            )
+        )
 
     def subscribe_ticker(self, ticker):
         """
         Sottoscrive il gestore del prezzo a un nuovo simbolo ticker.
+
+        I prezzi iniziali sono quelli della prima barra in ordine
+        cronologico, anche se il CSV è in ordine decrescente.
         """
         if ticker not in self.tickers:
             try:
                 self._open_ticker_price_csv(ticker)
-                dft = self.tickers_data[ticker]
-                row0 = dft.iloc[0]
-
-                close = PriceParser.parse(row0["Close"])
-
+                cols = self.tickers_data[ticker]
+                close = cols.close_price.item(0)
                 ticker_prices = {
                     "close": close,
                     "adj_close": close,
-                    "timestamp": dft.index[0]
+                    "timestamp": cols.timestamp(0)
                 }
                 self.tickers[ticker] = ticker_prices
             except OSError:
@@ -111,38 +147,15 @@ class IQFeedIntradayCsvBarPriceHandler(AbstractBarPriceHandler):
                 "as is already subscribed." % ticker
             )
 
-    def _create_event(self, index, period, ticker, row):
-        """
-        Ottiene tutti gli elementi della barra da una riga di
-        dataframe e restituisce un BarEvent
-        """
-        open_price = PriceParser.parse(row["Open"])
-        low_price = PriceParser.parse(row["Low"])
-        high_price = PriceParser.parse(row["High"])
-        close_price = PriceParser.parse(row["Close"])
-        adj_close_price = PriceParser.parse(row["Close"])
-        volume = int(row["Volume"])
-        bev = BarEvent(
-            ticker, index, period, open_price,
-            high_price, low_price, close_price,
-            volume, adj_close_price
-        )
-        return bev
-
     def stream_next(self):
         """
-        Inserire il prossimo BarEvent nella coda degli eventi.
+        Inserire il prossimo BarEvent (o BarSliceEvent) nella coda degli eventi.
         """
         try:
-            index, row = next(self.bar_stream)
+            bev = next(self.bar_stream)
         except StopIteration:
             self.continue_backtest = False
             return
-        # Ottieni tutti gli elementi della barra dal dataframe
-        ticker = row["Ticker"]
-        period = 60  # Secondi un minuto
-        # Crea l'evento tick per la coda
-        bev = self._create_event(index, period, ticker, row)
         # Memorizza l'evento
         self._store_event(bev)
         # Invia l'evento alla coda
@@ -4,7 +4,9 @@ import pandas as pd
 
 from ..price_parser import PriceParser
 from .base import AbstractBarPriceHandler
-from ..event import BarEvent
+from .cache import ColumnCache
+from .columnar import BarColumns, iter_bar_slices, merge_streams
+from ..event import EventType
 
 
 class YahooDailyCsvBarPriceHandler(AbstractBarPriceHandler):
@@ -18,18 +20,37 @@ class YahooDailyCsvBarPriceHandler(AbstractBarPriceHandler):
         self, csv_dir, events_queue,
         init_tickers=None,
         start_date=None, end_date=None,
-        calc_adj_returns=False
+        calc_adj_returns=False, cache_dir=None, bar_slices=False,
+        exact_prices=False
     ):
         """
         Prende la directory CSV, la coda degli eventi e un possibile
         elenco di simboli ticker iniziali, quindi crea un elenco
         (opzionale) di abbonamenti ticker e prezzi associati.
+
+        Se viene specificata una cache_dir, le colonne analizzate
+        di ogni CSV sono memorizzate in formato binario e riutilizzate
+        nei backtest successivi finché il CSV non viene modificato.
+
+        Se bar_slices è True, per ogni timestamp viene trasmesso un
+        unico BarSliceEvent con le barre di tutti i ticker, invece
+        di un BarEvent per ticker.
+
+        Se exact_prices è True i prezzi letti dal CSV vengono
+        arrotondati al valore scalato più vicino invece di essere
+        troncati (si veda PriceParser.parse_array), così che ad
+        esempio 0.41 diventi 4.100.000 e non 4.099.999.
         """
         self.csv_dir = csv_dir
         self.events_queue = events_queue
         self.continue_backtest = True
         self.tickers = {}
         self.tickers_data = {}
+        self.bar_slices = bar_slices
+        self.exact_prices = exact_prices
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = ColumnCache(cache_dir)
         if init_tickers is not None:
             for ticker in init_tickers:
                 self.subscribe_ticker(ticker)
@@ -40,67 +61,80 @@ class YahooDailyCsvBarPriceHandler(AbstractBarPriceHandler):
         if self.calc_adj_returns:
             self.adj_close_returns = []
 
+    def _read_ticker_price_csv(self, ticker_path, ticker):
+        """
+        Legge il file CSV di un ticker in un Pandas DataFrame e lo
+        converte in colonne con i prezzi scalati da PriceParser.
+        """
+        df = pd.io.parsers.read_csv(
+            ticker_path, parse_dates=True, index_col=0
+        )
+        return BarColumns.from_frame(df, ticker, exact=self.exact_prices)
+
     def _open_ticker_price_csv(self, ticker):
         """
         Apre i file CSV contenenti i tick delle azioni dalla
         directory dei dati CSV specificata, convertendoli in
-        un Pandas DataFrame, memorizzato in un dizionario.
+        colonne di prezzi, memorizzate in un dizionario.
         """
         ticker_path = os.path.join(self.csv_dir, "%s.csv" % ticker)
-        self.tickers_data[ticker] = pd.io.parsers.read_csv(
-            ticker_path, parse_dates=True, index_col=0
-        )
-        self.tickers_data[ticker]["Ticker"] = ticker
+        if self.cache is None:
+            self.tickers_data[ticker] = self._read_ticker_price_csv(
+                ticker_path, ticker
+            )
+        else:
+            kind = self.__class__.__name__
+            if self.exact_prices:
+                kind += "-exact"
+            self.tickers_data[ticker] = self.cache.load(
+                kind, ticker_path, ticker, BarColumns,
+                lambda path: self._read_ticker_price_csv(path, ticker)
+            )
 
     def _merge_sort_ticker_data(self):
         """
-        Concatena tutti i diversi DataFrame di azioni in un singolo
-        DataFrame ordinato nel tempo, consentendo di aggiungere eventi
-        di dati tick alla coda in modo cronologico.
+        Unisce le colonne NumPy di ogni azione, con i prezzi già
+        scalati da PriceParser, in un unico insieme colonnare
+        ordinato nel tempo, consentendo
+        di aggiungere eventi di dati tick alla coda in modo
+        cronologico senza iterare sulle righe del DataFrame.
 
         Nota: questa è una situazione idealizzata, utilizzata
         esclusivamente per il backtest. Nel trading live i tick
         possono arrivare "fuori servizio".
         """
-        df = pd.concat(self.tickers_data.values()).sort_index()
-        start = None
-        end = None
-        if self.start_date is not None:
-            start = df.index.searchsorted(self.start_date)
-        if self.end_date is not None:
-            end = df.index.searchsorted(self.end_date)
-
-        # Questo viene aggiunto in modo che gli eventi
-        # ticker siano sempre deterministici, altrimenti
+        # L'ordinamento per (timestamp, ticker) garantisce che
+        # gli eventi ticker siano sempre deterministici, altrimenti
         # i valori degli unit test saranno diversi
-        df['colFromIndex'] = df.index
-        df = df.sort_values(by=["colFromIndex", "Ticker"])
-        if start is None and end is None:
-            return df.iterrows()
-        elif start is not None and end is None:
-            return df.iloc[start:].iterrows()
-        elif start is None and end is not None:
-            return df.iloc[:end].iterrows()
-        else:
-            return df.iloc[start:end].iterrows()
+        period = 86400  # Secondi in un giorno
+        if self.bar_slices:
+            return iter_bar_slices(
+                list(self.tickers_data.values()), period,
+                self.start_date, self.end_date
+            )
+        return (
+            columns.event(i, period) for columns, i in merge_streams(
+                list(self.tickers_data.values()),
+                self.start_date, self.end_date
+            )
+        )
 
     def subscribe_ticker(self, ticker):
         """
         Sottoscrive il gestore del prezzo a un nuovo simbolo ticker.
+
+        I prezzi iniziali sono quelli della prima barra in ordine
+        cronologico, anche per i CSV in ordine decrescente (come
+        quelli scaricati da Yahoo), in cui è l'ultima riga del file.
         """
         if ticker not in self.tickers:
             try:
                 self._open_ticker_price_csv(ticker)
-                dft = self.tickers_data[ticker]
-                row0 = dft.iloc[0]
-
-                close = PriceParser.parse(row0["Close"])
-                adj_close = PriceParser.parse(row0["Adj Close"])
-
+                cols = self.tickers_data[ticker]
                 ticker_prices = {
-                    "close": close,
-                    "adj_close": adj_close,
-                    "timestamp": dft.index[0]
+                    "close": cols.close_price.item(0),
+                    "adj_close": cols.adj_close_price.item(0),
+                    "timestamp": cols.timestamp(0)
                 }
                 self.tickers[ticker] = ticker_prices
             except OSError:
@@ -114,28 +148,17 @@ class YahooDailyCsvBarPriceHandler(AbstractBarPriceHandler):
                 "as is already subscribed." % ticker
             )
 
-    def _create_event(self, index, period, ticker, row):
-        """
-        Ottiene tutti gli elementi della barra da una riga
-        di dataframe e restituisce un BarEvent
-        """
-        open_price = PriceParser.parse(row["Open"])
-        high_price = PriceParser.parse(row["High"])
-        low_price = PriceParser.parse(row["Low"])
-        close_price = PriceParser.parse(row["Close"])
-        adj_close_price = PriceParser.parse(row["Adj Close"])
-        volume = int(row["Volume"])
-        bev = BarEvent(
-            ticker, index, period, open_price,
-            high_price, low_price, close_price,
-            volume, adj_close_price
-        )
-        return bev
-
     def _store_event(self, event):
         """
         Memorizza il prezzo di chiusura e di chiusura aggiustata per ogni evento
         """
+        if event.type == EventType.BAR_SLICE:
+            if self.calc_adj_returns:
+                for bev in event.bars():
+                    self._store_event(bev)
+            else:
+                self._store_slice_event(event)
+            return
         ticker = event.ticker
         # Se il flag calc_adj_returns è True, calcola e memorizza
         # in un elenco tutta la lista dei rendimenti percentuali
@@ -154,18 +177,13 @@ class YahooDailyCsvBarPriceHandler(AbstractBarPriceHandler):
 
     def stream_next(self):
         """
-        Posiziona il prossimo BarEvent nella coda degli eventi.
+        Posiziona il prossimo BarEvent (o BarSliceEvent) nella coda degli eventi.
         """
         try:
-            index, row = next(self.bar_stream)
+            bev = next(self.bar_stream)
         except StopIteration:
             self.continue_backtest = False
             return
-        # Ottiene tutti gli elementi della barra dal dataframe
-        ticker = row["Ticker"]
-        period = 86400  # Seconds in a day
-        # Crea un tick event per la coda
-        bev = self._create_event(index, period, ticker, row)
         # Memorizza l'evento
         self._store_event(bev)
         # Invia l'evento alla coda
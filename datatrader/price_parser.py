@@ -1,9 +1,11 @@
 from __future__ import division
-from multipledispatch import dispatch
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 import numpy as np
 
 int_t = (int, np.int64)
 
+_POW10 = [10 ** i for i in range(8)]
+
 
 class PriceParser(object):
     """
@@ -19,46 +21,277 @@ class PriceParser(object):
     Per motivi di coerenza, PriceParser dovrebbe essere utilizzato per TUTTI
     i prezzi che entrano nel sistema DataTrader. Anche i numeri devono essere
     sempre analizzati correttamente per essere visualizzati.
+
+    parse e display controllano direttamente il tipo esatto del valore
+    (int, np.int64, float, str) prima di ricorrere a isinstance, dato che
+    sono richiamati per ogni barra, tick, ordine e aggiornamento delle
+    statistiche. parse_array e display_array sono gli equivalenti
+    vettoriali, da usare per convertire intere colonne NumPy.
+
+    I prezzi in formato stringa vengono convertiti in modo esatto da
+    parse_decimal: "0.29" diventa sempre 2.900.000 e non 2.899.999.
     """
 
     # 10,000,000
     PRICE_MULTIPLIER = 10000000
+    # Cifre decimali rappresentate da PRICE_MULTIPLIER
+    PRICE_DECIMALS = 7
 
     """Metodi di analisi. Moltiplica un float in un int, se necessario."""
 
     @staticmethod
-    @dispatch(int_t)
-    def parse(x):  # flake8: noqa
-        return x
+    def parse(x):
+        t = type(x)
+        if t is int or t is np.int64:
+            return x
+        if t is float:
+            return int(x * PriceParser.PRICE_MULTIPLIER)
+        if t is str:
+            return PriceParser.parse_decimal(x)
+        # Sottoclassi (bool, np.float64, ...)
+        if isinstance(x, int_t):
+            return x
+        if isinstance(x, float):
+            return int(x * PriceParser.PRICE_MULTIPLIER)
+        if isinstance(x, str):
+            return PriceParser.parse_decimal(str(x))
+        raise NotImplementedError(
+            "Could not parse a price of type %s" % t.__name__
+        )
 
     @staticmethod
-    @dispatch(str)
-    def parse(x):  # flake8: noqa
-        return int(float(x) * PriceParser.PRICE_MULTIPLIER)
+    def parse_decimal(x):
+        """
+        Converte un prezzo in formato stringa (ad es. "-12.345") nel
+        corrispondente intero scalato, arrotondando le cifre oltre la
+        settima al più vicino, con le metà arrotondate lontano dallo
+        zero, per cui il risultato è sempre il valore corretto (e mai
+        inferiore di un'unità). Le stringhe con "_" come separatore
+        delle cifre non sono accettate.
+
+        Per i prezzi inferiori a 10**7 il valore viene calcolato dal
+        float, arrotondando invece di troncare: l'errore del float
+        scalato è inferiore a 0.03, per cui quando il risultato dista
+        meno di 0.25 da un intero (sempre, con al massimo sette
+        decimali) questo è l'arrotondamento corretto. Gli altri prezzi
+        vengono convertiti separando parte intera e parte decimale
+        oppure, in altri formati (ad es. notazione esponenziale),
+        tramite Decimal.
+        """
+        if "_" in x:
+            raise ValueError("Could not parse the price '%s'" % x)
+        try:
+            scaled = float(x) * PriceParser.PRICE_MULTIPLIER
+        except ValueError:
+            raise ValueError("Could not parse the price '%s'" % x)
+        if -1e14 < scaled < 1e14:
+            value = round(scaled)
+            if -0.25 <= scaled - value <= 0.25:
+                return value
+        return PriceParser._parse_digits(x)
 
     @staticmethod
-    @dispatch(float)
-    def parse(x):  # flake8: noqa
-        return int(x * PriceParser.PRICE_MULTIPLIER)
+    def _parse_digits(x):
+        """
+        Conversione esatta di parse_decimal per le stringhe che non
+        possono essere calcolate dal float.
+        """
+        s = x.strip()
+        whole, _, frac = s.partition(".")
+        dp = len(frac) - PriceParser.PRICE_DECIMALS
+        if dp <= 0:
+            if frac.isdecimal() or not frac:
+                try:
+                    return int(whole + frac) * _POW10[-dp]
+                except ValueError:
+                    pass
+        elif frac.isdecimal():
+            try:
+                value = int(whole + frac[:-dp])
+            except ValueError:
+                pass
+            else:
+                if frac[-dp] >= "5":
+                    value += -1 if s[:1] == "-" else 1
+                return value
+        try:
+            value = Decimal(s)
+        except InvalidOperation:
+            raise ValueError("Could not parse the price '%s'" % x)
+        if not value.is_finite():
+            raise ValueError("Could not parse the price '%s'" % x)
+        return int(
+            (value * PriceParser.PRICE_MULTIPLIER).to_integral_value(
+                rounding=ROUND_HALF_UP
+            )
+        )
 
-    """Metodi di visualizzazione. Moltiplica un float in un int, se necessario. """
+    @staticmethod
+    def parse_decimal_array(values):
+        """
+        Equivalente vettoriale di parse_decimal applicato ad una intera
+        colonna di stringhe (ad es. letta da un CSV con dtype=str).
+
+        Come parse_decimal, i valori vengono calcolati dal float
+        (astype di NumPy) e arrotondati; le righe per cui il float non
+        garantisce il risultato esatto, o che NumPy non riesce a
+        convertire, sono elaborate da _parse_digits_array.
+        """
+        raw = np.asarray(values)
+        if raw.dtype.kind != "S":
+            raw = np.asarray(raw, dtype=object).astype(np.bytes_)
+        chars = raw.view(np.uint8).reshape(len(raw), raw.dtype.itemsize)
+        if (chars == ord("_")).any():
+            return PriceParser._parse_digits_array(raw)
+        try:
+            scaled = raw.astype(np.float64) * PriceParser.PRICE_MULTIPLIER
+        except ValueError:
+            return PriceParser._parse_digits_array(raw)
+        with np.errstate(invalid="ignore"):
+            rounded = np.round(scaled)
+            exact = (np.abs(scaled) < 1e14) & (np.abs(scaled - rounded) <= 0.25)
+        value = np.where(exact, rounded, 0).astype(np.int64)
+        if not exact.all():
+            inexact = ~exact
+            value[inexact] = PriceParser._parse_digits_array(raw[inexact])
+        return value
 
     @staticmethod
-    @dispatch(int_t)
-    def display(x):  # flake8: noqa
-        return round(x / PriceParser.PRICE_MULTIPLIER, 2)
+    def _parse_digits_array(raw):
+        """
+        Conversione esatta di un array di byte a larghezza fissa,
+        elaborato una colonna di caratteri alla volta accumulando le
+        cifre come intero. Le righe che non sono nel formato
+        [+-]cifre[.cifre] vengono convertite singolarmente da
+        parse_decimal.
+        """
+        n = len(raw)
+        width = raw.dtype.itemsize
+        chars = raw.view(np.uint8).reshape(n, width)
+        dp = PriceParser.PRICE_DECIMALS
+
+        value = np.zeros(n, dtype=np.int64)
+        frac_digits = np.zeros(n, dtype=np.int64)
+        round_up = np.zeros(n, dtype=bool)
+        seen_dot = np.zeros(n, dtype=bool)
+        seen_digit = np.zeros(n, dtype=bool)
+        valid = np.ones(n, dtype=bool)
+        ended = np.zeros(n, dtype=bool)
+        negative = chars[:, 0] == ord("-") if width else seen_dot.copy()
+        for j in range(width):
+            c = chars[:, j]
+            is_digit = (c >= ord("0")) & (c <= ord("9"))
+            is_dot = c == ord(".")
+            is_pad = c == 0
+            is_sign = (c == ord("-")) | (c == ord("+"))
+            if j == 0:
+                valid &= is_digit | is_dot | is_sign
+            else:
+                valid &= is_digit | is_dot | is_pad
+            # Nessun carattere dopo il riempimento, un solo punto
+            valid &= ~(ended & ~is_pad)
+            valid &= ~(seen_dot & is_dot)
+            ended |= is_pad
+            digit = c.astype(np.int64) - ord("0")
+            take = is_digit & (~seen_dot | (frac_digits < dp))
+            value = np.where(take, value * 10 + digit, value)
+            round_up |= is_digit & seen_dot & (frac_digits == dp) & (digit >= 5)
+            frac_digits += is_digit & seen_dot
+            seen_digit |= is_digit
+            seen_dot |= is_dot
+        valid &= seen_digit
+
+        scale = 10 ** (dp - np.minimum(frac_digits, dp))
+        value = value * scale + round_up
+        value = np.where(negative, -value, value)
+        for i in np.flatnonzero(~valid):
+            value[i] = PriceParser.parse_decimal(
+                raw[i].decode("utf-8", "replace")
+            )
+        return value
 
     @staticmethod
-    @dispatch(float)
-    def display(x):  # flake8: noqa
-        return round(x, 2)
+    def parse_array(values, exact=False):
+        """
+        Equivalente vettoriale di parse applicato ad una intera colonna
+        di prezzi.
+
+        Le colonne float vengono moltiplicate per PRICE_MULTIPLIER e
+        troncate verso lo zero (come int(x * PRICE_MULTIPLIER)), le
+        colonne di stringhe convertite in modo esatto da
+        parse_decimal_array, mentre le colonne intere sono considerate
+        già scalate e restituite invariate, esattamente come avviene
+        per i singoli valori.
+
+        Se exact è True le colonne float vengono invece arrotondate
+        all'intero più vicino (metà lontano dallo zero): i float letti
+        da un CSV sono i double più vicini ai prezzi decimali, per cui
+        con al massimo sette decimali si ottiene esattamente lo stesso
+        risultato di parse_decimal, senza troncamenti, alla stessa
+        velocità della conversione predefinita.
+        """
+        values = np.asarray(values)
+        if values.dtype.kind in "iu":
+            return values.astype(np.int64)
+        if values.dtype.kind in "SU":
+            return PriceParser.parse_decimal_array(values)
+        if values.dtype.kind == "O":
+            if all(type(x) is str for x in values):
+                return PriceParser.parse_decimal_array(values)
+            # Tipi misti: ogni valore segue le regole di parse
+            return np.array(
+                [PriceParser.parse(x) for x in values], dtype=np.int64
+            )
+        values = values.astype(np.float64)
+        if np.isnan(values).any():
+            raise ValueError("Cannot parse a price column containing NaN values")
+        scaled = values * PriceParser.PRICE_MULTIPLIER
+        if exact:
+            scaled = np.copysign(np.floor(np.abs(scaled) + 0.5), scaled)
+        return scaled.astype(np.int64)
+
+    """Metodi di visualizzazione. Moltiplica un float in un int, se necessario. """
 
     @staticmethod
-    @dispatch(int_t, int)
-    def display(x, dp):  # flake8: noqa
-        return round(x / PriceParser.PRICE_MULTIPLIER, dp)
+    def display(x, dp=2):
+        t = type(x)
+        if t is int or t is np.int64:
+            return round(x / PriceParser.PRICE_MULTIPLIER, dp)
+        if t is float:
+            return round(x, dp)
+        if isinstance(x, int_t):
+            return round(x / PriceParser.PRICE_MULTIPLIER, dp)
+        if isinstance(x, float):
+            return round(x, dp)
+        raise NotImplementedError(
+            "Could not display a price of type %s" % t.__name__
+        )
 
     @staticmethod
-    @dispatch(float, int)
-    def display(x, dp):  # flake8: noqa
-        return round(x, dp)
+    def display_array(values, dp=2):
+        """
+        Equivalente vettoriale di display applicato ad una intera
+        colonna di prezzi, interi (scalati) o float.
+
+        np.round scala per 10**dp e arrotonda al pari, per cui può
+        differire da round() nei pochi valori che, scalati, cadono
+        (quasi) esattamente a metà tra due cifre: questi vengono
+        ricalcolati uno ad uno con round(), così che il risultato
+        coincida sempre con quello di display.
+        """
+        values = np.asarray(values)
+        if values.dtype.kind == "O":
+            # Tipi misti: ogni valore segue le regole di display
+            return np.array(
+                [PriceParser.display(x, dp) for x in values], dtype=np.float64
+            )
+        if values.dtype.kind in "iu":
+            values = values / PriceParser.PRICE_MULTIPLIER
+        else:
+            values = values.astype(np.float64)
+        rounded = np.round(values, dp)
+        scaled = values * 10.0 ** dp
+        halfway = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        for i in np.flatnonzero(halfway):
+            rounded.flat[i] = round(float(values.flat[i]), dp)
+        return rounded
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import importlib
+
+import click
+import yaml
+
+from datatrader import settings
+from datatrader.sweep import run_sweep
+
+
+def load_factory(path):
+    """
+    Importa la factory della sessione indicata come "modulo:funzione".
+    """
+    module_name, _, function_name = path.partition(":")
+    if not function_name:
+        raise click.BadParameter(
+            "expected 'module:function', got '%s'" % path, param_hint="--factory"
+        )
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def parse_params(params):
+    """
+    Converte le opzioni "nome=v1,v2,..." in una griglia di parametri.
+    I valori sono interpretati come YAML (numeri, booleani, stringhe).
+    """
+    grid = {}
+    for param in params:
+        name, sep, values = param.partition("=")
+        if not sep or not values:
+            raise click.BadParameter(
+                "expected 'name=v1,v2,...', got '%s'" % param, param_hint="--param"
+            )
+        grid[name.strip()] = [yaml.safe_load(v) for v in values.split(",")]
+    return grid
+
+
+def run(factory, params, workers, config_filename, output, testing=False):
+    config = settings.from_file(config_filename, testing)
+    results = run_sweep(
+        load_factory(factory), parse_params(params), config,
+        max_workers=workers or None
+    )
+    if output:
+        results.to_csv(output, index=False)
+    print(results.to_string())
+    return results
+
+
+@click.command()
+@click.option('--factory', required=True, help='Session factory as module:function (e.g. moving_average_cross_backtest:create_session)')
+@click.option('--param', '-p', 'params', multiple=True, help='Parameter values as name=v1,v2,... (repeatable)')
+@click.option('--workers', default=0, help='Number of worker processes (0 = one per CPU)')
+@click.option('--config', 'config_filename', default=settings.DEFAULT_CONFIG_FILENAME, help='Config filename')
+@click.option('--output', default='', help='CSV file for the results')
+def main(factory, params, workers, config_filename, output):
+    return run(factory, params, workers, config_filename, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,17 @@ class AbstractStatistics(object):
 
     __metaclass__ = ABCMeta
 
+    # Numero di eventi di prezzo (tick o barre) tra due chiamate
+    # di update() da parte di TradingSession. Le sottoclassi per
+    # timeframe brevi possono aumentarlo per ridurre la frequenza
+    # di aggiornamento delle statistiche.
+    update_every = 1
+
+    # Durata in secondi delle barre della sessione (BarEvent.period),
+    # impostata da TradingSession tramite set_bar_period. È None per
+    # i dati tick o prima della prima barra.
+    bar_period = None
+
     @abstractmethod
     def update(self):
         """
@@ -31,6 +42,14 @@ class AbstractStatistics(object):
         """
         raise NotImplementedError("Should implement update()")
 
+    def set_bar_period(self, period):
+        """
+        Memorizza la durata delle barre, utilizzata dalle sottoclassi
+        per annualizzare le statistiche (si veda
+        performance.periods_from_bar_period).
+        """
+        self.bar_period = period
+
     @abstractmethod
     def get_results(self):
         """
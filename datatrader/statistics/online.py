@@ -0,0 +1,360 @@
+from .base import AbstractStatistics
+from ..compat import pickle
+from ..price_parser import PriceParser
+from . import performance as perf
+
+from collections import deque
+import datetime
+import math
+import os
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+
+def _ratio(mean, std):
+    """
+    mean / std con gli stessi risultati della divisione tra
+    float di NumPy/pandas quando la deviazione standard è nulla.
+    """
+    if std > 0:
+        return mean / std
+    if mean == 0 or mean != mean:
+        return float("nan")
+    return math.copysign(float("inf"), mean)
+
+
+def _log(x):
+    """
+    Logaritmo naturale con i risultati di np.log per x <= 0.
+    """
+    if x > 0:
+        return math.log(x)
+    if x == 0:
+        return float("-inf")
+    return float("nan")
+
+
+class StreamingCurve(object):
+    """
+    StreamingCurve calcola in modo incrementale, con un costo O(1)
+    per ogni nuovo valore, le statistiche di una curva equity che
+    TearsheetStatistics ricava da zero a fine backtest:
+
+    - media e varianza dei rendimenti (algoritmo di Welford) e
+      quindi lo Sharpe ratio;
+    - media e varianza dei rendimenti dell'ultima finestra di
+      window periodi, per lo Sharpe ratio mobile;
+    - rendimenti cumulativi, high water mark, drawdown corrente e
+      massimo, durata del drawdown corrente e massima.
+
+    I valori seguono la stessa definizione di performance.py: il
+    primo rendimento è zero, il primo punto non è mai in drawdown
+    e la durata è il numero di periodi consecutivi con drawdown
+    diverso da zero.
+
+    Più valori con lo stesso timestamp sostituiscono il precedente
+    (come nel dizionario equity di TearsheetStatistics): l'ultimo
+    passo viene annullato, ripristinando lo stato salvato, e
+    ricalcolato con il nuovo valore. I timestamp devono quindi
+    essere forniti in ordine cronologico.
+
+    Se keep_history è True vengono memorizzate anche le serie
+    (equity, rendimenti, drawdown, ecc.) da restituire come
+    pandas Series in get_results.
+    """
+
+    # Attributi scalari ripristinati da _rollback
+    _state = (
+        "count", "mean", "_m2", "_window_mean", "_window_m2", "_log_sum",
+        "cum_return", "high_water_mark", "drawdown", "drawdown_duration",
+        "max_drawdown", "max_drawdown_duration", "last_time", "last_value",
+        "last_return", "_previous_value"
+    )
+
+    def __init__(self, periods=252, window=None, keep_history=True):
+        self.periods = periods
+        self.window = max(int(round(periods)), 2) if window is None else window
+        self.keep_history = keep_history
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._window = deque()
+        self._window_mean = 0.0
+        self._window_m2 = 0.0
+        self._log_sum = 0.0
+        self.cum_return = 1.0
+        self.high_water_mark = 0.0
+        self.drawdown = 0.0
+        self.drawdown_duration = 0
+        self.max_drawdown = 0.0
+        self.max_drawdown_duration = 0
+        self.last_time = None
+        self.last_value = None
+        self.last_return = 0.0
+        self._previous_value = None
+        self._saved = None
+        self._evicted = None
+        self.history = {
+            "time": [], "equity": [], "returns": [], "rolling_sharpe": [],
+            "cum_returns": [], "drawdowns": []
+        }
+
+    def update(self, timestamp, value):
+        """
+        Aggiunge il valore della curva al timestamp indicato, o lo
+        sostituisce se il timestamp è lo stesso dell'ultimo valore.
+        """
+        if self.count > 0 and timestamp == self.last_time:
+            self._rollback()
+        self._saved = [getattr(self, name) for name in self._state]
+        self._push(timestamp, value)
+
+    def _rollback(self):
+        """
+        Annulla l'ultimo passo, ripristinando lo stato precedente.
+        """
+        for name, value in zip(self._state, self._saved):
+            setattr(self, name, value)
+        self._window.pop()
+        if self._evicted is not None:
+            self._window.appendleft(self._evicted)
+        if self.keep_history:
+            for values in self.history.values():
+                values.pop()
+
+    def _push(self, timestamp, value):
+        previous = self.last_value
+        if previous is None:
+            ret = 0.0
+        elif previous != 0:
+            ret = value / previous - 1.0
+        else:
+            # pct_change().fillna(0.0) per 0 / 0
+            ret = 0.0 if value == 0 else math.copysign(float("inf"), value)
+        self._previous_value = previous
+        self.last_time = timestamp
+        self.last_value = value
+        self.last_return = ret
+
+        # Media e varianza di tutti i rendimenti (Welford)
+        self.count += 1
+        delta = ret - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (ret - self.mean)
+
+        # Media e varianza della finestra mobile
+        self._window.append(ret)
+        n = len(self._window)
+        delta = ret - self._window_mean
+        self._window_mean += delta / n
+        self._window_m2 += delta * (ret - self._window_mean)
+        self._evicted = None
+        if n > self.window:
+            old = self._evicted = self._window.popleft()
+            n -= 1
+            delta = old - self._window_mean
+            self._window_mean -= delta / n
+            self._window_m2 -= delta * (old - self._window_mean)
+
+        # Rendimenti cumulativi e drawdown
+        self._log_sum += _log(1.0 + ret)
+        self.cum_return = math.exp(self._log_sum)
+        if self.count > 1:
+            self.high_water_mark = max(self.high_water_mark, self.cum_return)
+            self.drawdown = (
+                (self.high_water_mark - self.cum_return) / self.high_water_mark
+            )
+            self.max_drawdown = max(self.max_drawdown, self.drawdown)
+        if self.drawdown != 0:
+            self.drawdown_duration += 1
+            self.max_drawdown_duration = max(
+                self.max_drawdown_duration, self.drawdown_duration
+            )
+        else:
+            self.drawdown_duration = 0
+
+        if self.keep_history:
+            history = self.history
+            history["time"].append(timestamp)
+            history["equity"].append(value)
+            history["returns"].append(ret)
+            history["rolling_sharpe"].append(self.rolling_sharpe)
+            history["cum_returns"].append(self.cum_return)
+            history["drawdowns"].append(self.drawdown)
+
+    @property
+    def variance(self):
+        """
+        Varianza (della popolazione, ddof=0, come np.std) dei rendimenti.
+        """
+        if self.count == 0:
+            return float("nan")
+        return max(self._m2, 0.0) / self.count
+
+    @property
+    def sharpe(self):
+        """
+        Sharpe ratio annualizzato di tutti i rendimenti, come
+        perf.create_sharpe_ratio.
+        """
+        if self.count == 0:
+            return float("nan")
+        return math.sqrt(self.periods) * _ratio(
+            self.mean, math.sqrt(self.variance)
+        )
+
+    @property
+    def rolling_sharpe(self):
+        """
+        Sharpe ratio annualizzato degli ultimi window rendimenti
+        (deviazione standard campionaria, come rolling().std()),
+        NaN finché la finestra non è completa.
+        """
+        n = len(self._window)
+        if n < self.window or n < 2:
+            return float("nan")
+        std = math.sqrt(max(self._window_m2, 0.0) / (n - 1))
+        return math.sqrt(self.periods) * _ratio(self._window_mean, std)
+
+    def series(self, name):
+        """
+        Restituisce una delle serie memorizzate come pandas Series
+        indicizzata per timestamp.
+        """
+        return pd.Series(
+            self.history[name], index=self.history["time"], dtype=float
+        )
+
+
+class OnlineStatistics(AbstractStatistics):
+    """
+    OnlineStatistics mantiene le statistiche della curva equity in
+    modo incrementale (si veda StreamingCurve), così che
+    get_results() possa essere richiamato in qualsiasi momento di
+    una sessione live o di un lungo backtest intraday senza
+    ricalcolare rendimenti, Sharpe ratio e drawdown dall'inizio.
+
+    get_results() restituisce le stesse chiavi di TearsheetStatistics
+    (escluso il DataFrame delle posizioni chiuse), con gli stessi
+    valori, più i valori correnti di drawdown, durata del drawdown,
+    high water mark e Sharpe ratio mobile. Con keep_history=False
+    non vengono memorizzate né restituite le serie temporali.
+
+    Le statistiche sono annualizzate durante la sessione, per cui
+    periods deve essere noto prima del primo aggiornamento: se è None
+    viene ricavato dal periodo delle barre (set_bar_period), oppure,
+    per i dati tick, vale 252.
+    """
+    def __init__(
+        self, config, portfolio_handler, benchmark=None,
+        periods=None, window=None, keep_history=True
+    ):
+        self.config = config
+        self.portfolio_handler = portfolio_handler
+        self.price_handler = portfolio_handler.price_handler
+        self.benchmark = benchmark
+        self.periods = periods
+        self.window = window
+        self.keep_history = keep_history
+        self._create_curves(perf.TRADING_DAYS if periods is None else periods)
+
+    def _create_curves(self, periods):
+        self.curve = StreamingCurve(periods, self.window, self.keep_history)
+        self.curve_benchmark = None
+        if self.benchmark is not None:
+            self.curve_benchmark = StreamingCurve(
+                periods, self.window, self.keep_history
+            )
+
+    def set_bar_period(self, period):
+        """
+        Annualizza le statistiche in base alla durata delle barre,
+        se periods non è stato indicato e la sessione non è iniziata.
+        """
+        self.bar_period = period
+        if self.periods is None and self.curve.count == 0:
+            self._create_curves(perf.periods_from_bar_period(period))
+
+    def update(self, timestamp, portfolio_handler):
+        """
+        Aggiorna le statistiche della curva equity e del benchmark.
+        """
+        self.curve.update(
+            timestamp,
+            PriceParser.display(self.portfolio_handler.portfolio.equity)
+        )
+        if self.curve_benchmark is not None:
+            self.curve_benchmark.update(
+                timestamp,
+                PriceParser.display(
+                    self.price_handler.get_last_close(self.benchmark)
+                )
+            )
+
+    def _curve_results(self, curve, suffix=""):
+        statistics = {}
+        statistics["sharpe" + suffix] = curve.sharpe
+        statistics["max_drawdown" + suffix] = curve.max_drawdown
+        statistics["max_drawdown_pct" + suffix] = curve.max_drawdown
+        statistics["max_drawdown_duration" + suffix] = curve.max_drawdown_duration
+        statistics["drawdown" + suffix] = curve.drawdown
+        statistics["drawdown_duration" + suffix] = curve.drawdown_duration
+        statistics["high_water_mark" + suffix] = curve.high_water_mark
+        statistics["current_rolling_sharpe" + suffix] = curve.rolling_sharpe
+        if curve.keep_history:
+            for name in (
+                "equity", "returns", "rolling_sharpe", "cum_returns", "drawdowns"
+            ):
+                statistics[name + suffix] = curve.series(name)
+        return statistics
+
+    def get_results(self):
+        """
+        Restituisce un dizionario con i valori correnti delle statistiche.
+        """
+        statistics = self._curve_results(self.curve)
+        statistics["periods"] = self.curve.periods
+        statistics["trade_statistics"] = (
+            self.portfolio_handler.portfolio.closed_positions.statistics.summary()
+        )
+        if self.curve_benchmark is not None:
+            statistics.update(self._curve_results(self.curve_benchmark, "_b"))
+        return statistics
+
+    def plot_results(self):
+        """
+        Visualizza la curva equity e i drawdown memorizzati fino ad "ora".
+        """
+        if not self.keep_history:
+            print("No history to plot: OnlineStatistics has keep_history=False")
+            return
+        sns.set_palette("deep", desat=.6)
+        sns.set_context(rc={"figure.figsize": (8, 4)})
+
+        fig = plt.figure()
+        fig.patch.set_facecolor('white')
+
+        ax1 = fig.add_subplot(211, ylabel='Equity Value')
+        self.curve.series("equity").plot(ax=ax1, color=sns.color_palette()[0])
+
+        ax2 = fig.add_subplot(212, ylabel='Drawdowns')
+        (-100 * self.curve.series("drawdowns")).plot(
+            ax=ax2, color=sns.color_palette()[2]
+        )
+
+        fig.autofmt_xdate()
+        plt.show()
+
+    def get_filename(self, filename=""):
+        if filename == "":
+            now = datetime.datetime.utcnow()
+            filename = "statistics_" + now.strftime("%Y-%m-%d_%H%M%S") + ".pkl"
+            filename = os.path.expanduser(os.path.join(self.config.OUTPUT_DIR, filename))
+        return filename
+
+    def save(self, filename=""):
+        filename = self.get_filename(filename)
+        print("Save results to '%s'" % filename)
+        with open(filename, 'wb') as fd:
+            pickle.dump(self, fd)
@@ -1,33 +1,148 @@
-from itertools import groupby
-
 import numpy as np
 import pandas as pd
 from scipy.stats import linregress
 
 
-def aggregate_returns(returns, convert_to):
+# Giorni e ore di negoziazione in un anno e in un giorno, utilizzati
+# per annualizzare rendimenti giornalieri e intraday
+TRADING_DAYS = 252
+TRADING_HOURS = 6.5
+
+_DAY = 86400
+
+
+def periods_from_bar_period(period):
     """
-    Aggrega i rendimenti per giorno, settimana, mese o anno.
+    Restituisce il numero di periodi in un anno per barre della
+    durata di period secondi (come BarEvent.period): 252 per le
+    barre giornaliere, 252 * 6.5 per quelle orarie, 252 * 6.5 * 60
+    per quelle al minuto, 52 per quelle settimanali, ecc., come
+    infer_periods per gli stessi dati.
+    """
+    if period >= 7 * _DAY:
+        return 52 * 7 * _DAY / period
+    if period >= _DAY:
+        return TRADING_DAYS * _DAY / period
+    return TRADING_DAYS * max(TRADING_HOURS * 3600.0 / period, 1.0)
+
+
+def infer_periods(index):
+    """
+    Stima il numero di periodi in un anno dai timestamp di una serie
+    (ad es. la curva equity), da utilizzare per annualizzare Sharpe,
+    Sortino, CAGR e volatilità.
+
+    Con una distanza mediana tra i timestamp di almeno un giorno si
+    ottengono 252 (giornaliero), 52 (settimanale), 12 (mensile),
+    4 (trimestrale) o 1 (annuale), mentre per i dati intraday il
+    risultato è 252 volte il numero mediano di timestamp per giorno,
+    così da tenere conto delle ore effettive di negoziazione.
+    Restituisce 252 se i timestamp sono meno di due.
     """
-    def cumulate_returns(x):
-        return np.exp(np.log(1 + x).cumsum())[-1] - 1
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return TRADING_DAYS
+    times = index.as_unit("ns").asi8
+    deltas = np.diff(np.sort(times))
+    deltas = deltas[deltas > 0]
+    if len(deltas) == 0:
+        return TRADING_DAYS
+    days = np.median(deltas) / (_DAY * 1e9)
+    if days >= 0.8:
+        for limit, periods in ((4, TRADING_DAYS), (10, 52), (45, 12), (120, 4)):
+            if days < limit:
+                return periods
+        return 1
+    per_day = np.bincount(times // (_DAY * 10 ** 9) - times.min() // (_DAY * 10 ** 9))
+    return TRADING_DAYS * float(np.median(per_day[per_day > 0]))
 
-    if convert_to == 'weekly':
-        return returns.groupby(
-            [lambda x: x.year,
-             lambda x: x.month,
-             lambda x: x.isocalendar()[1]]).apply(cumulate_returns)
+
+def _periods(series, periods):
+    """
+    Restituisce periods o, se è None, la stima di infer_periods.
+    """
+    if periods is None:
+        return infer_periods(series.index)
+    return periods
+
+
+def _period_keys(index, convert_to):
+    """
+    Restituisce le chiavi (anno, mese, ...) del periodo di ogni
+    timestamp per le aggregazioni di calendario.
+    """
+    if convert_to == 'daily':
+        keys = [index.year, index.month, index.day]
+    elif convert_to == 'weekly':
+        keys = [index.year, index.month, index.isocalendar().week]
     elif convert_to == 'monthly':
-        return returns.groupby(
-            [lambda x: x.year, lambda x: x.month]).apply(cumulate_returns)
+        keys = [index.year, index.month]
     elif convert_to == 'yearly':
-        return returns.groupby(
-            [lambda x: x.year]).apply(cumulate_returns)
+        keys = [index.year]
     else:
-        ValueError('convert_to must be weekly, monthly or yearly')
+        return None
+    return [np.asarray(key, dtype=np.int64) for key in keys]
 
 
-def create_cagr(equity, periods=252):
+def aggregate_returns(returns, convert_to):
+    """
+    Aggrega i rendimenti per giorno, settimana, mese o anno.
+
+    Il rendimento di ogni periodo è il prodotto di (1 + r) meno uno,
+    calcolato con np.multiply.reduceat sui blocchi contigui di
+    timestamp con lo stesso codice di periodo (ad es. anno * 12 +
+    mese), senza funzioni Python per gruppo. I rendimenti NaN sono
+    ignorati (come dal cumsum della versione precedente).
+
+    Parametri:
+    returns - Una serie Pandas dei rendimenti, indicizzata per timestamp.
+    convert_to - 'daily', 'weekly' (anno, mese, settimana ISO), 'monthly'
+        e 'yearly' restituiscono una serie indicizzata dalle chiavi del
+        periodo (l'anno o un MultiIndex), mentre qualsiasi offset di
+        pandas (ad es. 'W-FRI', 'QE', '4h') aggrega con resample,
+        restituendo una serie indicizzata dall'etichetta di ogni
+        intervallo, esclusi quelli senza rendimenti.
+    """
+    index = returns.index
+    values = np.asarray(returns, dtype=np.float64)
+    keys = _period_keys(index, convert_to)
+    if keys is None:
+        try:
+            offset = pd.tseries.frequencies.to_offset(convert_to)
+        except ValueError:
+            raise ValueError(
+                'convert_to must be daily, weekly, monthly, yearly '
+                'or a pandas offset'
+            )
+        # Posizione della prima riga di ogni intervallo non vuoto
+        first = pd.Series(np.arange(len(values)), index=index).resample(
+            offset
+        ).min().dropna()
+        starts = first.values.astype(np.intp)
+        labels = first.index
+    else:
+        codes = keys[0]
+        for key, size in zip(keys[1:], (13, 54)):
+            codes = codes * size + key
+        if len(codes) > 1 and (np.diff(codes) < 0).any():
+            # Indice non ordinato: riunisce le righe di ogni periodo
+            order = np.argsort(codes, kind="stable")
+            codes = codes[order]
+            values = values[order]
+            keys = [key[order] for key in keys]
+        starts = np.flatnonzero(np.diff(codes, prepend=codes[:1] - 1))
+        if len(keys) == 1:
+            labels = pd.Index(keys[0][starts])
+        else:
+            labels = pd.MultiIndex.from_arrays([key[starts] for key in keys])
+    if len(starts) == 0:
+        return pd.Series(np.empty(0), index=labels, name=returns.name)
+    growth = 1.0 + values
+    growth[np.isnan(growth)] = 1.0
+    aggregated = np.multiply.reduceat(growth, starts) - 1.0
+    return pd.Series(aggregated, index=labels, name=returns.name)
+
+
+def create_cagr(equity, periods=None):
     """
     Calcola il tasso di crescita annuale composto (CAGR)
     per il portafoglio, determinando il numero di anni e
@@ -37,13 +152,14 @@ def create_cagr(equity, periods=252):
     Parametri:
     equity - Una serie di pandas che rappresenta la curva equity.
     periods: giornaliero (252), orario (252 * 6.5), minuto (252 * 6.5 * 60) ecc.
+        Se None è stimato dai timestamp della serie (si veda infer_periods).
 
     """
-    years = len(equity) / float(periods)
-    return (equity[-1] ** (1.0 / years)) - 1.0
+    years = len(equity) / float(_periods(equity, periods))
+    return (equity.iloc[-1] ** (1.0 / years)) - 1.0
 
 
-def create_sharpe_ratio(returns, periods=252):
+def create_sharpe_ratio(returns, periods=None):
     """
     Crea lo Sharpe ratio per la strategia, basato su un benchmark pari
     a zero (ovvero nessuna informazione sui tassi privi di rischio).
@@ -51,11 +167,13 @@ def create_sharpe_ratio(returns, periods=252):
     Parametri:
     returns - Una serie Pandas che rappresenta i rendimenti percentuali del periodo.
     periods: giornaliero (252), orario (252 * 6.5), minuto (252 * 6.5 * 60) ecc.
+        Se None è stimato dai timestamp della serie (si veda infer_periods).
     """
+    periods = _periods(returns, periods)
     return np.sqrt(periods) * (np.mean(returns)) / np.std(returns)
 
 
-def create_sortino_ratio(returns, periods=252):
+def create_sortino_ratio(returns, periods=None):
     """
     Creare il rapporto Sortino per la strategia, basato su un benchmark pari
     a zero (ovvero nessuna informazione sui tassi privi di rischio).
@@ -63,41 +181,119 @@ def create_sortino_ratio(returns, periods=252):
     Parametri:
     returns - Una serie Pandas che rappresenta i rendimenti percentuali del periodo.
     periods: giornaliero (252), orario (252 * 6.5), minuto (252 * 6.5 * 60) ecc.
+        Se None è stimato dai timestamp della serie (si veda infer_periods).
     """
+    periods = _periods(returns, periods)
     return np.sqrt(periods) * (np.mean(returns)) / np.std(returns[returns < 0])
 
 
+def create_annual_volatility(returns, periods=None):
+    """
+    Calcola la volatilità annualizzata dei rendimenti.
+
+    Parametri:
+    returns - Una serie Pandas che rappresenta i rendimenti percentuali del periodo.
+    periods: giornaliero (252), orario (252 * 6.5), minuto (252 * 6.5 * 60) ecc.
+        Se None è stimato dai timestamp della serie (si veda infer_periods).
+    """
+    return returns.std() * np.sqrt(_periods(returns, periods))
+
+
+def _drawdown_runs(drawdown):
+    """
+    Codifica run-length dei periodi in drawdown: restituisce gli
+    indici di inizio e di fine (esclusa) di ogni sequenza di valori
+    di drawdown diversi da zero.
+    """
+    in_drawdown = np.zeros(len(drawdown) + 2, dtype=np.int8)
+    in_drawdown[1:-1] = drawdown != 0
+    changes = np.diff(in_drawdown)
+    return np.flatnonzero(changes == 1), np.flatnonzero(changes == -1)
+
+
+def _drawdown(returns):
+    """
+    Calcola il drawdown di ogni punto della curva dei rendimenti
+    cumulativi, con l'high water mark come massimo cumulativo.
+    """
+    values = np.asarray(returns, dtype=np.float64)
+    # L'high water mark parte da zero (il primo punto non è considerato)
+    # e come max() ignora i valori NaN
+    hwm = values.copy()
+    if len(hwm) > 0:
+        hwm[0] = 0.0
+    hwm = np.fmax.accumulate(hwm)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = (hwm - values) / hwm
+    if len(drawdown) > 0:
+        drawdown[0] = 0.0
+    return drawdown
+
+
 def create_drawdowns(returns):
     """
     Calcola il massimo drawdown da picco a minimo della curva equity e la
     durata del drawdown. Richiede che pnl_returns sia una serie pandas.
 
+    L'high water mark è calcolato come massimo cumulativo e la durata
+    con una codifica run-length dei periodi in drawdown, senza cicli
+    Python sui singoli punti.
+
     Parametri:
     equity - Una serie Pandas che rappresenta i rendimenti percentuali del periodo.
 
     Restituisce:
     drawdown, drawdown_max, duration
     """
+    drawdown = pd.Series(
+        _drawdown(returns), index=returns.index, name="Drawdown"
+    )
+    starts, ends = _drawdown_runs(drawdown.values)
+    duration = int((ends - starts).max()) if len(starts) > 0 else 0
+    return drawdown, drawdown.max(), duration
+
 
-    # Calcola la curva dei rendimenti cumulativi
-    # e imposta l'High Water Mark
+def create_drawdown_periods(returns):
+    """
+    Restituisce un DataFrame con un periodo di drawdown per riga,
+    nell'ordine in cui si sono verificati:
+
+    start - il picco da cui inizia il drawdown (l'ultimo punto
+        precedente non in drawdown);
+    trough - il punto di minimo (massimo drawdown del periodo);
+    recovery - il primo punto che torna all'high water mark,
+        NaT se il drawdown non è ancora recuperato;
+    drawdown - il massimo drawdown del periodo;
+    duration - il numero di periodi in drawdown.
+
+    Parametri:
+    returns - Una serie Pandas dei rendimenti cumulativi (come per
+        create_drawdowns).
+    """
     idx = returns.index
-    hwm = np.zeros(len(idx))
-
-    # Crea il high water mark
-    for t in range(1, len(idx)):
-        hwm[t] = max(hwm[t - 1], returns.iloc[t])
-
-    # Calcola le statistiche di drawdown e durata
-    perf = pd.DataFrame(index=idx)
-    perf["Drawdown"] = (hwm - returns) / hwm
-    perf["Drawdown"].iloc[0] = 0.0
-    perf["DurationCheck"] = np.where(perf["Drawdown"] == 0, 0, 1)
-    duration = max(
-        sum(1 for i in g if i == 1)
-        for k, g in groupby(perf["DurationCheck"])
-    )
-    return perf["Drawdown"], np.max(perf["Drawdown"]), duration
+    drawdown = _drawdown(returns)
+    starts, ends = _drawdown_runs(drawdown)
+    lengths = ends - starts
+    # Posizione del minimo di ogni periodo: il primo punto del
+    # periodo in cui il drawdown è pari al suo massimo
+    troughs = starts
+    if len(starts) > 0:
+        deepest = np.fmax.reduceat(drawdown, starts)
+        period = np.repeat(np.arange(len(starts)), lengths)
+        points = np.flatnonzero(drawdown != 0)
+        is_trough = drawdown[points] == deepest[period]
+        first = np.unique(period[is_trough], return_index=True)[1]
+        troughs = points[is_trough][first]
+    recovered = ends < len(idx)
+    periods = pd.DataFrame({
+        "start": idx[starts - 1],
+        "trough": idx[troughs],
+        "recovery": idx[np.minimum(ends, len(idx) - 1)],
+        "drawdown": drawdown[troughs],
+        "duration": lengths,
+    })
+    periods.loc[~recovered, "recovery"] = pd.NaT
+    return periods
 
 
 def rsquared(x, y):
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from ..position_book import NAT, timestamp_ns
+from ..price_parser import PriceParser
+
+
+class EquityRecorder(object):
+    """
+    EquityRecorder registra una o più serie di valori interi (in
+    unità di PriceParser, ad es. l'equity del portafoglio e la
+    chiusura del benchmark) per timestamp, in array NumPy int64
+    (timestamp in nanosecondi e una colonna per serie) preallocati,
+    che raddoppiano di capacità quando sono pieni.
+
+    Ogni record() aggiunge i valori grezzi ad un piccolo buffer, che
+    viene copiato negli array ogni block_size righe: il costo per
+    aggiornamento è quello di un append ad una lista, mentre la
+    memoria è di 8 byte per valore. Se il timestamp coincide con
+    quello dell'ultima riga i valori vengono sovrascritti, come
+    avveniva con il dizionario {timestamp: equity}.
+
+    La conversione in unità di visualizzazione (PriceParser.display)
+    avviene una sola volta, in modo vettoriale, in to_series(). I
+    valori None (ad es. un benchmark senza ancora prezzi) sono
+    memorizzati come NAT e restituiti come NaN.
+    """
+    def __init__(self, names=("equity",), capacity=1024, block_size=1024):
+        self.names = tuple(names)
+        self.capacity = max(int(capacity), 1)
+        self.block_size = int(block_size)
+        self.times = np.empty(self.capacity, dtype=np.int64)
+        self.values = np.empty((self.capacity, len(self.names)), dtype=np.int64)
+        self.tz = None
+        self._count = 0
+        self._times = []
+        self._values = []
+        self._last_time = None
+        self._sorted = True
+
+    def __len__(self):
+        return self._count + len(self._times)
+
+    def _flush(self):
+        """
+        Copia le righe del buffer negli array, aumentandone la
+        capacità se necessario.
+        """
+        n = len(self._times)
+        if n == 0:
+            return
+        end = self._count + n
+        if end > self.capacity:
+            while end > self.capacity:
+                self.capacity *= 2
+            times = np.empty(self.capacity, dtype=np.int64)
+            times[:self._count] = self.times[:self._count]
+            self.times = times
+            values = np.empty((self.capacity, len(self.names)), dtype=np.int64)
+            values[:self._count] = self.values[:self._count]
+            self.values = values
+        self.times[self._count:end] = self._times
+        self.values[self._count:end] = self._values
+        self._count = end
+        self._times = []
+        self._values = []
+
+    def record(self, timestamp, *values):
+        """
+        Registra i valori (uno per ogni serie, nell'ordine di names)
+        al timestamp indicato.
+        """
+        if type(timestamp) is pd.Timestamp:
+            time = timestamp.value
+        else:
+            time = timestamp_ns(timestamp)
+        if None in values:
+            values = tuple(NAT if value is None else value for value in values)
+        last_time = self._last_time
+        if time == last_time:
+            if self._times:
+                self._values[-1] = values
+            else:
+                self.values[self._count - 1] = values
+            return
+        if last_time is None:
+            if type(timestamp) is pd.Timestamp:
+                self.tz = timestamp.tz
+        elif time < last_time:
+            self._sorted = False
+        self._times.append(time)
+        self._values.append(values)
+        self._last_time = time
+        if len(self._times) == self.block_size:
+            self._flush()
+
+    def _rows(self):
+        """
+        Restituisce timestamp e valori registrati ordinati per
+        timestamp, con un solo valore (l'ultimo) per timestamp.
+        """
+        self._flush()
+        times = self.times[:self._count]
+        values = self.values[:self._count]
+        if not self._sorted:
+            order = np.argsort(times, kind="stable")
+            times = times[order]
+            values = values[order]
+            # Per i timestamp ripetuti mantiene l'ultima registrazione
+            last = np.append(times[1:] != times[:-1], True)
+            times = times[last]
+            values = values[last]
+        return times, values
+
+    def to_series(self, name="equity", dp=2):
+        """
+        Restituisce la serie indicata, convertita da PriceParser,
+        come pandas Series indicizzata per timestamp.
+        """
+        times, values = self._rows()
+        column = values[:, self.names.index(name)]
+        display = PriceParser.display_array(column, dp)
+        display[column == NAT] = np.nan
+        return pd.Series(display, index=self._index(times))
+
+    def _index(self, times):
+        index = pd.DatetimeIndex(times.view("datetime64[ns]"))
+        if self.tz is not None:
+            index = index.tz_localize("UTC").tz_convert(self.tz)
+        return index
+
+    def index(self):
+        """
+        Restituisce i timestamp registrati, ordinati e senza
+        ripetizioni, come DatetimeIndex.
+        """
+        return self._index(self._rows()[0])
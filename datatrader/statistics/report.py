@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import html
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import performance as perf
+
+
+def _to_json(value):
+    """
+    Converte un valore dei risultati in un tipo serializzabile in
+    JSON: NaN e infiniti diventano None, i timestamp stringhe ISO.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.datetime64):
+        return _to_json(pd.Timestamp(value))
+    if isinstance(value, pd.Timedelta):
+        return value.total_seconds()
+    if isinstance(value, pd.Series):
+        return {
+            "index": [_to_json(i) for i in value.index],
+            "values": [_to_json(v) for v in value.tolist()],
+        }
+    if isinstance(value, pd.DataFrame):
+        return [
+            {str(k): _to_json(v) for k, v in row.items()}
+            for row in value.to_dict("records")
+        ]
+    if isinstance(value, dict):
+        return {str(k): _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_to_json(v) for v in value]
+    return str(value)
+
+
+def results_to_dict(stats, series=True):
+    """
+    Converte il dizionario di get_results() in un dizionario
+    serializzabile in JSON, per dashboard e archiviazione.
+
+    Se series è False vengono esclusi le serie temporali e i
+    DataFrame, mantenendo solo le statistiche scalari.
+    """
+    results = {}
+    for key, value in stats.items():
+        if not series and isinstance(value, (pd.Series, pd.DataFrame)):
+            continue
+        results[key] = _to_json(value)
+    return results
+
+
+def export_json(stats, filename, series=True):
+    """
+    Salva le statistiche di get_results() in un file JSON.
+    """
+    with open(filename, "w") as fd:
+        json.dump(results_to_dict(stats, series), fd)
+    return filename
+
+
+def _format(value):
+    if value is None:
+        return "N/A"
+    if isinstance(value, float):
+        return "%.4f" % value
+    return str(value)
+
+
+def _html_table(rows):
+    cells = "".join(
+        "<tr><th>%s</th><td>%s</td></tr>" % (
+            html.escape(str(name)), html.escape(_format(value))
+        )
+        for name, value in rows
+    )
+    return "<table>%s</table>" % cells
+
+
+def export_html(stats, filename, title=None):
+    """
+    Salva un semplice rapporto HTML, senza immagini né dipendenze
+    esterne, con le statistiche scalari, le statistiche dei trade,
+    i rendimenti annuali e i periodi di drawdown di get_results().
+    """
+    results = results_to_dict(stats, series=False)
+    trade_statistics = results.pop("trade_statistics", None)
+    sections = []
+    if title:
+        sections.append("<h1>%s</h1>" % html.escape(title).replace("\n", "<br>"))
+    sections.append("<h2>Curve</h2>")
+    sections.append(_html_table(sorted(results.items())))
+    if trade_statistics is not None:
+        sections.append("<h2>Trade</h2>")
+        sections.append(_html_table(trade_statistics.items()))
+    returns = stats.get("returns")
+    if returns is not None and len(returns) > 0:
+        yearly = perf.aggregate_returns(returns, 'yearly')
+        sections.append("<h2>Yearly Returns</h2>")
+        sections.append(_html_table(
+            (year, "%.2f%%" % (100.0 * value)) for year, value in yearly.items()
+        ))
+    periods = stats.get("drawdown_periods")
+    if periods is not None and len(periods) > 0:
+        worst = periods.sort_values("drawdown", ascending=False).head(5)
+        sections.append("<h2>Worst Drawdowns</h2>")
+        sections.append(worst.to_html(index=False, float_format="%.4f"))
+    with open(filename, "w") as fd:
+        fd.write(
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+            "<title>%s</title></head><body>\n%s\n</body></html>\n" % (
+                html.escape(title or "Tearsheet"), "\n".join(sections)
+            )
+        )
+    return filename
+
+
+def _render(args):
+    """
+    Disegna il Tearsheet di un backtest (in un processo worker).
+    """
+    from .tearsheet import TearsheetStatistics
+
+    stats, params, filename = args
+    tearsheet = TearsheetStatistics.from_results(stats, **params)
+    return tearsheet.save(filename)
+
+
+def render_tearsheets(tearsheets, filenames, max_workers=None):
+    """
+    Salva i Tearsheet di più backtest completati, distribuendo il
+    disegno su un ProcessPoolExecutor. A seconda dell'estensione
+    di ogni file viene salvata l'immagine o l'esportazione
+    JSON/HTML (si veda TearsheetStatistics.save).
+
+    Ai worker vengono inviati solo i risultati di get_results()
+    e i parametri di visualizzazione di ogni Tearsheet, non
+    l'intera sessione di trading.
+    """
+    jobs = []
+    for tearsheet, filename in zip(tearsheets, filenames):
+        params = {
+            "title": tearsheet.title,
+            "benchmark": tearsheet.benchmark,
+            "periods": tearsheet.periods,
+            "rolling_sharpe": tearsheet.rolling_sharpe,
+        }
+        jobs.append((tearsheet.get_results(), params, filename))
+    if max_workers == 1:
+        return [_render(job) for job in jobs]
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1) or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_render, jobs))
@@ -1,6 +1,7 @@
 from .base import AbstractStatistics
 from ..compat import pickle
 from ..price_parser import PriceParser
+from . import performance as perf
 
 import datetime
 import os
@@ -23,15 +24,17 @@ class SimpleStatistics(AbstractStatistics):
     TODO prevedere slippage, fill rate, ecc..
     TODO costi di commissione?
 
-    TODO prevedere qualche tipo di parametro trading-frequency parameter nel setup.
     Per il calcolo dello Sharpe bisogna conoscere se si riferisce a timeframe
-    giornaliero, orario, un minuto, ecc.
+    giornaliero, orario, un minuto, ecc.: periods è il numero di periodi
+    in un anno e, se è None, viene ricavato dal periodo delle barre
+    (set_bar_period) o stimato dai timestamp registrati.
     """
-    def __init__(self, config, portfolio_handler):
+    def __init__(self, config, portfolio_handler, periods=None):
         """
         Prevede un portfolio handler.
         """
         self.config = config
+        self.periods = periods
         self.drawdowns = [0]
         self.equity = []
         self.equity_returns = [0.0]
@@ -86,16 +89,28 @@ class SimpleStatistics(AbstractStatistics):
 
         Prevede un benchmark_return, ad esempio, 0,01 per 1%
         """
-        excess_returns = pd.Series(self.equity_returns) - benchmark_return / 252
+        periods = self.annual_periods()
+        excess_returns = pd.Series(self.equity_returns) - benchmark_return / periods
 
-        # Restituire il Sharpe ratio annualizzato in base ai rendimenti giornalieri in eccesso
-        return round(self.annualised_sharpe(excess_returns), 4)
+        # Restituire il Sharpe ratio annualizzato in base ai rendimenti in eccesso
+        return round(self.annualised_sharpe(excess_returns, periods), 4)
+
+    def annual_periods(self):
+        """
+        Restituisce il numero di periodi in un anno dei rendimenti.
+        """
+        if self.periods is not None:
+            return self.periods
+        if self.bar_period is not None:
+            return perf.periods_from_bar_period(self.bar_period)
+        return perf.infer_periods(pd.DatetimeIndex(self.timeseries[1:]))
 
     def annualised_sharpe(self, returns, N=252):
         """
         Calcola il Sharpe ratio annualizzato di un flusso di rendimenti in base a
         un numero di periodi di trading, N è impostato a 252 per definizione,
-        che quindi presuppone un flusso di rendimenti giornalieri.
+        che quindi presuppone un flusso di rendimenti giornalieri
+        (calculate_sharpe utilizza annual_periods).
 
         La funzione assume che i rendimenti siano gli eccessi/residui
         dei rendimenti rispetto a un benchmark.
@@ -1,11 +1,16 @@
 from .base import AbstractStatistics
+from ..compat import pickle
 from ..price_parser import PriceParser
+from .recorder import EquityRecorder
+from ..price_handler.columnar import BarColumns
 
+from matplotlib.figure import Figure
 from matplotlib.ticker import FuncFormatter
 from matplotlib import cm
 from datetime import datetime
 
 import datatrader.statistics.performance as perf
+import datatrader.statistics.report as report
 
 import pandas as pd
 import numpy as np
@@ -27,11 +32,24 @@ class TearsheetStatistics(AbstractStatistics):
 
     Include anche un grafico opzionale del Sharpe ratio annualizzato in
     funzione del tempo.
+
+    periods è il numero di periodi in un anno utilizzato per
+    annualizzare tutte le statistiche. Se è None viene ricavato dal
+    periodo delle barre (si veda set_bar_period) o, in sua assenza,
+    stimato dai timestamp registrati (si veda perf.infer_periods).
+    Con resample (ad es. 'D') la curva equity viene ricampionata,
+    tenendo l'ultimo valore di ogni intervallo, prima del calcolo
+    delle statistiche, e periods viene stimato sulla curva ricampionata.
+
+    Se il gestore dei prezzi mantiene in memoria le barre del
+    benchmark (BarColumns), la sua chiusura non viene letta ad ogni
+    update ma ricavata una sola volta, al calcolo dei risultati, dalla
+    colonna delle chiusure (si veda _benchmark_series).
     """
     def __init__(
         self, config, portfolio_handler,
-        title=None, benchmark=None, periods=252,
-        rolling_sharpe=False
+        title=None, benchmark=None, periods=None,
+        rolling_sharpe=False, resample=None
     ):
         """
         Prevede un gestore di portafoglio.
@@ -43,36 +61,105 @@ class TearsheetStatistics(AbstractStatistics):
         self.benchmark = benchmark
         self.periods = periods
         self.rolling_sharpe = rolling_sharpe
-        self.equity = {}
-        self.equity_benchmark = {}
+        self.resample = resample
+        self.benchmark_columns = None
+        if benchmark is not None:
+            data = getattr(self.price_handler, "tickers_data", {})
+            if isinstance(data.get(benchmark), BarColumns):
+                self.benchmark_columns = data[benchmark]
+        if benchmark is None or self.benchmark_columns is not None:
+            names = ("equity",)
+        else:
+            names = ("equity", "benchmark")
+        self.recorder = EquityRecorder(names)
         self.log_scale = False
+        # Risultati di get_results, validi fino al successivo update
+        self._results = None
 
     def update(self, timestamp, portfolio_handler):
         """
         Aggiorna la curva equity e la curva del benchmark che devono
         essere tracciate nel tempo.
         """
-        self.equity[timestamp] = PriceParser.display(
-            self.portfolio_handler.portfolio.equity
-        )
-        if self.benchmark is not None:
-            self.equity_benchmark[timestamp] = PriceParser.display(
+        self._results = None
+        if len(self.recorder.names) == 1:
+            self.recorder.record(
+                timestamp, self.portfolio_handler.portfolio.equity
+            )
+        else:
+            self.recorder.record(
+                timestamp, self.portfolio_handler.portfolio.equity,
                 self.price_handler.get_last_close(self.benchmark)
             )
 
     def get_results(self):
         """
         Restituisce un dizionario con tutti i risultati e statistiche importanti
+
+        I risultati sono calcolati una sola volta dopo l'ultimo update,
+        per cui plot_results, render e save non li ricalcolano.
+        """
+        if self._results is None:
+            self._results = self._compute_results()
+        return self._results
+
+    def _equity_series(self, name):
+        """
+        Restituisce la serie registrata, ricampionata se richiesto.
+        """
+        if name == "benchmark" and self.benchmark_columns is not None:
+            series = self._benchmark_series()
+        else:
+            series = self.recorder.to_series(name)
+        if self.resample is not None:
+            series = series.resample(self.resample).last().dropna()
+        return series
+
+    def _benchmark_series(self):
+        """
+        Restituisce la chiusura del benchmark ad ogni timestamp
+        registrato, letta con un'unica ricerca vettoriale nella
+        colonna delle chiusure: l'ultima barra trasmessa fino a quel
+        timestamp o, prima della prima barra del backtest, la prima
+        del file, come avrebbe restituito get_last_close.
+        """
+        columns = self.benchmark_columns
+        index = self.recorder.index()
+        start, end = columns.bounds(
+            getattr(self.price_handler, "start_date", None),
+            getattr(self.price_handler, "end_date", None)
+        )
+        rows = columns.times.view(np.int64).searchsorted(
+            index.asi8, side="right"
+        ) - 1
+        rows = np.minimum(rows, end - 1)
+        rows[rows < start] = 0
+        return pd.Series(
+            PriceParser.display_array(columns.close_price[rows]), index=index
+        )
+
+    def _annual_periods(self, equity_s):
         """
+        Restituisce il numero di periodi in un anno della curva equity.
+        """
+        if self.periods is not None:
+            return self.periods
+        if self.resample is None and self.bar_period is not None:
+            return perf.periods_from_bar_period(self.bar_period)
+        return perf.infer_periods(equity_s.index)
+
+    def _compute_results(self):
         # Equity
-        equity_s = pd.Series(self.equity).sort_index()
+        equity_s = self._equity_series("equity")
+        periods = self._annual_periods(equity_s)
+        window = max(int(round(periods)), 2)
 
         # Rendimenti
         returns_s = equity_s.pct_change().fillna(0.0)
 
         # Sharpe annualizzato a finestra mobile
-        rolling = returns_s.rolling(window=self.periods)
-        rolling_sharpe_s = np.sqrt(self.periods) * (
+        rolling = returns_s.rolling(window=window)
+        rolling_sharpe_s = np.sqrt(periods) * (
             rolling.mean() / rolling.std()
         )
 
@@ -83,16 +170,18 @@ class TearsheetStatistics(AbstractStatistics):
         dd_s, max_dd, dd_dur = perf.create_drawdowns(cum_returns_s)
 
         statistics = {}
+        statistics["periods"] = periods
 
         # Statistiche dell'Equity
-        statistics["sharpe"] = perf.create_sharpe_ratio(
-            returns_s, self.periods
-        )
+        statistics["sharpe"] = perf.create_sharpe_ratio(returns_s, periods)
         statistics["drawdowns"] = dd_s
         # TODO: bisogna avere il max_drawdown in modo che possa essere stampato alla fine del test
         statistics["max_drawdown"] = max_dd
         statistics["max_drawdown_pct"] = max_dd
         statistics["max_drawdown_duration"] = dd_dur
+        statistics["drawdown_periods"] = perf.create_drawdown_periods(
+            cum_returns_s
+        )
         statistics["equity"] = equity_s
         statistics["returns"] = returns_s
         statistics["rolling_sharpe"] = rolling_sharpe_s
@@ -101,18 +190,21 @@ class TearsheetStatistics(AbstractStatistics):
         positions = self._get_positions()
         if positions is not None:
             statistics["positions"] = positions
+        statistics["trade_statistics"] = (
+            self.portfolio_handler.portfolio.closed_positions.statistics.summary()
+        )
 
         # Statistiche del Benchmark se il ticker del benchmark ticker è specificato
         if self.benchmark is not None:
-            equity_b = pd.Series(self.equity_benchmark).sort_index()
+            equity_b = self._equity_series("benchmark")
             returns_b = equity_b.pct_change().fillna(0.0)
-            rolling_b = returns_b.rolling(window=self.periods)
-            rolling_sharpe_b = np.sqrt(self.periods) * (
+            rolling_b = returns_b.rolling(window=window)
+            rolling_sharpe_b = np.sqrt(periods) * (
                 rolling_b.mean() / rolling_b.std()
             )
             cum_returns_b = np.exp(np.log(1 + returns_b).cumsum())
             dd_b, max_dd_b, dd_dur_b = perf.create_drawdowns(cum_returns_b)
-            statistics["sharpe_b"] = perf.create_sharpe_ratio(returns_b)
+            statistics["sharpe_b"] = perf.create_sharpe_ratio(returns_b, periods)
             statistics["drawdowns_b"] = dd_b
             statistics["max_drawdown_pct_b"] = max_dd_b
             statistics["max_drawdown_duration_b"] = dd_dur_b
@@ -123,38 +215,33 @@ class TearsheetStatistics(AbstractStatistics):
 
         return statistics
 
-    def _get_positions(self):
+    def _stats_periods(self, stats):
         """
-        Recupera l'elenco degli oggetti Positions chiusi dal portfolio
-        e riformattato in un dataframe Pandas da restituire
+        Restituisce i periodi in un anno utilizzati per i risultati.
         """
-        def x(p):
-            return PriceParser.display(p)
+        if "periods" in stats:
+            return stats["periods"]
+        if self.periods is not None:
+            return self.periods
+        return perf.infer_periods(stats["returns"].index)
 
-        pos = self.portfolio_handler.portfolio.closed_positions
-        a = []
-        for p in pos:
-            a.append(p.__dict__)
-        if len(a) == 0:
-            # Non ci sono posizioni aperte
+    def _get_positions(self):
+        """
+        Recupera le posizioni chiuse dal portfolio, come dataframe
+        Pandas da restituire con i prezzi riformattati
+        """
+        df = self.portfolio_handler.portfolio.closed_positions.to_frame()
+        if df is None:
+            # Non ci sono posizioni chiuse
             return None
         else:
-            df = pd.DataFrame(a)
-            df['avg_bot'] = df['avg_bot'].apply(x)
-            df['avg_price'] = df['avg_price'].apply(x)
-            df['avg_sld'] = df['avg_sld'].apply(x)
-            df['cost_basis'] = df['cost_basis'].apply(x)
-            df['init_commission'] = df['init_commission'].apply(x)
-            df['init_price'] = df['init_price'].apply(x)
-            df['market_value'] = df['market_value'].apply(x)
-            df['net'] = df['net'].apply(x)
-            df['net_incl_comm'] = df['net_incl_comm'].apply(x)
-            df['net_total'] = df['net_total'].apply(x)
-            df['realised_pnl'] = df['realised_pnl'].apply(x)
-            df['total_bot'] = df['total_bot'].apply(x)
-            df['total_commission'] = df['total_commission'].apply(x)
-            df['total_sld'] = df['total_sld'].apply(x)
-            df['unrealised_pnl'] = df['unrealised_pnl'].apply(x)
+            for col in (
+                'avg_bot', 'avg_price', 'avg_sld', 'cost_basis',
+                'init_commission', 'init_price', 'market_value', 'net',
+                'net_incl_comm', 'net_total', 'realised_pnl', 'total_bot',
+                'total_commission', 'total_sld', 'unrealised_pnl'
+            ):
+                df[col] = PriceParser.display_array(df[col].values)
             df['trade_pct'] = (df['avg_sld'] / df['avg_bot'] - 1.0)
             return df
 
@@ -229,7 +316,9 @@ class TearsheetStatistics(AbstractStatistics):
         sharpe.plot(lw=2, color='green', alpha=0.6, x_compat=False,
                     label='Backtest', ax=ax, **kwargs)
 
-        ax.axvline(sharpe.index[252], linestyle="dashed", c="gray", lw=2)
+        window = max(int(round(self._stats_periods(stats))), 2)
+        if len(sharpe) > window:
+            ax.axvline(sharpe.index[window], linestyle="dashed", c="gray", lw=2)
         ax.set_ylabel('Rolling Annualised Sharpe')
         ax.legend(loc='best')
         ax.set_xlabel('')
@@ -350,10 +439,12 @@ class TearsheetStatistics(AbstractStatistics):
         y_axis_formatter = FuncFormatter(format_perc)
         ax.yaxis.set_major_formatter(FuncFormatter(y_axis_formatter))
 
-        tot_ret = cum_returns[-1] - 1.0
-        cagr = perf.create_cagr(cum_returns, self.periods)
-        sharpe = perf.create_sharpe_ratio(returns, self.periods)
-        sortino = perf.create_sortino_ratio(returns, self.periods)
+        tot_ret = cum_returns.iloc[-1] - 1.0
+        periods = self._stats_periods(stats)
+        cagr = perf.create_cagr(cum_returns, periods)
+        sharpe = perf.create_sharpe_ratio(returns, periods)
+        sortino = perf.create_sortino_ratio(returns, periods)
+        volatility = perf.create_annual_volatility(returns, periods)
         rsq = perf.rsquared(range(cum_returns.shape[0]), cum_returns)
         dd, dd_max, dd_dur = perf.create_drawdowns(cum_returns)
 
@@ -370,7 +461,7 @@ class TearsheetStatistics(AbstractStatistics):
         ax.text(7.50, 5.9, '{:.2f}'.format(sortino), fontweight='bold', horizontalalignment='right', fontsize=8)
 
         ax.text(0.25, 4.9, 'Annual Volatility', fontsize=8)
-        ax.text(7.50, 4.9, '{:.2%}'.format(returns.std() * np.sqrt(252)), fontweight='bold', horizontalalignment='right', fontsize=8)
+        ax.text(7.50, 4.9, '{:.2%}'.format(volatility), fontweight='bold', horizontalalignment='right', fontsize=8)
 
         ax.text(0.25, 3.9, 'R-Squared', fontsize=8)
         ax.text(7.50, 3.9, '{:.2f}'.format(rsq), fontweight='bold', horizontalalignment='right', fontsize=8)
@@ -388,10 +479,10 @@ class TearsheetStatistics(AbstractStatistics):
         if self.benchmark is not None:
             returns_b = stats['returns_b']
             equity_b = stats['cum_returns_b']
-            tot_ret_b = equity_b[-1] - 1.0
-            cagr_b = perf.create_cagr(equity_b)
-            sharpe_b = perf.create_sharpe_ratio(returns_b)
-            sortino_b = perf.create_sortino_ratio(returns_b)
+            tot_ret_b = equity_b.iloc[-1] - 1.0
+            cagr_b = perf.create_cagr(equity_b, periods)
+            sharpe_b = perf.create_sharpe_ratio(returns_b, periods)
+            sortino_b = perf.create_sortino_ratio(returns_b, periods)
             rsq_b = perf.rsquared(range(equity_b.shape[0]), equity_b)
             dd_b, dd_max_b, dd_dur_b = perf.create_drawdowns(equity_b)
 
@@ -399,7 +490,7 @@ class TearsheetStatistics(AbstractStatistics):
             ax.text(9.75, 7.9, '{:.2%}'.format(cagr_b), fontweight='bold', horizontalalignment='right', fontsize=8)
             ax.text(9.75, 6.9, '{:.2f}'.format(sharpe_b), fontweight='bold', horizontalalignment='right', fontsize=8)
             ax.text(9.75, 5.9, '{:.2f}'.format(sortino_b), fontweight='bold', horizontalalignment='right', fontsize=8)
-            ax.text(9.75, 4.9, '{:.2%}'.format(returns_b.std() * np.sqrt(252)), fontweight='bold', horizontalalignment='right', fontsize=8)
+            ax.text(9.75, 4.9, '{:.2%}'.format(perf.create_annual_volatility(returns_b, periods)), fontweight='bold', horizontalalignment='right', fontsize=8)
             ax.text(9.75, 3.9, '{:.2f}'.format(rsq_b), fontweight='bold', horizontalalignment='right', fontsize=8)
             ax.text(9.75, 2.9, '{:.2%}'.format(dd_max_b), color='red', fontweight='bold', horizontalalignment='right', fontsize=8)
             ax.text(9.75, 1.9, '{:.0f}'.format(dd_dur_b), fontweight='bold', horizontalalignment='right', fontsize=8)
@@ -438,6 +529,8 @@ class TearsheetStatistics(AbstractStatistics):
             avg_loss_pct = "N/A"
             max_win_pct = "N/A"
             max_loss_pct = "N/A"
+            max_loss_dt = "N/A"
+            avg_dit = "N/A"
         else:
             pos = stats['positions']
             num_trades = pos.shape[0]
@@ -448,14 +541,21 @@ class TearsheetStatistics(AbstractStatistics):
             avg_loss_pct = '{:.2%}'.format(np.mean(pos[pos["trade_pct"] <= 0]["trade_pct"]))
             max_win_pct = '{:.2%}'.format(np.max(pos["trade_pct"]))
             max_loss_pct = '{:.2%}'.format(np.min(pos["trade_pct"]))
+            max_loss_dt = 'N/A'
+            avg_dit = 'N/A'
+            if "close_time" in pos:
+                worst = pos["close_time"][pos["trade_pct"].idxmin()]
+                if not pd.isnull(worst):
+                    max_loss_dt = worst.strftime("%Y-%m-%d")
+                days = (pos["close_time"] - pos["open_time"]).dropna()
+                if len(days) > 0:
+                    avg_dit = '{:.1f}'.format(
+                        days.mean() / pd.Timedelta(days=1)
+                    )
 
         y_axis_formatter = FuncFormatter(format_perc)
         ax.yaxis.set_major_formatter(FuncFormatter(y_axis_formatter))
 
-        # TODO: la classe Position ha bisogno della data di entry
-        max_loss_dt = 'TBD'  # pos[pos["trade_pct"] == np.min(pos["trade_pct"])].entry_date.values[0]
-        avg_dit = '0.0'  # = '{:.2f}'.format(np.mean(pos.time_in_pos))
-
         ax.text(0.5, 8.9, 'Trade Winning %', fontsize=8)
         ax.text(9.5, 8.9, win_pct_str, fontsize=8, fontweight='bold', horizontalalignment='right')
 
@@ -579,9 +679,9 @@ class TearsheetStatistics(AbstractStatistics):
         ax.axis([0, 10, 0, 10])
         return ax
 
-    def plot_results(self, filename=None):
+    def _draw(self, fig, stats):
         """
-        Visualizza il Tearsheet
+        Disegna tutti i pannelli del Tearsheet sulla figura indicata.
         """
         rc = {
             'lines.linewidth': 1.0,
@@ -608,20 +708,19 @@ class TearsheetStatistics(AbstractStatistics):
         else:
             offset_index = 0
         vertical_sections = 7 + offset_index
-        fig = plt.figure(figsize=(10, vertical_sections * 3))
+        fig.set_size_inches(10, vertical_sections * 3)
         fig.suptitle(self.title, y=0.94, weight='bold')
         gs = gridspec.GridSpec(vertical_sections, 3, wspace=0.25, hspace=1.5)
 
-        stats = self.get_results()
-        ax_equity = plt.subplot(gs[:2, :])
+        ax_equity = fig.add_subplot(gs[:2, :])
         if self.rolling_sharpe:
-            ax_sharpe = plt.subplot(gs[2, :])
-        ax_drawdown = plt.subplot(gs[2 + offset_index, :])
-        ax_monthly_returns = plt.subplot(gs[3 + offset_index:5, :2])
-        ax_yearly_returns = plt.subplot(gs[3 + offset_index:5, 2])
-        ax_txt_curve = plt.subplot(gs[5 + offset_index:, 0])
-        ax_txt_trade = plt.subplot(gs[5 + offset_index:, 1])
-        ax_txt_time = plt.subplot(gs[5 + offset_index:, 2])
+            ax_sharpe = fig.add_subplot(gs[2, :])
+        ax_drawdown = fig.add_subplot(gs[2 + offset_index, :])
+        ax_monthly_returns = fig.add_subplot(gs[3 + offset_index:5, :2])
+        ax_yearly_returns = fig.add_subplot(gs[3 + offset_index:5, 2])
+        ax_txt_curve = fig.add_subplot(gs[5 + offset_index:, 0])
+        ax_txt_trade = fig.add_subplot(gs[5 + offset_index:, 1])
+        ax_txt_time = fig.add_subplot(gs[5 + offset_index:, 2])
 
         self._plot_equity(stats, ax=ax_equity)
         if self.rolling_sharpe:
@@ -632,6 +731,13 @@ class TearsheetStatistics(AbstractStatistics):
         self._plot_txt_curve(stats, ax=ax_txt_curve)
         self._plot_txt_trade(stats, ax=ax_txt_trade)
         self._plot_txt_time(stats, ax=ax_txt_time)
+        return fig
+
+    def plot_results(self, filename=None):
+        """
+        Visualizza il Tearsheet
+        """
+        fig = self._draw(plt.figure(), self.get_results())
 
         # Visualizza la figura
         plt.show()
@@ -639,6 +745,42 @@ class TearsheetStatistics(AbstractStatistics):
         if filename is not None:
             fig.savefig(filename, dpi=150, bbox_inches='tight')
 
+    def render(self, filename, dpi=150):
+        """
+        Disegna il Tearsheet direttamente su file, senza finestre né
+        stato globale di pyplot (la figura non è registrata in pyplot
+        e viene salvata con il backend Agg), per cui può essere
+        utilizzato su server senza display e in processi paralleli.
+        """
+        fig = self._draw(Figure(), self.get_results())
+        fig.savefig(filename, dpi=dpi, bbox_inches='tight')
+        return filename
+
+    @classmethod
+    def from_results(
+        cls, stats, title="", benchmark=None,
+        periods=None, rolling_sharpe=False
+    ):
+        """
+        Crea un Tearsheet a partire dai risultati già calcolati di un
+        backtest, senza portfolio handler, da utilizzare solo per la
+        visualizzazione o l'esportazione dei risultati.
+        """
+        tearsheet = cls.__new__(cls)
+        tearsheet.config = None
+        tearsheet.portfolio_handler = None
+        tearsheet.price_handler = None
+        tearsheet.title = title
+        tearsheet.benchmark = benchmark
+        tearsheet.periods = periods
+        tearsheet.rolling_sharpe = rolling_sharpe
+        tearsheet.resample = None
+        tearsheet.log_scale = False
+        tearsheet.recorder = None
+        tearsheet.benchmark_columns = None
+        tearsheet._results = stats
+        return tearsheet
+
     def get_filename(self, filename=""):
         if filename == "":
             now = datetime.utcnow()
@@ -647,5 +789,26 @@ class TearsheetStatistics(AbstractStatistics):
         return filename
 
     def save(self, filename=""):
+        """
+        Salva il Tearsheet nel file indicato: i file .json e .html
+        contengono le statistiche (si veda report), i file .pkl un
+        Tearsheet con i soli risultati (si veda from_results), da
+        riaprire con load, gli altri l'immagine del Tearsheet.
+        """
         filename = self.get_filename(filename)
-        self.plot_results
+        print("Save results to '%s'" % filename)
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == ".pkl":
+            tearsheet = self.from_results(
+                self.get_results(), self.title, self.benchmark,
+                self.periods, self.rolling_sharpe
+            )
+            with open(filename, 'wb') as fd:
+                pickle.dump(tearsheet, fd)
+        elif extension == ".json":
+            report.export_json(self.get_results(), filename)
+        elif extension in (".html", ".htm"):
+            report.export_html(self.get_results(), filename, self.title)
+        else:
+            self.render(filename)
+        return filename
@@ -0,0 +1,145 @@
+from __future__ import print_function
+
+import contextlib
+import io
+import itertools
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+
+def parameter_grid(grid):
+    """
+    Restituisce la lista di tutte le combinazioni dei parametri di
+    un dizionario {nome: lista di valori}, come dizionari
+    {nome: valore}, nell'ordine del prodotto cartesiano.
+    """
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*[grid[name] for name in names])
+    ]
+
+
+def summarise_results(results):
+    """
+    Riduce il dizionario restituito da get_results() alle sole
+    statistiche scalari, utilizzabili come riga di un DataFrame.
+    """
+    summary = {}
+    for key in ("sharpe", "max_drawdown_pct", "max_drawdown_duration"):
+        if key in results:
+            summary[key] = results[key]
+    equity = results.get("equity")
+    if equity is not None and len(equity) > 0:
+        summary["final_equity"] = equity.iloc[-1]
+        summary["total_return"] = equity.iloc[-1] / equity.iloc[0] - 1.0
+    trade_statistics = results.get("trade_statistics")
+    positions = results.get("positions")
+    if trade_statistics is not None:
+        summary["trades"] = trade_statistics["trades"]
+    else:
+        summary["trades"] = 0 if positions is None else len(positions)
+    return summary
+
+
+def _run_backtest(args):
+    """
+    Esegue un singolo backtest della griglia (in un processo
+    worker) e restituisce il riepilogo dei risultati.
+    """
+    session_factory, config, params = args
+    with contextlib.redirect_stdout(io.StringIO()):
+        session = session_factory(config, **params)
+        results = session.start_trading(testing=True)
+    return summarise_results(results)
+
+
+def _job_config(config, i):
+    """
+    Restituisce una copia della configurazione con OUTPUT_DIR
+    impostata alla directory del backtest numero i della griglia,
+    così che i worker non cancellino né sovrascrivano l'uno il log
+    dei trade dell'altro.
+    """
+    output_dir = os.path.join(
+        os.path.expanduser(config.OUTPUT_DIR), "sweep_%04d" % i
+    )
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    config = config.copy()
+    config["OUTPUT_DIR"] = output_dir
+    return config
+
+
+def run_sweep(
+    session_factory, param_grid, config,
+    max_workers=None, cache_dir=None
+):
+    """
+    Esegue un backtest per ogni combinazione di parametri,
+    distribuendoli su un ProcessPoolExecutor, e restituisce un
+    DataFrame con una riga per combinazione: i parametri seguiti
+    dalle statistiche di summarise_results.
+
+    session_factory(config, **params) deve restituire una
+    TradingSession pronta per start_trading e deve essere una
+    funzione di modulo, così da poter essere inviata ai worker.
+    param_grid è un dizionario {nome: lista di valori} oppure
+    una lista di dizionari di parametri.
+
+    I prezzi sono analizzati una sola volta: i CSV vengono
+    convertiti nella cache binaria di ColumnCache (config.CACHE_DIR,
+    cache_dir o una directory temporanea) costruendo la prima
+    sessione nel processo principale, quindi i worker leggono le
+    colonne tramite memory-map, condividendo le stesse pagine di
+    memoria. Le factory che creano un proprio gestore dei prezzi
+    devono quindi passargli cache_dir=config.get("CACHE_DIR").
+
+    Ogni backtest scrive il proprio log dei trade e gli altri file
+    di output nella directory OUTPUT_DIR/sweep_<i>, dove i è la
+    posizione dei parametri nella griglia.
+    """
+    if isinstance(param_grid, dict):
+        params_list = parameter_grid(param_grid)
+    else:
+        params_list = list(param_grid)
+    if len(params_list) == 0:
+        return pd.DataFrame()
+
+    tmp_dir = None
+    if config.get("CACHE_DIR") is None:
+        if cache_dir is None:
+            cache_dir = tmp_dir = tempfile.mkdtemp(prefix="datatrader-sweep-")
+        config = config.copy()
+        config["CACHE_DIR"] = cache_dir
+
+    try:
+        configs = [_job_config(config, i) for i in range(len(params_list))]
+        # Riempie la cache prima di avviare i worker
+        with contextlib.redirect_stdout(io.StringIO()):
+            session = session_factory(configs[0], **params_list[0])
+            session.compliance.close()
+            session.portfolio_handler.portfolio.closed_positions.close()
+        jobs = [
+            (session_factory, job_config, params)
+            for job_config, params in zip(configs, params_list)
+        ]
+        if max_workers == 1:
+            summaries = [_run_backtest(job) for job in jobs]
+        else:
+            if max_workers is None:
+                max_workers = min(len(jobs), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                summaries = list(executor.map(_run_backtest, jobs))
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return pd.DataFrame([
+        dict(params, **summary)
+        for params, summary in zip(params_list, summaries)
+    ])
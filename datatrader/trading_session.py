@@ -2,11 +2,14 @@ from __future__ import print_function
 from datetime import datetime
 from .compat import queue
 from .event import EventType
+from .event_dispatcher import EventDispatcher
+from .event_queue import BacktestEventQueue
 from .price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
 from .price_parser import PriceParser
 from .position_sizer.fixed import FixedPositionSizer
 from .risk_manager.example import ExampleRiskManager
 from .portfolio_handler import PortfolioHandler
+from .compliance.async_sink import AsyncCompliance
 from .compliance.example import ExampleCompliance
 from .execution_handler.ib_simulated import IBSimulatedExecutionHandler
 from .statistics.tearsheet import TearsheetStatistics
@@ -50,6 +53,8 @@ class TradingSession(object):
         self.session_type = session_type
         self._config_session()
         self.cur_time = None
+        self.dispatcher = EventDispatcher()
+        self._config_dispatcher()
 
         if self.session_type == "live":
             if self.end_session_time is None:
@@ -63,7 +68,8 @@ class TradingSession(object):
             self.price_handler = YahooDailyCsvBarPriceHandler(
                 self.config.CSV_DATA_DIR, self.events_queue,
                 self.tickers, start_date=self.start_date,
-                end_date=self.end_date
+                end_date=self.end_date,
+                cache_dir=self.config.get("CACHE_DIR")
             )
 
         if self.position_sizer is None:
@@ -83,6 +89,9 @@ class TradingSession(object):
 
         if self.compliance is None:
             self.compliance = ExampleCompliance(self.config)
+            if self.session_type == "live":
+                # Il log dei trade viene scritto da un thread separato
+                self.compliance = AsyncCompliance(self.compliance)
 
         if self.execution_handler is None:
             self.execution_handler = IBSimulatedExecutionHandler(
@@ -97,71 +106,154 @@ class TradingSession(object):
                 self.title, self.benchmark
             )
 
+    def _config_dispatcher(self):
+        """
+        Registra i componenti della sessione nella tabella di
+        dispatch per i tipi di evento che li riguardano. Altri
+        componenti possono essere aggiunti tramite
+        self.dispatcher.subscribe prima di start_trading.
+        """
+        price_events = (EventType.TICK, EventType.BAR)
+        self.dispatcher.subscribe(price_events, self._update_cur_time)
+        # Gli ordini in attesa vengono eseguiti ai nuovi prezzi
+        # prima che la strategia generi nuovi segnali
+        if hasattr(self.execution_handler, "on_price"):
+            self.dispatcher.subscribe(price_events, self.execution_handler.on_price)
+        if hasattr(self.statistics, "set_bar_period"):
+            self.dispatcher.subscribe(
+                (EventType.BAR, EventType.BAR_SLICE), self._set_bar_period
+            )
+        if self.sentiment_handler is not None:
+            self.dispatcher.subscribe(price_events, self._stream_sentiment)
+        self.dispatcher.subscribe(price_events, self.strategy.calculate_signals)
+        self.dispatcher.subscribe(price_events, self._update_portfolio_value)
+        self.dispatcher.subscribe(
+            price_events, self._update_statistics,
+            every=getattr(self.statistics, "update_every", 1)
+        )
+        # Un BarSliceEvent contiene le barre di tutti i ticker di un
+        # timestamp, quindi il portafoglio viene rivalutato interamente
+        # e le statistiche aggiornate una sola volta per timestamp
+        slice_events = (EventType.BAR_SLICE,)
+        self.dispatcher.subscribe(slice_events, self._update_cur_time)
+        if hasattr(self.execution_handler, "on_price"):
+            self.dispatcher.subscribe(slice_events, self.execution_handler.on_price)
+        if self.sentiment_handler is not None:
+            self.dispatcher.subscribe(slice_events, self._stream_sentiment)
+        self.dispatcher.subscribe(slice_events, self.strategy.calculate_signals)
+        self.dispatcher.subscribe(slice_events, self._update_portfolio_slice)
+        self.dispatcher.subscribe(
+            slice_events, self._update_statistics,
+            every=getattr(self.statistics, "update_every", 1)
+        )
+        self.dispatcher.subscribe(
+            (EventType.SENTIMENT,), self.strategy.calculate_signals
+        )
+        self.dispatcher.subscribe(
+            (EventType.SIGNAL,), self.portfolio_handler.on_signal
+        )
+        self.dispatcher.subscribe(
+            (EventType.ORDER,), self.execution_handler.execute_order
+        )
+        self.dispatcher.subscribe(
+            (EventType.FILL,), self.portfolio_handler.on_fill
+        )
+
+    def _set_bar_period(self, event):
+        # Comunica alle statistiche la durata delle barre alla prima
+        # barra ricevuta, quindi si rimuove dalla tabella di dispatch
+        self.statistics.set_bar_period(event.period)
+        self.dispatcher.unsubscribe(
+            (EventType.BAR, EventType.BAR_SLICE), self._set_bar_period
+        )
+
+    def _update_cur_time(self, event):
+        self.cur_time = event.time
+
+    def _stream_sentiment(self, event):
+        # Genera gli eventi di sentiment fino al tempo corrente
+        self.sentiment_handler.stream_next(stream_date=self.cur_time)
+
+    def _update_portfolio_value(self, event):
+        self.portfolio_handler.update_portfolio_value(event.ticker)
+
+    def _update_portfolio_slice(self, event):
+        self.portfolio_handler.update_portfolio_value()
+
+    def _update_statistics(self, event):
+        self.statistics.update(event.time, self.portfolio_handler)
+
     def _continue_loop_condition(self):
         if self.session_type == "backtest":
             return self.price_handler.continue_backtest
         else:
             return datetime.now() < self.end_session_time
 
+    def _get_queued_event(self):
+        """
+        Restituisce il prossimo evento di una queue.Queue,
+        oppure None se la coda è vuota.
+        """
+        try:
+            return self.events_queue.get(False)
+        except queue.Empty:
+            return None
+
     def _run_session(self):
         """
         Esegue un ciclo while infinito che esegue il
         polling della coda degli eventi e indirizza ogni
-        evento al componente della strategia del gestore
-        di esecuzione.
+        evento ai componenti registrati nel dispatcher
+        per il suo tipo.
         Il ciclo continua fino a quando la coda degli
         eventi non è stata svuotata.
+
+        Con una BacktestEventQueue gli eventi sono letti direttamente
+        dalla deque, senza lock né eccezioni quando la coda è vuota.
         """
         if self.session_type == "backtest":
             print("Running Backtest...")
         else:
             print("Running Realtime Session until %s" % self.end_session_time)
 
+        if isinstance(self.events_queue, BacktestEventQueue):
+            next_event = self.events_queue.next_event
+        else:
+            next_event = self._get_queued_event
+        dispatch = self.dispatcher.dispatch
+
         while self._continue_loop_condition():
-            try:
-                event = self.events_queue.get(False)
-            except queue.Empty:
+            event = next_event()
+            if event is None:
                 self.price_handler.stream_next()
             else:
-                if event is not None:
-                    if (
-                        event.type == EventType.TICK or
-                        event.type == EventType.BAR
-                    ):
-                        self.cur_time = event.time
-                        # Generate any sentiment events here
-                        if self.sentiment_handler is not None:
-                            self.sentiment_handler.stream_next(
-                                stream_date=self.cur_time
-                            )
-                        self.strategy.calculate_signals(event)
-                        self.portfolio_handler.update_portfolio_value()
-                        self.statistics.update(event.time, self.portfolio_handler)
-                    elif event.type == EventType.SENTIMENT:
-                        self.strategy.calculate_signals(event)
-                    elif event.type == EventType.SIGNAL:
-                        self.portfolio_handler.on_signal(event)
-                    elif event.type == EventType.ORDER:
-                        self.execution_handler.execute_order(event)
-                    elif event.type == EventType.FILL:
-                        self.portfolio_handler.on_fill(event)
-                    else:
-                        raise NotImplementedError("Unsupported event.type '%s'" % event.type)
+                dispatch(event)
 
     def start_trading(self, testing=False):
         """
         Esegue un backtest o una sessione dal vivo e genera le prestazioni al termine.
         """
-        self._run_session()
-        results = self.statistics.get_results()
-        print("---------------------------------")
-        print("Backtest complete.")
-        print("Sharpe Ratio: %0.2f" % results["sharpe"])
-        print(
-            "Max Drawdown: %0.2f%%" % (
-                results["max_drawdown_pct"] * 100.0
+        try:
+            try:
+                self._run_session()
+            finally:
+                # Scrive le transazioni rimaste nel buffer del log
+                if hasattr(self.compliance, "close"):
+                    self.compliance.close()
+            results = self.statistics.get_results()
+            print("---------------------------------")
+            print("Backtest complete.")
+            print("Sharpe Ratio: %0.2f" % results["sharpe"])
+            print(
+                "Max Drawdown: %0.2f%%" % (
+                    results["max_drawdown_pct"] * 100.0
+                )
             )
-        )
-        if not testing:
-            self.statistics.plot_results()
+            if not testing:
+                self.statistics.plot_results()
+        finally:
+            # Cancella i blocchi delle posizioni chiuse scritti su disco
+            closed_positions = self.portfolio_handler.portfolio.closed_positions
+            if hasattr(closed_positions, "close"):
+                closed_positions.close()
         return results
@@ -3,7 +3,7 @@ import datetime
 from datatrader import settings
 from datatrader.strategy.base import AbstractStrategy
 from datatrader.event import SignalEvent, EventType
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.trading_session import TradingSession
 
 
@@ -46,7 +46,7 @@ def run(config, testing, tickers, filename):
     end_date = datetime.datetime(2014, 1, 1)
 
     # Uso della strategia Buy and Hold
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
     strategy = BuyAndHoldStrategy(tickers[0], events_queue)
 
     # Setup del backtest
@@ -6,7 +6,7 @@ import click
 import numpy as np
 
 from datatrader import settings
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.price_parser import PriceParser
 from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
 from datatrader.strategy.base import Strategies
@@ -24,7 +24,7 @@ from coint_bollinger_strategy import CointegrationBollingerBandsStrategy
 def run(config, testing, tickers, filename):
 
     # Impostazione delle variabili necessarie per il backtest
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
     csv_dir = config.CSV_DATA_DIR
     initial_equity = PriceParser.parse(500000.00)
 
@@ -3,7 +3,7 @@
 import datetime
 
 from datatrader import settings
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.price_parser import PriceParser
 from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
 from datatrader.strategy.base import Strategies
@@ -25,7 +25,7 @@ def run(config, testing, tickers, filename):
     initial_equity = 100000.00
     start_date = datetime.datetime(2009, 8, 1)
     end_date = datetime.datetime(2016, 8, 1)
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
 
     # Uso del Manager dei Prezzi di Yahoo Daily
     price_handler = YahooDailyCsvBarPriceHandler(config.CSV_DATA_DIR, events_queue,
@@ -41,6 +41,15 @@ class KalmanPairsTradingStrategy(AbstractStrategy):
         Impostazione del corretto prezzo e timestamp dell'evento
         estratto in ordine dalla coda degli eventi.
         """
+        # Un BarSliceEvent contiene già i prezzi di tutti i ticker
+        # del timestamp (NaN per quelli mancanti)
+        if event.type == EventType.BAR_SLICE:
+            if self.time is not None and event.time != self.time:
+                self.days += 1
+            self.time = event.time
+            self.latest_prices = event.prices(self.tickers)
+            return
+
         # Impostazione della prima istanza di time
         if self.time is None:
             self.time = event.time
@@ -66,7 +75,7 @@ class KalmanPairsTradingStrategy(AbstractStrategy):
         """
         Calculo dei segnali della stategia con il filtro di Kalman.
         """
-        if event.type == EventType.BAR:
+        if event.type in (EventType.BAR, EventType.BAR_SLICE):
             self._set_correct_time_and_price(event)
 
             # Opera solo se abbiamo entrambe le osservazioni
@@ -3,7 +3,7 @@ import calendar
 
 from datatrader import settings
 from datatrader.position_sizer.rebalance import LiquidateRebalancePositionSizer
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.trading_session import TradingSession
 
 from datatrader.strategy.base import AbstractStrategy
@@ -71,7 +71,7 @@ def run(config, testing, tickers, filename):
     end_date = datetime.datetime(2016, 10, 12)
 
     # Usa la strategia Monthly Liquidate And Rebalance
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
     strategy = MonthlyLiquidateRebalanceStrategy(
         tickers, events_queue
     )
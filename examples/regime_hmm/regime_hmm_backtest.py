@@ -5,7 +5,7 @@ import datetime
 import pickle
 
 from datatrader import settings
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.price_parser import PriceParser
 from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
 from datatrader.strategy.base import Strategies
@@ -24,7 +24,7 @@ from regime_hmm_risk_manager import RegimeHMMRiskManager
 def run(config, testing, tickers, filename):
     # Impostazione delle variabili necessarie al backtest
     pickle_path = "/path/to/your/model/hmm_model_spy.pkl"
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
     csv_dir = config.CSV_DATA_DIR
     initial_equity = PriceParser.parse(500000.00)
 
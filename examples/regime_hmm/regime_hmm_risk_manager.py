@@ -54,7 +54,12 @@ class RegimeHMMRiskManager(AbstractRiskManager):
         order_event = OrderEvent(
             sized_order.ticker,
             sized_order.action,
-            sized_order.quantity
+            sized_order.quantity,
+            order_type=sized_order.order_type,
+            limit_price=sized_order.limit_price,
+            stop_price=sized_order.stop_price,
+            take_profit=sized_order.take_profit,
+            stop_loss=sized_order.stop_loss
         )
 
         # Se abbiamo un regime desiderato, permettiamo gli ordini di acquisto e di
@@ -4,7 +4,7 @@ import datetime
 import numpy as np
 
 from datatrader import settings
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.price_parser import PriceParser
 from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
 from datatrader.sentiment_handler.sentdex_sentiment_handler import SentdexSentimentHandler
@@ -23,7 +23,7 @@ from sentdex_sentiment_strategy import SentdexSentimentStrategy
 def run(config, testing, tickers, filename):
     # Impostazione delle variabili necessarie per il backtest
     # Informazioni sul Backtest
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
     csv_dir = config.CSV_DATA_DIR
     initial_equity = PriceParser.parse(500000.00)
 
@@ -6,7 +6,7 @@ import numpy as np
 from datatrader import settings
 from datatrader.strategy.base import AbstractStrategy
 from datatrader.event import SignalEvent, EventType
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.trading_session import TradingSession
 
 
@@ -71,28 +71,43 @@ class MovingAverageCrossStrategy(AbstractStrategy):
             self.bars += 1
 
 
-def run(config, testing, tickers, filename):
+def create_session(
+    config, tickers=("AAPL", "SPY"),
+    short_window=100, long_window=300
+):
+    """
+    Crea la sessione di backtest della strategia MAC, utilizzabile
+    anche come factory per datatrader.sweep.run_sweep.
+    """
     # Informazioni sul Backtest
-    title = ['Moving Average Crossover Example on AAPL: 100x300']
+    title = [
+        'Moving Average Crossover Example on %s: %sx%s' % (
+            tickers[0], short_window, long_window
+        )
+    ]
     initial_equity = 10000.0
     start_date = datetime.datetime(2000, 1, 1)
     end_date = datetime.datetime(2014, 1, 1)
 
     # Uso della strategia MAC
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
     strategy = MovingAverageCrossStrategy(
         tickers[0], events_queue,
-        short_window=100,
-        long_window=300
+        short_window=short_window,
+        long_window=long_window
     )
 
     # Setup del backtest
-    backtest = TradingSession(
-        config, strategy, tickers,
+    return TradingSession(
+        config, strategy, list(tickers),
         initial_equity, start_date, end_date,
         events_queue, title=title,
         benchmark=tickers[1],
     )
+
+
+def run(config, testing, tickers, filename):
+    backtest = create_session(config, tickers)
     results = backtest.start_trading(testing=testing)
     return results
 
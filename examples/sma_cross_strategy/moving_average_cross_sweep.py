@@ -0,0 +1,22 @@
+from datatrader import settings
+from datatrader.sweep import run_sweep
+
+from moving_average_cross_backtest import create_session
+
+
+def run(config, param_grid, max_workers=None):
+    results = run_sweep(create_session, param_grid, config, max_workers)
+    return results.sort_values("sharpe", ascending=False)
+
+
+if __name__ == "__main__":
+    # Dati di configurazione
+    testing = False
+    config = settings.from_file(
+        settings.DEFAULT_CONFIG_FILENAME, testing
+    )
+    param_grid = {
+        "short_window": [50, 100, 150],
+        "long_window": [200, 300, 400],
+    }
+    print(run(config, param_grid).to_string())
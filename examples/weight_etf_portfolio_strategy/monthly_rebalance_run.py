@@ -1,6 +1,6 @@
 
 from datatrader import settings
-from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
 from datatrader.price_parser import PriceParser
 from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
 from examples.strategies.monthly_liquidate_rebalance_strategy import MonthlyLiquidateRebalanceStrategy
@@ -23,7 +23,7 @@ def run_monthly_rebalance(
     tickers = [t for t in ticker_weights.keys()]
 
     # Imposta le variabili necessarie per il backtest
-    events_queue = queue.Queue()
+    events_queue = BacktestEventQueue()
     csv_dir = config.CSV_DATA_DIR
     initial_equity = PriceParser.parse(equity)
 
@@ -0,0 +1,193 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import pandas as pd
+from munch import munchify
+
+from datatrader.compliance.async_sink import AsyncCompliance
+from datatrader.compliance.base import AbstractCompliance
+from datatrader.compliance.example import ExampleCompliance
+from datatrader.compliance.trade_log import read_trade_log
+from datatrader.event import FillEvent
+from datatrader.price_parser import PriceParser
+
+
+class TestExampleCompliance(unittest.TestCase):
+    """
+    Verifica che il log dei trade venga scritto a blocchi, al
+    raggiungimento dei limiti del buffer o alla chiusura, e che i
+    formati CSV e binario contengano le stesse transazioni.
+    """
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.config = munchify({"OUTPUT_DIR": self.out_dir})
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+    def _fills(self, n):
+        start = pd.Timestamp("2020-01-02 09:30:00")
+        for i in range(n):
+            yield FillEvent(
+                start + pd.Timedelta(minutes=i), "AMZN" if i % 2 else "GOOG",
+                "BOT" if i % 3 else "SLD", 100 + i, "ARCA",
+                PriceParser.parse(566.56 + i), PriceParser.parse(1.00)
+            )
+
+    def _path(self, compliance):
+        return os.path.join(self.out_dir, compliance.csv_filename)
+
+    def test_buffered_rows(self):
+        compliance = ExampleCompliance(
+            self.config, max_rows=3, flush_interval=None
+        )
+        fills = list(self._fills(7))
+        for fill in fills[:2]:
+            compliance.record_trade(fill)
+        # Solo l'header è stato scritto
+        self.assertEqual(len(read_trade_log(self._path(compliance))), 0)
+        compliance.record_trade(fills[2])
+        self.assertEqual(len(read_trade_log(self._path(compliance))), 3)
+        for fill in fills[3:]:
+            compliance.record_trade(fill)
+        self.assertEqual(len(read_trade_log(self._path(compliance))), 6)
+        compliance.close()
+        df = read_trade_log(self._path(compliance))
+        self.assertEqual(len(df), 7)
+        self.assertEqual(list(df["quantity"]), [fill.quantity for fill in fills])
+        self.assertEqual(df["price"].iloc[-1], 572.56)
+        # Dopo close il log viene riaperto in append
+        compliance.record_trade(fills[0])
+        compliance.close()
+        self.assertEqual(len(read_trade_log(self._path(compliance))), 8)
+
+    def test_flush_limits(self):
+        compliance = ExampleCompliance(
+            self.config, max_bytes=1, flush_interval=None
+        )
+        compliance.record_trade(next(self._fills(1)))
+        self.assertEqual(len(read_trade_log(self._path(compliance))), 1)
+        compliance = ExampleCompliance(self.config, flush_interval=0.0)
+        compliance.record_trade(next(self._fills(1)))
+        self.assertEqual(len(read_trade_log(self._path(compliance))), 1)
+        compliance.close()
+
+    def test_binary_log(self):
+        fills = list(self._fills(10))
+        csv_compliance = ExampleCompliance(self.config, flush_interval=None)
+        binary_compliance = ExampleCompliance(
+            self.config, log_format="binary", max_rows=4, flush_interval=None
+        )
+        for fill in fills:
+            csv_compliance.record_trade(fill)
+            binary_compliance.record_trade(fill)
+        csv_compliance.close()
+        binary_compliance.close()
+        self.assertTrue(binary_compliance.csv_filename.endswith(".bin"))
+        csv_df = read_trade_log(self._path(csv_compliance))
+        binary_df = read_trade_log(self._path(binary_compliance))
+        binary_df["timestamp"] = binary_df["timestamp"].dt.tz_localize(None)
+        pd.testing.assert_frame_equal(csv_df, binary_df, check_dtype=False)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ExampleCompliance(self.config, log_format="xml")
+
+
+class SlowComplianceMock(AbstractCompliance):
+    """
+    Compliance che registra il thread di ogni scrittura e simula
+    un disco lento.
+    """
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.fills = []
+        self.threads = set()
+        self.flushes = 0
+        self.closed = False
+
+    def record_trade(self, fill):
+        if self.fail:
+            raise IOError("disk full")
+        self.threads.add(threading.current_thread().ident)
+        self.fills.append(fill)
+
+    def flush(self):
+        time.sleep(self.delay)
+        self.flushes += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestAsyncCompliance(unittest.TestCase):
+    """
+    Verifica che AsyncCompliance scriva le transazioni solo dal
+    thread di scrittura, a blocchi, e che al termine di close()
+    tutte le transazioni registrate siano state scritte.
+    """
+    def _fills(self, n):
+        return [
+            FillEvent(
+                pd.Timestamp("2020-01-02") + pd.Timedelta(seconds=i), "AMZN",
+                "BOT", 100, "ARCA", PriceParser.parse(566.56),
+                PriceParser.parse(1.00)
+            )
+            for i in range(n)
+        ]
+
+    def test_writes_off_thread(self):
+        mock = SlowComplianceMock(delay=0.002)
+        sink = AsyncCompliance(mock, max_queue=5, batch_size=3)
+        fills = self._fills(50)
+        for fill in fills:
+            sink.record_trade(fill)
+        sink.flush()
+        self.assertEqual(mock.fills, fills)
+        sink.record_trade(fills[0])
+        sink.close()
+        self.assertTrue(mock.closed)
+        self.assertEqual(len(mock.fills), 51)
+        self.assertNotIn(threading.current_thread().ident, mock.threads)
+        metrics = sink.metrics()
+        self.assertEqual(metrics["recorded"], 51)
+        self.assertEqual(metrics["written"], 51)
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertLessEqual(metrics["max_queue_depth"], 5)
+        self.assertGreater(metrics["blocked"], 0)
+        self.assertGreaterEqual(metrics["batches"], 17)
+        self.assertEqual(mock.flushes, metrics["batches"])
+        self.assertGreater(metrics["max_write_latency"], 0.0)
+
+    def test_writer_error(self):
+        sink = AsyncCompliance(SlowComplianceMock(fail=True))
+        for fill in self._fills(3):
+            sink.record_trade(fill)
+        with self.assertRaises(IOError):
+            sink.close()
+        self.assertEqual(sink.metrics()["written"], 3)
+        self.assertGreater(sink.metrics()["errors"], 0)
+
+    def test_trade_log(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            compliance = ExampleCompliance(
+                munchify({"OUTPUT_DIR": out_dir}), flush_interval=None
+            )
+            sink = AsyncCompliance(compliance, batch_size=7)
+            for fill in self._fills(20):
+                sink.record_trade(fill)
+            sink.close()
+            df = read_trade_log(os.path.join(out_dir, compliance.csv_filename))
+            self.assertEqual(len(df), 20)
+        finally:
+            shutil.rmtree(out_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from datatrader.price_parser import PriceParser
+from datatrader.statistics.recorder import EquityRecorder
+
+
+class TestEquityRecorder(unittest.TestCase):
+    """
+    Verifica che EquityRecorder restituisca le stesse serie del
+    dizionario {timestamp: PriceParser.display(equity)} ordinato,
+    anche con timestamp ripetuti o non in ordine e dopo aver
+    aumentato la capacità degli array.
+    """
+    def test_matches_dict(self):
+        recorder = EquityRecorder(("equity", "benchmark"), capacity=2, block_size=3)
+        equity = {}
+        benchmark = {}
+        dates = pd.date_range("2020-01-01", periods=20)
+        for i in range(40):
+            timestamp = dates[(i * 7) % 20 if i > 30 else i // 2]
+            value = PriceParser.parse(1000.00) + i * 123456
+            close = None if i < 4 else PriceParser.parse(250.00) - i * 5555
+            recorder.record(timestamp, value, close)
+            equity[timestamp] = PriceParser.display(value)
+            benchmark[timestamp] = (
+                np.nan if close is None else PriceParser.display(close)
+            )
+        expected = pd.Series(equity).sort_index()
+        series = recorder.to_series("equity")
+        self.assertEqual(len(series), 19)
+        self.assertTrue(series.index.equals(expected.index))
+        self.assertEqual(list(series), list(expected))
+        series_b = recorder.to_series("benchmark")
+        expected_b = pd.Series(benchmark).sort_index()
+        np.testing.assert_array_equal(series_b.values, expected_b.values)
+        self.assertTrue(np.isnan(series_b.iloc[0]))
+
+    def test_timezone(self):
+        recorder = EquityRecorder()
+        dates = pd.date_range("2020-01-01 09:30", periods=3, freq="min", tz="US/Eastern")
+        for i, timestamp in enumerate(dates):
+            recorder.record(timestamp, PriceParser.parse(100.00 + i))
+        series = recorder.to_series()
+        self.assertTrue(series.index.equals(dates))
+        self.assertEqual(list(series), [100.0, 101.0, 102.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
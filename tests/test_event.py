@@ -0,0 +1,51 @@
+import unittest
+
+import pandas as pd
+
+from datatrader.compat import pickle
+from datatrader.event import (
+    EventType, TickEvent, BarEvent, SignalEvent, OrderEvent, FillEvent
+)
+
+
+class TestEvents(unittest.TestCase):
+    """
+    Verifica che gli eventi a layout fisso (__slots__) mantengano
+    gli stessi attributi delle versioni precedenti.
+    """
+    def setUp(self):
+        self.time = pd.Timestamp("2016-01-04")
+
+    def test_type_and_no_dict(self):
+        events = [
+            (TickEvent("GOOG", self.time, 1, 2), EventType.TICK),
+            (BarEvent("GOOG", self.time, 60, 1, 2, 3, 4, 5), EventType.BAR),
+            (SignalEvent("GOOG", "BOT"), EventType.SIGNAL),
+            (OrderEvent("GOOG", "BOT", 100), EventType.ORDER),
+            (FillEvent(self.time, "GOOG", "BOT", 100, "ARCA", 1, 2), EventType.FILL),
+        ]
+        for event, event_type in events:
+            self.assertEqual(event.type, event_type)
+            self.assertEqual(event.typename, event_type.name)
+            self.assertFalse(hasattr(event, "__dict__"))
+
+    def test_period_readable(self):
+        bev = BarEvent("GOOG", self.time, 86400, 1, 2, 3, 4, 5)
+        self.assertEqual(bev.period_readable, "1day")
+        self.assertIsNone(bev.adj_close_price)
+        bev = BarEvent("GOOG", self.time, 7, 1, 2, 3, 4, 5)
+        self.assertEqual(bev.period_readable, "7sec")
+        self.assertIn("Period: 7sec", str(bev))
+
+    def test_attributes_are_writable_and_picklable(self):
+        order = OrderEvent("GOOG", "BOT", 100)
+        order.quantity = 50
+        order = pickle.loads(pickle.dumps(order))
+        self.assertEqual(
+            (order.ticker, order.action, order.quantity, order.type),
+            ("GOOG", "BOT", 50, EventType.ORDER)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
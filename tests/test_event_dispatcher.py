@@ -0,0 +1,54 @@
+import unittest
+
+from datatrader.event import EventType, OrderEvent, SignalEvent
+from datatrader.event_dispatcher import EventDispatcher
+
+
+class TestEventDispatcher(unittest.TestCase):
+    """
+    Verifica che EventDispatcher richiami solo i gestori registrati
+    per il tipo dell'evento, nell'ordine di registrazione e con la
+    frequenza richiesta.
+    """
+    def setUp(self):
+        self.dispatcher = EventDispatcher()
+        self.calls = []
+
+    def _handler(self, name):
+        def handler(event):
+            self.calls.append((name, event.type))
+        return handler
+
+    def test_dispatch_by_type_in_order(self):
+        self.dispatcher.subscribe((EventType.SIGNAL,), self._handler("a"))
+        self.dispatcher.subscribe(
+            (EventType.SIGNAL, EventType.ORDER), self._handler("b")
+        )
+        self.dispatcher.dispatch(SignalEvent("GOOG", "BOT"))
+        self.dispatcher.dispatch(OrderEvent("GOOG", "BOT", 100))
+        self.assertEqual(
+            self.calls, [
+                ("a", EventType.SIGNAL), ("b", EventType.SIGNAL),
+                ("b", EventType.ORDER)
+            ]
+        )
+
+    def test_unsupported_event_type(self):
+        self.assertRaises(
+            NotImplementedError, self.dispatcher.dispatch,
+            SignalEvent("GOOG", "BOT")
+        )
+
+    def test_every_and_unsubscribe(self):
+        handler = self._handler("stats")
+        self.dispatcher.subscribe((EventType.SIGNAL,), handler, every=3)
+        for i in range(7):
+            self.dispatcher.dispatch(SignalEvent("GOOG", "BOT"))
+        self.assertEqual(len(self.calls), 3)
+        self.dispatcher.unsubscribe((EventType.SIGNAL,), handler)
+        self.dispatcher.dispatch(SignalEvent("GOOG", "BOT"))
+        self.assertEqual(len(self.calls), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from datatrader.compat import queue
+from datatrader.event_queue import BacktestEventQueue
+
+
+class TestBacktestEventQueue(unittest.TestCase):
+    """
+    Verifica che BacktestEventQueue si comporti come una coda FIFO
+    compatibile con l'interfaccia di queue.Queue.
+    """
+    def setUp(self):
+        self.events_queue = BacktestEventQueue()
+
+    def test_fifo_order(self):
+        for i in range(3):
+            self.events_queue.put(i)
+        self.assertEqual(self.events_queue.qsize(), 3)
+        self.assertFalse(self.events_queue.empty())
+        self.assertEqual(self.events_queue.get(), 0)
+        self.assertEqual(self.events_queue.get(False), 1)
+        self.assertEqual(self.events_queue.next_event(), 2)
+        self.assertTrue(self.events_queue.empty())
+
+    def test_empty_queue(self):
+        self.assertIsNone(self.events_queue.next_event())
+        self.assertRaises(queue.Empty, self.events_queue.get, False)
+        self.assertRaises(queue.Empty, self.events_queue.get_nowait)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,320 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from datatrader.compat import queue
+from datatrader.event import (
+    BarEvent, BarSliceEvent, EventType, OrderEvent, TickEvent
+)
+from datatrader.execution_handler.ib_simulated import IBSimulatedExecutionHandler
+from datatrader.execution_handler.simulated import SimulatedExecutionHandler
+from datatrader.execution_handler.slippage import (
+    FixedSlippage, VolumeShareSlippage
+)
+from datatrader.execution_handler.trigger_book import PendingOrder, TriggerBook
+from datatrader.price_parser import PriceParser
+
+
+class PriceHandlerMock(object):
+    def get_last_timestamp(self, ticker):
+        return None
+
+
+class ComplianceMock(object):
+    def __init__(self):
+        self.fills = []
+
+    def record_trade(self, fill):
+        self.fills.append(fill)
+
+
+class TestSimulatedExecutionHandler(unittest.TestCase):
+    """
+    Verifica l'esecuzione degli ordini in attesa sulle barre e sui
+    tick successivi, con latenza, limite di partecipazione al
+    volume e slippage.
+    """
+    def setUp(self):
+        self.events_queue = queue.Queue()
+        self.start = pd.Timestamp("2020-01-02 09:30:00")
+
+    def _handler(self, **kwargs):
+        return SimulatedExecutionHandler(
+            self.events_queue, PriceHandlerMock(), **kwargs
+        )
+
+    def _bar(self, minute, ticker="AMZN", price=100.0, volume=1000):
+        price = PriceParser.parse(price)
+        return BarEvent(
+            ticker, self.start + pd.Timedelta(minutes=minute), 60,
+            price, price + PriceParser.parse(1.0),
+            price - PriceParser.parse(1.0), price + PriceParser.parse(0.5),
+            volume
+        )
+
+    def _fills(self):
+        fills = []
+        while not self.events_queue.empty():
+            fill = self.events_queue.get(False)
+            self.assertEqual(fill.type, EventType.FILL)
+            fills.append(fill)
+        return fills
+
+    def test_latency(self):
+        handler = self._handler(latency=90)
+        handler.on_price(self._bar(0))
+        handler.execute_order(OrderEvent("AMZN", "BOT", 100))
+        handler.on_price(self._bar(1))
+        self.assertEqual(self._fills(), [])
+        handler.on_price(self._bar(2, price=101.0))
+        fills = self._fills()
+        self.assertEqual(len(fills), 1)
+        self.assertEqual(fills[0].quantity, 100)
+        self.assertEqual(fills[0].price, PriceParser.parse(101.0))
+        self.assertEqual(fills[0].timestamp, self.start + pd.Timedelta(minutes=2))
+        self.assertEqual(handler.pending, 0)
+
+    def test_participation(self):
+        compliance = ComplianceMock()
+        handler = self._handler(
+            participation=0.1, compliance=compliance, bar_price="close"
+        )
+        handler.on_price(self._bar(0))
+        handler.execute_order(OrderEvent("AMZN", "BOT", 250))
+        handler.execute_order(OrderEvent("AMZN", "SLD", 30))
+        # Il volume di un altro ticker non esegue gli ordini
+        handler.on_price(self._bar(1, ticker="GOOG"))
+        self.assertEqual(self._fills(), [])
+        handler.on_price(self._bar(1))
+        handler.on_price(self._bar(2, volume=0))
+        handler.on_price(self._bar(3))
+        handler.on_price(self._bar(4, volume=1500))
+        fills = self._fills()
+        self.assertEqual(
+            [(fill.action, fill.quantity) for fill in fills],
+            [("BOT", 100), ("BOT", 100), ("BOT", 50), ("SLD", 30)]
+        )
+        self.assertEqual(fills[0].price, PriceParser.parse(100.5))
+        self.assertEqual(compliance.fills, fills)
+        self.assertEqual(handler.pending, 0)
+
+    def test_cancel_order(self):
+        handler = self._handler(participation=0.1)
+        handler.on_price(self._bar(0))
+        order_id = handler.execute_order(OrderEvent("AMZN", "BOT", 250))
+        handler.on_price(self._bar(1))
+        self.assertTrue(handler.cancel_order(order_id))
+        self.assertFalse(handler.cancel_order(order_id))
+        handler.on_price(self._bar(2))
+        self.assertEqual([fill.quantity for fill in self._fills()], [100])
+
+    def test_slippage(self):
+        handler = self._handler(slippage=FixedSlippage(bps=10.0))
+        handler.on_price(TickEvent(
+            "AMZN", self.start, PriceParser.parse(99.0), PriceParser.parse(101.0)
+        ))
+        handler.execute_order(OrderEvent("AMZN", "BOT", 100))
+        handler.execute_order(OrderEvent("AMZN", "SLD", 100))
+        handler.on_price(TickEvent(
+            "AMZN", self.start + pd.Timedelta(seconds=1),
+            PriceParser.parse(100.0), PriceParser.parse(100.2)
+        ))
+        fills = self._fills()
+        self.assertEqual(fills[0].price, PriceParser.parse("100.3002"))
+        self.assertEqual(fills[1].price, PriceParser.parse(99.9))
+
+        model = VolumeShareSlippage(impact=0.1, exponent=2.0)
+        price = PriceParser.parse(100.0)
+        self.assertEqual(
+            model.fill_price("BOT", price, 100, 1000), PriceParser.parse(100.1)
+        )
+        self.assertEqual(
+            model.fill_price("SLD", price, 100, 1000), PriceParser.parse(99.9)
+        )
+        self.assertEqual(model.fill_price("BOT", price, 100, None), price)
+
+    def test_bar_slice(self):
+        handler = self._handler(participation=0.5)
+        handler.on_price(self._bar(0))
+        handler.execute_order(OrderEvent("AMZN", "BOT", 800))
+        handler.execute_order(OrderEvent("GOOG", "SLD", 100))
+        handler.execute_order(OrderEvent("MSFT", "BOT", 100))
+        prices = np.array(
+            [PriceParser.parse(10.0), PriceParser.parse(20.0)], dtype=np.int64
+        )
+        handler.on_price(BarSliceEvent(
+            self.start + pd.Timedelta(minutes=1), 60, ["AMZN", "GOOG"],
+            prices, prices, prices, prices,
+            np.array([1000, 1000], dtype=np.int64), prices
+        ))
+        fills = self._fills()
+        self.assertEqual(
+            [(fill.ticker, fill.quantity, fill.price) for fill in fills],
+            [("AMZN", 500, prices[0]), ("GOOG", 100, prices[1])]
+        )
+        self.assertEqual(handler.pending, 2)
+
+    def test_many_orders(self):
+        handler = self._handler(participation=1.0)
+        handler.on_price(self._bar(0))
+        for i in range(20000):
+            handler.execute_order(OrderEvent("T%d" % (i % 100), "BOT", 10))
+        handler.on_price(self._bar(1, ticker="T0", volume=1000))
+        self.assertEqual(len(self._fills()), 100)
+        self.assertEqual(handler.pending, 19900)
+
+
+def _price(value):
+    return PriceParser.parse(value)
+
+
+class TestTriggerBook(unittest.TestCase):
+    """
+    Verifica l'attivazione degli ordini limite, stop e stop limite
+    e i relativi prezzi di esecuzione.
+    """
+    def _order(self, order_id, action, order_type, limit=None, stop=None):
+        return PendingOrder(
+            order_id, "AMZN", action, 100, None, 0, order_type,
+            limit_price=None if limit is None else _price(limit),
+            stop_price=None if stop is None else _price(stop)
+        )
+
+    def _match(self, book, open_price, high, low):
+        o, h, l = _price(open_price), _price(high), _price(low)
+        return [
+            (order.order_id, PriceParser.display(price))
+            for order, price in book.match("AMZN", o, h, l, o, h, l)
+        ]
+
+    def test_bar_crossings(self):
+        book = TriggerBook()
+        book.add(self._order(1, "BOT", "STP", stop=105.0))
+        book.add(self._order(2, "BOT", "STP", stop=110.0))
+        book.add(self._order(3, "SLD", "STP", stop=95.0))
+        book.add(self._order(4, "BOT", "LMT", limit=97.0))
+        book.add(self._order(5, "SLD", "LMT", limit=104.0))
+        book.add(self._order(6, "SLD", "LMT", limit=120.0))
+        self.assertEqual(len(book), 6)
+        self.assertEqual(self._match(book, 100.0, 101.0, 99.0), [])
+        self.assertEqual(
+            self._match(book, 100.0, 106.0, 96.0),
+            [(1, 105.0), (4, 97.0), (5, 104.0)]
+        )
+        # Apertura oltre il livello: esecuzione all'apertura
+        self.assertEqual(
+            self._match(book, 90.0, 112.0, 89.0), [(2, 110.0), (3, 90.0)]
+        )
+        self.assertEqual(len(book), 1)
+
+    def test_stop_limit(self):
+        book = TriggerBook()
+        book.add(self._order(1, "BOT", "STP LMT", limit=106.0, stop=105.0))
+        book.add(self._order(2, "BOT", "STP LMT", limit=106.0, stop=105.0))
+        self.assertEqual(self._match(book, 100.0, 105.5, 99.0), [(1, 105.0), (2, 105.0)])
+        # Apertura oltre il limite: l'ordine diventa un ordine limite
+        book.add(self._order(3, "BOT", "STP LMT", limit=106.0, stop=105.0))
+        self.assertEqual(self._match(book, 108.0, 109.0, 107.0), [])
+        self.assertEqual(len(book), 1)
+        self.assertEqual(self._match(book, 107.0, 107.5, 105.5), [(3, 106.0)])
+
+    def test_invalid_orders(self):
+        with self.assertRaises(ValueError):
+            self._order(1, "BOT", "LMT")
+        with self.assertRaises(ValueError):
+            self._order(1, "BOT", "MOC")
+
+
+class TestOrderTypes(unittest.TestCase):
+    """
+    Verifica l'esecuzione degli ordini limite, stop e bracket da
+    parte dei gestori di esecuzione simulati.
+    """
+    def setUp(self):
+        self.events_queue = queue.Queue()
+        self.price_handler = PriceHandlerMock()
+        self.start = pd.Timestamp("2020-01-02")
+
+    def _bar(self, day, open_price, high, low, close, volume=1000):
+        return BarEvent(
+            "AMZN", self.start + pd.Timedelta(days=day), 86400,
+            _price(open_price), _price(high), _price(low), _price(close),
+            volume
+        )
+
+    def _fills(self):
+        fills = []
+        while not self.events_queue.empty():
+            fill = self.events_queue.get(False)
+            fills.append((fill.action, fill.quantity, PriceParser.display(fill.price)))
+        return fills
+
+    def test_ib_bracket(self):
+        handler = IBSimulatedExecutionHandler(self.events_queue, self.price_handler)
+        handler.on_price(self._bar(0, 100.0, 101.0, 99.0, 100.0))
+        handler.execute_order(OrderEvent(
+            "AMZN", "BOT", 100, order_type="LMT", limit_price=_price(98.0),
+            take_profit=_price(110.0), stop_loss=_price(95.0)
+        ))
+        handler.on_price(self._bar(1, 100.0, 102.0, 99.0, 101.0))
+        self.assertEqual(self._fills(), [])
+        handler.on_price(self._bar(2, 99.0, 100.0, 97.0, 98.0))
+        self.assertEqual(self._fills(), [("BOT", 100, 98.0)])
+        self.assertEqual(len(handler.orders), 2)
+        handler.on_price(self._bar(3, 104.0, 111.0, 103.0, 110.0))
+        self.assertEqual(self._fills(), [("SLD", 100, 110.0)])
+        # Lo stop loss collegato è stato annullato
+        self.assertEqual(handler.orders, {})
+        handler.on_price(self._bar(4, 90.0, 91.0, 89.0, 90.0))
+        self.assertEqual(self._fills(), [])
+
+    def test_ib_tick_stop(self):
+        handler = IBSimulatedExecutionHandler(self.events_queue, self.price_handler)
+        handler.execute_order(OrderEvent(
+            "AMZN", "SLD", 10, order_type="STP", stop_price=_price(99.0)
+        ))
+        handler.on_price(TickEvent("AMZN", self.start, _price(99.5), _price(99.6)))
+        self.assertEqual(self._fills(), [])
+        handler.on_price(TickEvent("AMZN", self.start, _price(98.9), _price(99.1)))
+        self.assertEqual(self._fills(), [("SLD", 10, 98.9)])
+
+    def test_simulated_partial_limit(self):
+        handler = SimulatedExecutionHandler(
+            self.events_queue, self.price_handler, participation=0.1
+        )
+        handler.on_price(self._bar(0, 100.0, 101.0, 99.0, 100.0))
+        handler.execute_order(OrderEvent(
+            "AMZN", "BOT", 250, order_type="LMT", limit_price=_price(98.0),
+            take_profit=_price(110.0), stop_loss=_price(95.0)
+        ))
+        handler.on_price(self._bar(1, 99.0, 100.0, 97.0, 98.0))
+        handler.on_price(self._bar(2, 99.0, 100.0, 98.5, 99.0))
+        handler.on_price(self._bar(3, 97.0, 99.0, 96.0, 98.0))
+        handler.on_price(self._bar(4, 98.0, 99.0, 97.0, 98.0))
+        self.assertEqual(
+            self._fills(),
+            [("BOT", 100, 98.0), ("BOT", 100, 97.0), ("BOT", 50, 98.0)]
+        )
+        # Lo stop loss attivato prosegue a mercato all'apertura
+        handler.on_price(self._bar(5, 96.0, 96.0, 94.0, 94.0, volume=2000))
+        handler.on_price(self._bar(6, 93.0, 94.0, 92.0, 93.0))
+        self.assertEqual(self._fills(), [("SLD", 200, 95.0), ("SLD", 50, 93.0)])
+        self.assertEqual(handler.pending, 0)
+
+    def test_many_stops(self):
+        handler = IBSimulatedExecutionHandler(self.events_queue, self.price_handler)
+        for i in range(20000):
+            handler.execute_order(OrderEvent(
+                "AMZN", "SLD", 1, order_type="STP",
+                stop_price=_price(50.0 + i * 0.002)
+            ))
+        handler.on_price(self._bar(0, 100.0, 101.0, 99.0, 100.0))
+        self.assertEqual(len(self._fills()), 0)
+        handler.on_price(self._bar(1, 99.0, 99.0, 89.2, 90.0))
+        self.assertEqual(len(self._fills()), 400)
+        self.assertEqual(len(handler.orders), 19600)
+
+
+if __name__ == "__main__":
+    unittest.main()
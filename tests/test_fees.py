@@ -0,0 +1,253 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from munch import munchify
+
+from datatrader.compat import queue
+from datatrader.compliance.example import ExampleCompliance
+from datatrader.compliance.trade_log import read_trade_log
+from datatrader.event import EventType, OrderEvent, SignalEvent
+from datatrader.event_queue import BacktestEventQueue
+from datatrader.execution_handler.fees import (
+    FEE_MODELS, CompositeFeeModel, IBFixedFeeModel, PerShareFeeModel,
+    TieredFeeModel, create_fee_model, register_fee_model, reprice_equity,
+    trade_fees
+)
+from datatrader.execution_handler.ib_simulated import IBSimulatedExecutionHandler
+from datatrader.position_sizer.fixed import FixedPositionSizer
+from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
+from datatrader.price_parser import PriceParser
+from datatrader.strategy.base import AbstractStrategy
+from datatrader.trading_session import TradingSession
+
+
+class PriceHandlerMock(object):
+    def istick(self):
+        return False
+
+    def get_last_timestamp(self, ticker):
+        return pd.Timestamp("2020-01-02")
+
+    def get_last_close(self, ticker):
+        return PriceParser.parse(0.10)
+
+
+class RoundTripStrategy(AbstractStrategy):
+    """
+    Acquista ogni ticker alla seconda barra e lo vende alla quarta,
+    sia con BarEvent che con BarSliceEvent.
+    """
+    def __init__(self, events_queue):
+        self.events_queue = events_queue
+        self.bars = {}
+
+    def calculate_signals(self, event):
+        if event.type == EventType.BAR_SLICE:
+            tickers = event.tickers
+        elif event.type == EventType.BAR:
+            tickers = [event.ticker]
+        else:
+            return
+        for ticker in tickers:
+            bars = self.bars.get(ticker, 0)
+            if bars == 1:
+                self.events_queue.put(SignalEvent(ticker, "BOT"))
+            elif bars == 3:
+                self.events_queue.put(SignalEvent(ticker, "SLD"))
+            self.bars[ticker] = bars + 1
+
+
+class TestFeeModels(unittest.TestCase):
+    """
+    Verifica che le API scalare e vettoriale di ogni modello di
+    commissioni restituiscano gli stessi valori.
+    """
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        n = 2000
+        self.timestamps = np.sort(
+            pd.Timestamp("2020-01-01").value +
+            rng.randint(0, 120 * 86400, n).astype(np.int64) * 10 ** 9
+        ).view("datetime64[ns]")
+        self.tickers = np.array(["AMZN", "GOOG"])[rng.randint(0, 2, n)]
+        self.actions = np.array(["BOT", "SLD"])[rng.randint(0, 2, n)]
+        self.quantities = rng.randint(1, 5000, n).astype(np.int64) * 100
+        self.prices = PriceParser.parse_array(rng.uniform(0.05, 800.0, n))
+
+    def _check(self, model):
+        fees = model.fees(
+            self.timestamps, self.tickers, self.actions,
+            self.quantities, self.prices
+        )
+        self.assertEqual(fees.dtype, np.int64)
+        model.reset()
+        scalar = [
+            model.fee(*row) for row in zip(
+                pd.DatetimeIndex(self.timestamps), self.tickers,
+                self.actions, self.quantities.tolist(), self.prices.tolist()
+            )
+        ]
+        np.testing.assert_array_equal(fees, scalar)
+        return fees
+
+    def test_scalar_matches_vector(self):
+        for spec in (
+            "ib_fixed", "per_share", "percentage", "tiered", "regulatory",
+            {"model": "per_share", "rate": 0.005, "minimum": 1.0, "maximum_pct": 0.01},
+            ["tiered", {"model": "per_share", "rate": 0.003}, "regulatory"],
+        ):
+            self._check(create_fee_model(spec))
+
+    def test_ib_fixed(self):
+        model = IBFixedFeeModel()
+        price = PriceParser.parse(123.45)
+        for quantity, commission in (
+            (1, 1.0), (100, 1.0), (200, 1.0), (300, 1.5), (12345, 61.725)
+        ):
+            self.assertEqual(
+                model.fee(None, "AMZN", "BOT", quantity, price),
+                PriceParser.parse(commission)
+            )
+        handler = IBSimulatedExecutionHandler(queue.Queue(), PriceHandlerMock())
+        self.assertEqual(
+            handler.calculate_ib_commission(300, price), PriceParser.parse(1.5)
+        )
+
+    def test_tiered(self):
+        model = TieredFeeModel(minimum=None, maximum_pct=None)
+        price = PriceParser.parse(10.0)
+        jan = pd.Timestamp("2020-01-15")
+        self.assertEqual(
+            model.fee(jan, "AMZN", "BOT", 300000, price), PriceParser.parse(1050.0)
+        )
+        self.assertEqual(
+            model.fee(jan, "AMZN", "BOT", 1000, price), PriceParser.parse(2.0)
+        )
+        # Il volume si azzera ad ogni mese
+        self.assertEqual(
+            model.fee(pd.Timestamp("2020-02-03"), "AMZN", "BOT", 1000, price),
+            PriceParser.parse(3.5)
+        )
+
+    def test_registry(self):
+        self.assertIsInstance(create_fee_model(None), IBFixedFeeModel)
+        model = create_fee_model([{"model": "per_share", "rate": 0.01}, "regulatory"])
+        self.assertIsInstance(model, CompositeFeeModel)
+        self.assertEqual(
+            model.fee(None, "AMZN", "BOT", 100, PriceParser.parse(10.0)),
+            PriceParser.parse(1.0)
+        )
+        register_fee_model("free", lambda: PerShareFeeModel(rate=0.0))
+        try:
+            self.assertEqual(
+                create_fee_model("free").fee(None, "AMZN", "BOT", 100, 1), 0
+            )
+        finally:
+            FEE_MODELS.pop("free")
+        with self.assertRaises(ValueError):
+            create_fee_model("unknown")
+
+    def test_execution_handler(self):
+        events_queue = queue.Queue()
+        handler = IBSimulatedExecutionHandler(
+            events_queue, PriceHandlerMock(),
+            fee_model={"model": "per_share", "rate": 0.005,
+                       "minimum": 1.0, "maximum_pct": 0.01}
+        )
+        handler.execute_order(OrderEvent("AMZN", "BOT", 100))
+        # 1% del controvalore di 100 azioni a 0.10
+        self.assertEqual(
+            events_queue.get(False).commission, PriceParser.parse(0.1)
+        )
+
+    def test_reprice_equity(self):
+        times = pd.date_range("2020-01-01", periods=5, freq="D")
+        trades = pd.DataFrame({
+            "timestamp": [times[0], times[0], times[2]],
+            "ticker": ["AMZN", "GOOG", "AMZN"],
+            "action": ["BOT", "BOT", "SLD"],
+            "quantity": [100, 300, 100],
+            "exchange": ["ARCA"] * 3,
+            "price": [10.0, 20.0, 11.0],
+            "commission": [1.0, 1.5, 1.0],
+        })
+        equity = pd.Series([1000.0, 998.0, 1010.0, 1012.0, 1011.0], index=times)
+        pd.testing.assert_series_equal(
+            reprice_equity(equity, trades, "ib_fixed"), equity
+        )
+        fees = trade_fees(trades, {"model": "per_share", "rate": 0.01})
+        self.assertEqual(list(fees), [1.0, 3.0, 1.0])
+        repriced = reprice_equity(equity, trades, {"model": "per_share", "rate": 0.01})
+        self.assertEqual(
+            list(equity - repriced), [0.0, 1.5, 1.5, 1.5, 1.5]
+        )
+
+
+class TestRepriceSession(unittest.TestCase):
+    """
+    Verifica che reprice_equity ricostruisca la curva equity di una
+    sessione eseguita con un altro modello di commissioni.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        closes = {
+            "AAA": [10.0, 10.5, 10.2, 11.0, 11.4, 10.9],
+            "BBB": [20.0, 19.5, 21.0, 21.5, 20.8, 22.0],
+        }
+        for ticker, prices in closes.items():
+            with open(os.path.join(self.tmp_dir, ticker + ".csv"), "w") as fd:
+                fd.write("Date,Open,High,Low,Close,Adj Close,Volume\n")
+                for day, close in enumerate(prices):
+                    fd.write("2016-01-%02d,%s,%s,%s,%s,%s,1000\n" % (
+                        day + 4, close, close, close, close, close
+                    ))
+        self.config = munchify({
+            "CSV_DATA_DIR": self.tmp_dir, "OUTPUT_DIR": self.tmp_dir
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _run(self, tickers, fee_model, bar_slices):
+        events_queue = BacktestEventQueue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.tmp_dir, events_queue, tickers, bar_slices=bar_slices
+        )
+        compliance = ExampleCompliance(self.config)
+        session = TradingSession(
+            self.config, RoundTripStrategy(events_queue), tickers, 10000.0,
+            datetime.datetime(2016, 1, 1), datetime.datetime(2017, 1, 1),
+            events_queue, title=["Reprice test"],
+            price_handler=price_handler, compliance=compliance,
+            position_sizer=FixedPositionSizer(300),
+            execution_handler=IBSimulatedExecutionHandler(
+                events_queue, price_handler, compliance, fee_model
+            )
+        )
+        equity = session.start_trading(testing=True)["equity"]
+        trades = read_trade_log(compliance.log.filename)
+        return equity, trades
+
+    def _check(self, tickers, bar_slices):
+        fee_model = {"model": "per_share", "rate": 0.02}
+        equity, trades = self._run(tickers, None, bar_slices)
+        expected, _ = self._run(tickers, fee_model, bar_slices)
+        self.assertEqual(len(trades), 2 * len(tickers))
+        pd.testing.assert_series_equal(
+            reprice_equity(equity, trades, fee_model), expected
+        )
+
+    def test_single_ticker(self):
+        self._check(["AAA"], bar_slices=False)
+
+    def test_bar_slices(self):
+        self._check(["AAA", "BBB"], bar_slices=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import random
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from datatrader import settings
+from datatrader.portfolio import Portfolio
+from datatrader.price_parser import PriceParser
+from datatrader.statistics import performance as perf
+from datatrader.statistics.online import OnlineStatistics, StreamingCurve
+
+from test_portfolio import PriceHandlerMock
+
+
+class PortfolioHandlerMock(object):
+    def __init__(self, portfolio):
+        self.portfolio = portfolio
+        self.price_handler = portfolio.price_handler
+
+
+class TestOnlineStatistics(unittest.TestCase):
+    """
+    Verifica che le statistiche calcolate in modo incrementale
+    coincidano con quelle ricalcolate da zero, come in
+    TearsheetStatistics.get_results, anche quando più valori
+    arrivano con lo stesso timestamp.
+    """
+    def setUp(self):
+        self.config = settings.TEST
+
+    def _equity_updates(self, n):
+        """
+        Genera n aggiornamenti (timestamp, equity), con alcuni
+        timestamp ripetuti.
+        """
+        rng = random.Random(11)
+        start = pd.Timestamp("2020-01-01")
+        equity = 100000.0
+        day = 0
+        for i in range(n):
+            if rng.random() > 0.2:
+                day += 1
+            equity = round(equity * (1.0 + rng.gauss(0.0002, 0.01)), 2)
+            yield start + pd.Timedelta(days=day), equity
+
+    def _batch(self, equity, periods):
+        equity_s = pd.Series(equity).sort_index()
+        returns_s = equity_s.pct_change().fillna(0.0)
+        rolling = returns_s.rolling(window=periods)
+        rolling_sharpe_s = np.sqrt(periods) * (rolling.mean() / rolling.std())
+        cum_returns_s = np.exp(np.log(1 + returns_s).cumsum())
+        dd_s, max_dd, dd_dur = perf.create_drawdowns(cum_returns_s)
+        return {
+            "sharpe": perf.create_sharpe_ratio(returns_s, periods),
+            "equity": equity_s,
+            "returns": returns_s,
+            "rolling_sharpe": rolling_sharpe_s,
+            "cum_returns": cum_returns_s,
+            "drawdowns": dd_s,
+            "max_drawdown_pct": max_dd,
+            "max_drawdown_duration": dd_dur,
+        }
+
+    def test_matches_batch(self):
+        periods = 20
+        curve = StreamingCurve(periods=periods)
+        equity = {}
+        for i, (timestamp, value) in enumerate(self._equity_updates(500)):
+            curve.update(timestamp, value)
+            equity[timestamp] = value
+            if i % 97 != 96:
+                continue
+            # I risultati sono disponibili in qualsiasi momento
+            batch = self._batch(equity, periods)
+            self.assertAlmostEqual(curve.sharpe, batch["sharpe"], places=9)
+            self.assertAlmostEqual(
+                curve.max_drawdown, batch["max_drawdown_pct"], places=12
+            )
+            self.assertEqual(
+                curve.max_drawdown_duration, batch["max_drawdown_duration"]
+            )
+            for name in ("equity", "returns", "cum_returns"):
+                np.testing.assert_allclose(
+                    curve.series(name).values, batch[name].values, rtol=1e-12
+                )
+            # Il primo punto non è mai in drawdown
+            np.testing.assert_allclose(
+                curve.series("drawdowns").values[1:],
+                batch["drawdowns"].values[1:], rtol=1e-9, atol=1e-15
+            )
+            np.testing.assert_allclose(
+                curve.series("rolling_sharpe").values,
+                batch["rolling_sharpe"].values, rtol=1e-7
+            )
+            self.assertEqual(
+                list(curve.series("equity").index), list(batch["equity"].index)
+            )
+            self.assertAlmostEqual(
+                curve.rolling_sharpe, batch["rolling_sharpe"].iloc[-1], places=7
+            )
+            self.assertAlmostEqual(
+                curve.drawdown, batch["drawdowns"].iloc[-1], places=12
+            )
+
+    def test_drawdown_duration(self):
+        curve = StreamingCurve(periods=3, keep_history=False)
+        for i, value in enumerate([100.0, 110.0, 105.0, 100.0, 120.0, 90.0]):
+            curve.update(i, value)
+        self.assertEqual(curve.high_water_mark, 1.2)
+        self.assertAlmostEqual(curve.drawdown, 0.25)
+        self.assertEqual(curve.drawdown_duration, 1)
+        self.assertEqual(curve.max_drawdown_duration, 2)
+        self.assertAlmostEqual(curve.max_drawdown, 0.25)
+        self.assertEqual(curve.history["equity"], [])
+
+    def test_get_results(self):
+        portfolio = Portfolio(PriceHandlerMock(), PriceParser.parse(500000.00))
+        portfolio_handler = PortfolioHandlerMock(portfolio)
+        statistics = OnlineStatistics(self.config, portfolio_handler)
+        statistics.update(pd.Timestamp("2020-01-01"), portfolio_handler)
+        statistics.update(pd.Timestamp("2020-01-02"), portfolio_handler)
+        portfolio.transact_position(
+            "BOT", "AMZN", 100,
+            PriceParser.parse(566.56), PriceParser.parse(1.00)
+        )
+        statistics.update(pd.Timestamp("2020-01-03"), portfolio_handler)
+        results = statistics.get_results()
+        self.assertEqual(
+            list(results["equity"]), [500000.00, 500000.00, 499807.00]
+        )
+        self.assertAlmostEqual(results["drawdown"], 193.00 / 500000.00)
+        self.assertEqual(results["max_drawdown_duration"], 1)
+        self.assertEqual(results["trade_statistics"]["trades"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from datatrader.statistics import performance as perf
+
+
+class TestDrawdowns(unittest.TestCase):
+    """
+    Verifica drawdown, massimo drawdown, durata e periodi di
+    drawdown di una breve curva dei rendimenti cumulativi.
+    """
+    def setUp(self):
+        self.cum_returns = pd.Series(
+            [1.0, 1.1, 1.0, 0.99, 1.2, 1.2, 1.08, 0.9, 1.05],
+            index=pd.date_range("2020-01-01", periods=9)
+        )
+
+    def test_create_drawdowns(self):
+        drawdown, max_dd, duration = perf.create_drawdowns(self.cum_returns)
+        np.testing.assert_allclose(
+            drawdown.values,
+            [0.0, 0.0, 1 / 11.0, 0.11 / 1.1, 0.0, 0.0, 0.1, 0.25, 0.125]
+        )
+        self.assertEqual(list(drawdown.index), list(self.cum_returns.index))
+        self.assertAlmostEqual(max_dd, 0.25)
+        self.assertEqual(duration, 3)
+
+    def test_no_drawdown(self):
+        drawdown, max_dd, duration = perf.create_drawdowns(
+            pd.Series([1.0, 1.01, 1.02])
+        )
+        self.assertEqual(list(drawdown), [0.0, 0.0, 0.0])
+        self.assertEqual(max_dd, 0.0)
+        self.assertEqual(duration, 0)
+
+    def test_create_drawdown_periods(self):
+        periods = perf.create_drawdown_periods(self.cum_returns)
+        dates = self.cum_returns.index
+        self.assertEqual(list(periods["start"]), [dates[1], dates[5]])
+        self.assertEqual(list(periods["trough"]), [dates[3], dates[7]])
+        self.assertEqual(periods["recovery"].iloc[0], dates[4])
+        self.assertTrue(pd.isnull(periods["recovery"].iloc[1]))
+        np.testing.assert_allclose(periods["drawdown"], [0.1, 0.25])
+        self.assertEqual(list(periods["duration"]), [2, 3])
+
+
+class TestAggregateReturns(unittest.TestCase):
+    """
+    Verifica i rendimenti composti per periodo di calendario e per
+    offset di pandas, anche con l'indice non ordinato.
+    """
+    def setUp(self):
+        index = pd.to_datetime([
+            "2019-12-30", "2019-12-31", "2020-01-02", "2020-01-03",
+            "2020-01-06", "2020-02-03", "2020-02-04"
+        ])
+        self.returns = pd.Series(
+            [0.01, -0.02, 0.03, np.nan, 0.01, -0.01, 0.02], index=index
+        )
+
+    def test_calendar_periods(self):
+        monthly = perf.aggregate_returns(self.returns, 'monthly')
+        self.assertEqual(list(monthly.index), [(2019, 12), (2020, 1), (2020, 2)])
+        np.testing.assert_allclose(
+            monthly.values,
+            [1.01 * 0.98 - 1.0, 1.03 * 1.01 - 1.0, 0.99 * 1.02 - 1.0]
+        )
+        yearly = perf.aggregate_returns(self.returns, 'yearly')
+        self.assertEqual(list(yearly.index), [2019, 2020])
+        weekly = perf.aggregate_returns(self.returns, 'weekly')
+        # La settimana ISO 1 del 2020 è divisa tra dicembre e gennaio
+        self.assertEqual(
+            list(weekly.index),
+            [(2019, 12, 1), (2020, 1, 1), (2020, 1, 2), (2020, 2, 6)]
+        )
+        daily = perf.aggregate_returns(self.returns, 'daily')
+        self.assertEqual(len(daily), 7)
+        self.assertEqual(daily.loc[(2020, 1, 3)], 0.0)
+
+        shuffled = perf.aggregate_returns(self.returns.iloc[::-1], 'monthly')
+        np.testing.assert_allclose(shuffled.values, monthly.values)
+
+    def test_offsets(self):
+        quarterly = perf.aggregate_returns(self.returns, 'QE')
+        self.assertEqual(
+            list(quarterly.index), list(pd.to_datetime(["2019-12-31", "2020-03-31"]))
+        )
+        np.testing.assert_allclose(
+            quarterly.values,
+            [1.01 * 0.98 - 1.0, 1.03 * 1.01 * 0.99 * 1.02 - 1.0]
+        )
+        # Gli intervalli senza rendimenti sono esclusi
+        weekly = perf.aggregate_returns(self.returns, 'W-FRI')
+        self.assertEqual(len(weekly), 3)
+        self.assertRaises(
+            ValueError, perf.aggregate_returns, self.returns, 'fortnightly'
+        )
+
+
+class TestAnnualisation(unittest.TestCase):
+    """
+    Verifica il numero di periodi in un anno ricavato dalla durata
+    delle barre e stimato dai timestamp.
+    """
+    def test_periods_from_bar_period(self):
+        self.assertEqual(perf.periods_from_bar_period(86400), 252)
+        self.assertEqual(perf.periods_from_bar_period(3600), 252 * 6.5)
+        self.assertEqual(perf.periods_from_bar_period(60), 252 * 6.5 * 60)
+        self.assertEqual(perf.periods_from_bar_period(604800), 52)
+        # Le barre settimanali sono annualizzate come la stima dai timestamp
+        weekly = pd.date_range("2016-01-04", periods=20, freq="7D")
+        self.assertEqual(
+            perf.periods_from_bar_period(604800), perf.infer_periods(weekly)
+        )
+
+    def test_infer_periods(self):
+        self.assertEqual(
+            perf.infer_periods(pd.bdate_range("2020-01-01", periods=500)), 252
+        )
+        self.assertEqual(
+            perf.infer_periods(pd.date_range("2020-01-01", periods=100, freq="W")), 52
+        )
+        self.assertEqual(
+            perf.infer_periods(pd.date_range("2020-01-01", periods=36, freq="ME")), 12
+        )
+        # Barre al minuto dalle 9:30 alle 16:00 per dieci giorni
+        minutes = pd.DatetimeIndex(np.concatenate([
+            pd.date_range(day + pd.Timedelta("9h30min"), periods=390, freq="min")
+            for day in pd.bdate_range("2020-01-06", periods=10)
+        ]))
+        self.assertEqual(perf.infer_periods(minutes), 252 * 390)
+        self.assertEqual(perf.infer_periods(minutes[:1]), 252)
+
+    def test_default_periods(self):
+        returns = pd.Series(
+            np.random.RandomState(3).normal(0.0, 0.01, 300),
+            index=pd.bdate_range("2020-01-01", periods=300)
+        )
+        self.assertEqual(
+            perf.create_sharpe_ratio(returns),
+            perf.create_sharpe_ratio(returns, 252)
+        )
+        self.assertAlmostEqual(
+            perf.create_annual_volatility(returns),
+            returns.std() * np.sqrt(252)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
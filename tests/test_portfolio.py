@@ -1,8 +1,11 @@
+import copy
 import unittest
 
 from datatrader.portfolio import Portfolio
 from datatrader.price_parser import PriceParser
-from datatrader.price_handler.base import AbstractTickPriceHandler
+from datatrader.price_handler.base import (
+    AbstractBarPriceHandler, AbstractTickPriceHandler
+)
 
 
 class PriceHandlerMock(AbstractTickPriceHandler):
@@ -101,5 +104,67 @@ class TestAmazonGooglePortfolio(unittest.TestCase):
         self.assertEqual(PriceParser.display(self.portfolio.realised_pnl), -899.50)
 
 
+class BarPriceHandlerMock(AbstractBarPriceHandler):
+    def __init__(self):
+        self.closes = {}
+
+    def get_last_close(self, ticker):
+        return self.closes[ticker]
+
+
+class TestIncrementalPortfolioValue(unittest.TestCase):
+    """
+    Verifica che la rivalutazione incrementale della sola posizione
+    del ticker aggiornato produca esattamente gli stessi valori di
+    una rivalutazione completa di tutte le posizioni.
+    """
+    def setUp(self):
+        self.price_handler = BarPriceHandlerMock()
+        self.portfolio = Portfolio(
+            self.price_handler, PriceParser.parse(500000.00)
+        )
+
+    def _assert_same_as_full_rescan(self):
+        full = copy.deepcopy(self.portfolio)
+        full._update_portfolio()
+        self.assertEqual(self.portfolio.equity, full.equity)
+        self.assertEqual(self.portfolio.unrealised_pnl, full.unrealised_pnl)
+
+    def _new_close(self, ticker, price):
+        self.price_handler.closes[ticker] = PriceParser.parse(price)
+        self.portfolio._update_position_value(ticker)
+        self._assert_same_as_full_rescan()
+
+    def test_matches_full_rescan(self):
+        self._new_close("AAA", 10.01)
+        self._new_close("BBB", 20.02)
+        self._new_close("CCC", 30.03)
+        self.portfolio.transact_position(
+            "BOT", "AAA", 100,
+            PriceParser.parse(10.02), PriceParser.parse(1.00)
+        )
+        self.portfolio.transact_position(
+            "SLD", "BBB", 300,
+            PriceParser.parse(20.01), PriceParser.parse(1.50)
+        )
+        self._assert_same_as_full_rescan()
+        self._new_close("AAA", 10.37)
+        self._new_close("CCC", 31.00)
+        self._new_close("BBB", 19.33)
+        self.portfolio.transact_position(
+            "BOT", "BBB", 100,
+            PriceParser.parse(19.35), PriceParser.parse(1.00)
+        )
+        self.portfolio.transact_position(
+            "SLD", "AAA", 100,
+            PriceParser.parse(10.36), PriceParser.parse(1.00)
+        )
+        self._assert_same_as_full_rescan()
+        self._new_close("AAA", 9.99)
+        self._new_close("BBB", 21.07)
+        self.assertEqual(list(self.portfolio.positions), ["BBB"])
+        self.assertEqual(len(self.portfolio.closed_positions), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,195 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from munch import munchify
+
+from datatrader.event import EventType, SignalEvent
+from datatrader.event_queue import BacktestEventQueue
+from datatrader.portfolio import Portfolio
+from datatrader.portfolio_handler import PortfolioHandler
+from datatrader.position import Position
+from datatrader.position_archive import ClosedPositionArchive
+from datatrader.position_sizer.fixed import FixedPositionSizer
+from datatrader.price_handler.base import AbstractBarPriceHandler
+from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
+from datatrader.price_parser import PriceParser
+from datatrader.risk_manager.example import ExampleRiskManager
+from datatrader.strategy.base import AbstractStrategy
+from datatrader.trading_session import TradingSession
+
+
+class PriceHandlerMock(AbstractBarPriceHandler):
+    def get_last_close(self, ticker):
+        return PriceParser.parse(10.00)
+
+
+class RoundTripStrategy(AbstractStrategy):
+    """
+    Alterna acquisti e vendite ad ogni barra.
+    """
+    def __init__(self, events_queue):
+        self.events_queue = events_queue
+        self.bars = 0
+
+    def calculate_signals(self, event):
+        if event.type == EventType.BAR:
+            action = "BOT" if self.bars % 2 == 0 else "SLD"
+            self.events_queue.put(SignalEvent(event.ticker, action))
+            self.bars += 1
+
+
+class TestClosedPositionArchive(unittest.TestCase):
+    """
+    Verifica che l'archivio restituisca le stesse posizioni chiuse
+    che vi sono state aggiunte, nelle diverse modalità di memoria,
+    e che le statistiche dei trade comprendano tutte le posizioni.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _closed_positions(self, n):
+        """
+        Crea n posizioni chiuse alternando trade in utile e in
+        perdita, con la durata di i giorni per l'i-esima posizione.
+        """
+        start = datetime.datetime(2020, 1, 1)
+        for i in range(n):
+            price = PriceParser.parse(10.00)
+            exit_price = PriceParser.parse(11.00 if i % 2 == 0 else 9.50)
+            position = Position(
+                "BOT", "T%d" % (i % 3), 100, price,
+                PriceParser.parse(1.00), price, price
+            )
+            position.transact_shares(
+                "SLD", 100, exit_price, PriceParser.parse(1.00)
+            )
+            yield (
+                position, start + datetime.timedelta(days=i),
+                start + datetime.timedelta(days=2 * i)
+            )
+
+    def _assert_positions(self, archive, expected):
+        self.assertEqual(
+            [p.__dict__ for p in archive],
+            [p.__dict__ for p, o, c in expected]
+        )
+        df = archive.to_frame()
+        self.assertEqual(list(df["ticker"]), [p.ticker for p, o, c in expected])
+        self.assertEqual(
+            list(df["realised_pnl"]), [p.realised_pnl for p, o, c in expected]
+        )
+        self.assertEqual(
+            list(df["open_time"]), [pd.Timestamp(o) for p, o, c in expected]
+        )
+
+    def test_in_memory(self):
+        archive = ClosedPositionArchive(chunk_size=4)
+        expected = list(self._closed_positions(10))
+        for position, open_time, close_time in expected:
+            archive.append(position, open_time, close_time)
+        self.assertEqual(len(archive), 10)
+        self._assert_positions(archive, expected)
+
+        stats = archive.statistics.summary()
+        self.assertEqual(stats["trades"], 10)
+        self.assertEqual(stats["win_rate"], 0.5)
+        self.assertEqual(stats["avg_win"], 98.0)
+        self.assertEqual(stats["avg_loss"], -52.0)
+        self.assertEqual(stats["avg_trade"], 23.0)
+        self.assertEqual(stats["avg_holding_time"], pd.Timedelta(days=4.5))
+
+    def test_spill_to_disk(self):
+        archive = ClosedPositionArchive(
+            chunk_size=4, spill_dir=os.path.join(self.tmp_dir, "spill")
+        )
+        expected = list(self._closed_positions(10))
+        for position, open_time, close_time in expected:
+            archive.append(position, open_time, close_time)
+        self.assertEqual(len(os.listdir(archive.spill_dir)), 2)
+        self.assertEqual(archive._chunks, [])
+        self._assert_positions(archive, expected)
+        # close() cancella i blocchi, le statistiche restano complete
+        spill_dir = archive.spill_dir
+        archive.close()
+        self.assertFalse(os.path.exists(spill_dir))
+        self.assertEqual(len(archive), 10)
+        self.assertEqual(archive.statistics.trades, 10)
+        self._assert_positions(archive, expected[8:])
+
+    def test_context_manager(self):
+        with ClosedPositionArchive(
+            chunk_size=2, spill_dir=os.path.join(self.tmp_dir, "spill")
+        ) as archive:
+            for position, open_time, close_time in self._closed_positions(5):
+                archive.append(position, open_time, close_time)
+            self.assertEqual(len(os.listdir(archive.spill_dir)), 2)
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir, "spill")), [])
+
+    def test_session_removes_spill_dir(self):
+        with open(os.path.join(self.tmp_dir, "AAA.csv"), "w") as fd:
+            fd.write("Date,Open,High,Low,Close,Adj Close,Volume\n")
+            for day in range(8):
+                close = 10.0 + day % 3
+                fd.write("2016-01-%02d,%s,%s,%s,%s,%s,1000\n" % (
+                    day + 4, close, close, close, close, close
+                ))
+        config = munchify({
+            "CSV_DATA_DIR": self.tmp_dir, "OUTPUT_DIR": self.tmp_dir
+        })
+        spill_dir = os.path.join(self.tmp_dir, "spill")
+        archive = ClosedPositionArchive(chunk_size=1, spill_dir=spill_dir)
+        events_queue = BacktestEventQueue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.tmp_dir, events_queue, ["AAA"]
+        )
+        portfolio_handler = PortfolioHandler(
+            PriceParser.parse(10000.0), events_queue, price_handler,
+            FixedPositionSizer(10), ExampleRiskManager(), archive
+        )
+        session = TradingSession(
+            config, RoundTripStrategy(events_queue), ["AAA"], 10000.0,
+            datetime.datetime(2016, 1, 1), datetime.datetime(2017, 1, 1),
+            events_queue, title=["Archive test"],
+            price_handler=price_handler, portfolio_handler=portfolio_handler
+        )
+        results = session.start_trading(testing=True)
+        self.assertEqual(results["trade_statistics"]["trades"], 4)
+        self.assertEqual(len(results["positions"]), 4)
+        self.assertEqual(os.listdir(spill_dir), [])
+
+    def test_ring_buffer(self):
+        archive = ClosedPositionArchive(chunk_size=4, max_rows=5)
+        expected = list(self._closed_positions(23))
+        for position, open_time, close_time in expected:
+            archive.append(position, open_time, close_time)
+        self.assertEqual(len(archive), 23)
+        self.assertLessEqual(len(archive._chunks), 2)
+        self._assert_positions(archive, expected[-5:])
+        self.assertEqual(archive.statistics.trades, 23)
+
+    def test_portfolio_holding_time(self):
+        portfolio = Portfolio(PriceHandlerMock(), PriceParser.parse(10000.00))
+        self.assertIsNone(portfolio.closed_positions.to_frame())
+        price = PriceParser.parse(10.00)
+        portfolio.transact_position(
+            "BOT", "AAA", 10, price, 0, datetime.datetime(2020, 1, 1)
+        )
+        portfolio.transact_position(
+            "SLD", "AAA", 10, price, 0, datetime.datetime(2020, 1, 11)
+        )
+        self.assertEqual(len(portfolio.closed_positions), 1)
+        self.assertEqual(
+            portfolio.closed_positions.statistics.avg_holding_time,
+            pd.Timedelta(days=10)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
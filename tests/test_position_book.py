@@ -0,0 +1,115 @@
+import random
+import unittest
+
+import numpy as np
+
+from datatrader.position import Position
+from datatrader.position_book import PositionBook
+from datatrader.price_parser import PriceParser
+
+
+class TestPositionBook(unittest.TestCase):
+    """
+    Verifica che PositionBook produca esattamente gli stessi valori
+    di un insieme di oggetti Position sottoposti alle stesse
+    operazioni, sia rivalutando un ticker alla volta che tutte le
+    posizioni con mark_all.
+    """
+    def setUp(self):
+        self.book = PositionBook(capacity=2)
+        self.positions = {}
+
+    def _assert_same(self, ticker):
+        view = self.book[ticker]
+        position = self.positions[ticker]
+        self.assertEqual(view.action, position.action)
+        self.assertEqual(view.ticker, ticker)
+        for field in PositionBook.fields:
+            self.assertEqual(getattr(view, field), getattr(position, field))
+
+    def test_matches_position(self):
+        rng = random.Random(7)
+        tickers = ["AAA", "BBB", "CCC", "DDD", "EEE"]
+        closed = []
+        for i in range(300):
+            ticker = rng.choice(tickers)
+            price = PriceParser.parse(rng.uniform(10.0, 100.0))
+            commission = PriceParser.parse(rng.choice([0.0, 1.0, 1.35]))
+            bid = PriceParser.parse(rng.uniform(10.0, 100.0))
+            ask = bid + PriceParser.parse(0.03)
+            if ticker not in self.positions:
+                action = rng.choice(["BOT", "SLD"])
+                quantity = rng.randint(1, 500)
+                self.positions[ticker] = Position(
+                    action, ticker, quantity, price, commission, bid, ask
+                )
+                self.book.open(
+                    action, ticker, quantity, price, commission, bid, ask
+                )
+            else:
+                position = self.positions[ticker]
+                action = rng.choice(["BOT", "SLD"])
+                quantity = rng.randint(1, 500)
+                if rng.random() < 0.3:
+                    # Chiude la posizione
+                    action = "SLD" if position.quantity > 0 else "BOT"
+                    quantity = abs(position.quantity)
+                position.transact_shares(action, quantity, price, commission)
+                position.update_market_value(bid, ask)
+                self.book.transact(ticker, action, quantity, price, commission)
+                self.book.mark(ticker, bid, ask)
+                if position.quantity == 0:
+                    expected = self.positions.pop(ticker)
+                    closed.append((expected, self.book.close(ticker)))
+                    continue
+            self._assert_same(ticker)
+        self.assertEqual(list(self.book), list(self.positions))
+        self.assertGreater(len(closed), 0)
+        for expected, position in closed:
+            self.assertIsInstance(position, Position)
+            self.assertEqual(position.__dict__, expected.__dict__)
+
+        # Rivalutazione vettoriale di tutte le posizioni aperte
+        bids = [PriceParser.parse(rng.uniform(10.0, 100.0)) for t in self.book]
+        asks = [bid + PriceParser.parse(0.02) for bid in bids]
+        values, unrealised_pnls = self.book.mark_all(
+            np.array(bids), np.array(asks)
+        )
+        for i, ticker in enumerate(self.book):
+            position = self.positions[ticker]
+            position.update_market_value(bids[i], asks[i])
+            self._assert_same(ticker)
+            self.assertEqual(
+                values[i],
+                position.market_value - position.cost_basis +
+                position.realised_pnl
+            )
+            self.assertEqual(unrealised_pnls[i], position.unrealised_pnl)
+
+    def test_mapping_interface(self):
+        price = PriceParser.parse(50.00)
+        self.book.open("BOT", "AAA", 100, price, 0, price, price)
+        self.book.open("SLD", "BBB", 50, price, 0, price, price)
+        self.book.open("BOT", "CCC", 10, price, 0, price, price)
+        self.assertEqual(self.book.capacity, 4)
+        self.assertEqual(len(self.book), 3)
+        self.assertIn("BBB", self.book)
+        self.assertEqual(self.book["BBB"].quantity, 50)
+        self.assertEqual(self.book["BBB"].action, "SLD")
+        self.assertIsNone(self.book.get("DDD"))
+        self.assertRaises(
+            ValueError, self.book.open, "BOT", "AAA", 1, price, 0, price, price
+        )
+
+        closed = self.book.close("AAA")
+        self.assertEqual(closed.quantity, 100)
+        self.assertEqual(list(self.book), ["BBB", "CCC"])
+        # La riga liberata viene riutilizzata dal nuovo ticker
+        view = self.book.open("BOT", "DDD", 20, price, 0, price, price)
+        self.assertEqual(view.row, 0)
+        self.assertEqual(view.quantity, 20)
+        self.assertEqual(self.book.keys(), ["BBB", "CCC", "DDD"])
+
+
+if __name__ == "__main__":
+    unittest.main()
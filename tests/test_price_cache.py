@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from datatrader.price_parser import PriceParser
+from datatrader.price_handler.cache import ColumnCache
+from datatrader.price_handler.columnar import BarColumns
+from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
+from datatrader.compat import queue
+
+
+CSV_HEADER = "Date,Open,High,Low,Close,Adj Close,Volume\n"
+
+CSV_ROWS = [
+    "2016-01-04,10.50,11.00,10.25,10.75,10.70,1000",
+    "2016-01-05,10.75,11.25,10.50,11.00,10.95,2000",
+    "2016-01-06,11.00,11.50,10.75,11.25,11.20,3000",
+]
+
+
+class TestColumnCache(unittest.TestCase):
+    """
+    Verifica che la cache binaria delle colonne restituisca gli
+    stessi prezzi del CSV, che venga riutilizzata nei caricamenti
+    successivi e che venga invalidata quando il CSV cambia.
+    """
+    def setUp(self):
+        self.csv_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self._write_csv(CSV_ROWS)
+
+    def tearDown(self):
+        shutil.rmtree(self.csv_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def _write_csv(self, rows):
+        with open(os.path.join(self.csv_dir, "AAA.csv"), "w") as fd:
+            fd.write(CSV_HEADER)
+            fd.write("\n".join(rows) + "\n")
+
+    def _closes(self):
+        events_queue = queue.Queue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.csv_dir, events_queue, ["AAA"], cache_dir=self.cache_dir
+        )
+        while price_handler.continue_backtest:
+            price_handler.stream_next()
+        closes = []
+        while not events_queue.empty():
+            closes.append(events_queue.get().close_price)
+        return price_handler, closes
+
+    def test_cold_and_warm_load(self):
+        """
+        Il primo caricamento scrive la cache, il secondo la legge
+        tramite memory-map producendo gli stessi eventi.
+        """
+        _, cold = self._closes()
+        price_handler, warm = self._closes()
+        self.assertEqual(cold, warm)
+        self.assertEqual(cold[0], PriceParser.parse(10.75))
+        self.assertIsInstance(
+            price_handler.tickers_data["AAA"].close_price, np.memmap
+        )
+
+    def test_invalidated_when_source_changes(self):
+        """
+        Se il CSV viene modificato la cache viene ricreata.
+        """
+        _, before = self._closes()
+        self._write_csv(CSV_ROWS[:2])
+        _, after = self._closes()
+        self.assertEqual(len(before), 3)
+        self.assertEqual(len(after), 2)
+
+    def test_loader_called_once(self):
+        """
+        Il loader viene chiamato solo quando la cache non è valida.
+        """
+        calls = []
+        path = os.path.join(self.csv_dir, "AAA.csv")
+        cache = ColumnCache(self.cache_dir)
+
+        def loader(path):
+            calls.append(path)
+            df = pd.read_csv(path, parse_dates=True, index_col=0)
+            return BarColumns.from_frame(df, "AAA")
+
+        first = cache.load("Test", path, "AAA", BarColumns, loader)
+        second = cache.load("Test", path, "AAA", BarColumns, loader)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(list(first.volume), list(second.volume))
+        self.assertEqual(second.ticker, "AAA")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 from datatrader.price_parser import PriceParser
@@ -6,6 +9,14 @@ from datatrader.compat import queue
 from datatrader import settings
 
 
+# Prezzo iniziale e millisecondi dei tick di ogni ticker
+TICK_DATA = {
+    "GOOG": (683.56, 358),
+    "AMZN": (502.10, 562),
+    "MSFT": (50.15, 578),
+}
+
+
 class TestPriceHandlerSimpleCase(unittest.TestCase):
     """
     Verifica dell'inizializzazione di un oggetto PriceHandler
@@ -173,5 +184,101 @@ class TestPriceHandlerSimpleCase(unittest.TestCase):
         # self.assertEqual(PriceParser.display(ask, 5), None)
 
 
+class TestChunkedPriceHandler(unittest.TestCase):
+    """
+    Verifica che la lettura a blocchi dei file CSV dei tick
+    trasmetta esattamente gli stessi TickEvent della lettura
+    completa, anche quando i blocchi sono molto piccoli.
+    """
+    def setUp(self):
+        """
+        Crea una directory temporanea con dieci tick per ticker,
+        oltre a un file vuoto e a uno con la sola intestazione.
+        """
+        self.csv_dir = tempfile.mkdtemp()
+        for ticker, (price, millis) in TICK_DATA.items():
+            with open(os.path.join(self.csv_dir, "%s.csv" % ticker), "w") as fd:
+                fd.write("Ticker,Time,Bid,Ask\n")
+                for k in range(10):
+                    fd.write("%s,01.02.2016 00:00:%02d.%03d,%.5f,%.5f\n" % (
+                        ticker, k + 1, millis,
+                        price + 0.00001 * k, price + 0.02 - 0.00001 * k
+                    ))
+        open(os.path.join(self.csv_dir, "EMPTY.csv"), "w").close()
+        with open(os.path.join(self.csv_dir, "HEADER.csv"), "w") as fd:
+            fd.write("Ticker,Time,Bid,Ask\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.csv_dir)
+
+    def _price_handler(self, chunksize, tickers=("GOOG", "AMZN", "MSFT")):
+        events_queue = queue.Queue()
+        price_handler = HistoricCSVTickPriceHandler(
+            self.csv_dir, events_queue, list(tickers), chunksize=chunksize
+        )
+        return price_handler, events_queue
+
+    def _stream_all(self, chunksize):
+        price_handler, events_queue = self._price_handler(chunksize)
+        events = []
+        while price_handler.continue_backtest:
+            price_handler.stream_next()
+        while not events_queue.empty():
+            e = events_queue.get()
+            events.append((e.ticker, e.time, e.bid, e.ask))
+        return price_handler, events
+
+    def test_same_events_as_full_read(self):
+        _, full = self._stream_all(None)
+        for chunksize in (1, 3, 1000):
+            price_handler, chunked = self._stream_all(chunksize)
+            self.assertEqual(chunked, full)
+        self.assertEqual(len(full), 30)
+        self.assertEqual(
+            [e[0] for e in full[:3]], ["GOOG", "AMZN", "MSFT"]
+        )
+        bid, ask = price_handler.get_best_bid_ask("MSFT")
+        last_msft = [e for e in full if e[0] == "MSFT"][-1]
+        self.assertEqual((bid, ask), last_msft[2:])
+
+    def test_initial_prices(self):
+        price_handler, _ = self._price_handler(2)
+        bid, ask = price_handler.get_best_bid_ask("AMZN")
+        self.assertEqual(PriceParser.display(bid, 5), 502.1)
+        self.assertEqual(PriceParser.display(ask, 5), 502.12)
+        self.assertEqual(
+            price_handler.get_last_timestamp("AMZN").strftime(
+                "%d-%m-%Y %H:%M:%S.%f"
+            ),
+            "01-02-2016 00:00:01.562000"
+        )
+
+    def test_unsorted_ticks(self):
+        # Tick fuori ordine all'interno di un blocco e tra due blocchi
+        path = os.path.join(self.csv_dir, "GOOG.csv")
+        with open(path) as fd:
+            lines = fd.readlines()
+        for swap in (3, 4):
+            rows = list(lines)
+            rows[swap], rows[swap + 1] = rows[swap + 1], rows[swap]
+            with open(path, "w") as fd:
+                fd.writelines(rows)
+            # La lettura completa ordina i tick
+            price_handler, _ = self._stream_all(None)
+            self.assertFalse(price_handler.continue_backtest)
+            with self.assertRaises(ValueError):
+                self._stream_all(4)
+
+    def test_no_ticks(self):
+        # I file senza tick non vengono sottoscritti, in entrambe le modalità
+        for chunksize in (None, 2):
+            price_handler, events_queue = self._price_handler(
+                chunksize, ("EMPTY", "HEADER", "MSFT")
+            )
+            self.assertEqual(list(price_handler.tickers), ["MSFT"])
+            self.assertEqual(list(price_handler.tickers_data), ["MSFT"])
+            price_handler.stream_next()
+            self.assertEqual(events_queue.get(False).ticker, "MSFT")
+
 if __name__ == "__main__":
     unittest.main()
@@ -58,6 +58,104 @@ class TestPriceParser(unittest.TestCase):
         displayed = PriceParser.display(self.float)
         self.assertEqual(displayed, 10.12)
 
+    def test_price_from_str(self):
+        parsed = PriceParser.parse("10.1234567")
+        self.assertEqual(parsed, 101234567)
+        self.assertIsInstance(parsed, int)
+
+    def test_price_from_float64(self):
+        parsed = PriceParser.parse(np.float64(self.float))
+        self.assertEqual(parsed, 101234567)
+        self.assertIsInstance(parsed, int)
+
+    def test_display_dp(self):
+        parsed = PriceParser.parse(self.float)
+        self.assertEqual(PriceParser.display(parsed, 4), 10.1235)
+        self.assertEqual(PriceParser.display(self.float, 4), 10.1235)
+
+    def test_unsupported_type(self):
+        self.assertRaises(NotImplementedError, PriceParser.parse, None)
+        self.assertRaises(NotImplementedError, PriceParser.display, None)
+
+    def test_parse_array(self):
+        floats = [self.float, self.rounded_float, 0.29, 1234.5678]
+        expected = [PriceParser.parse(x) for x in floats]
+        parsed = PriceParser.parse_array(np.array(floats))
+        self.assertEqual(parsed.dtype, np.int64)
+        self.assertEqual(list(parsed), expected)
+        strings = np.array([str(x) for x in floats])
+        self.assertEqual(list(PriceParser.parse_array(strings)), expected)
+        ints = np.array([self.int, 101234567])
+        self.assertEqual(list(PriceParser.parse_array(ints)), list(ints))
+        mixed = np.array([self.int, self.float], dtype=object)
+        self.assertEqual(
+            list(PriceParser.parse_array(mixed)), [200, 101234567]
+        )
+        self.assertRaises(
+            ValueError, PriceParser.parse_array, np.array([1.0, np.nan])
+        )
+
+    def test_price_from_str_exact(self):
+        # int(float("0.41") * PRICE_MULTIPLIER) darebbe 4099999
+        self.assertEqual(PriceParser.parse("0.41"), 4100000)
+        self.assertEqual(PriceParser.parse_decimal("-.5"), -5000000)
+        self.assertEqual(PriceParser.parse_decimal(" +12 "), 120000000)
+        self.assertEqual(PriceParser.parse_decimal("1.5e2"), 1500000000)
+        # Oltre la settima cifra si arrotonda, le metà lontano dallo zero
+        self.assertEqual(PriceParser.parse_decimal("0.12345674"), 1234567)
+        self.assertEqual(PriceParser.parse_decimal("0.12345675"), 1234568)
+        self.assertEqual(PriceParser.parse_decimal("-0.00000005"), -1)
+        for value in ("", ".", "abc", "1.2.3", "nan", "1_0.5x", "1_000", "1_.5"):
+            self.assertRaises(ValueError, PriceParser.parse_decimal, value)
+        # Prezzi oltre il percorso rapido del float
+        self.assertEqual(
+            PriceParser.parse_decimal("123456789.12345675"), 1234567891234568
+        )
+
+    def test_parse_decimal_array(self):
+        strings = [
+            "0.41", "10.1234567", "-2.5", "+3", ".75", "1e3",
+            "0.123456785", "1234.56 "
+        ]
+        expected = [PriceParser.parse_decimal(x) for x in strings]
+        for values in (
+            np.array(strings), np.array(strings, dtype=object),
+            np.array(strings).astype(np.bytes_)
+        ):
+            parsed = PriceParser.parse_array(values)
+            self.assertEqual(parsed.dtype, np.int64)
+            self.assertEqual(list(parsed), expected)
+        self.assertRaises(
+            ValueError, PriceParser.parse_decimal_array, np.array(["1", "1_000"])
+        )
+        self.assertRaises(
+            ValueError, PriceParser.parse_decimal_array, np.array(["1", "x"])
+        )
+
+    def test_parse_array_exact(self):
+        floats = np.array([0.41, 0.29, 1234.5678, -2.675, 10.1234567])
+        self.assertEqual(
+            list(PriceParser.parse_array(floats, exact=True)),
+            [PriceParser.parse_decimal(repr(float(x))) for x in floats]
+        )
+        self.assertEqual(PriceParser.parse_array(floats)[0], 4099999)
+
+    def test_display_array(self):
+        # Valori che np.round arrotonda diversamente da round()
+        prices = np.array([
+            101234567, 10050000, 26750000, 12345000, 3049999999, 1000
+        ], dtype=np.int64)
+        for dp in (2, 4):
+            self.assertEqual(
+                list(PriceParser.display_array(prices, dp)),
+                [PriceParser.display(int(x), dp) for x in prices]
+            )
+            floats = prices / PriceParser.PRICE_MULTIPLIER
+            self.assertEqual(
+                list(PriceParser.display_array(floats, dp)),
+                [PriceParser.display(float(x), dp) for x in floats]
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
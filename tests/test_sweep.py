@@ -0,0 +1,115 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from munch import munchify
+
+from datatrader.compliance.trade_log import read_trade_log
+from datatrader.event import EventType, SignalEvent
+from datatrader.event_queue import BacktestEventQueue
+from datatrader.position_sizer.fixed import FixedPositionSizer
+from datatrader.strategy.base import AbstractStrategy
+from datatrader.sweep import parameter_grid, run_sweep
+from datatrader.trading_session import TradingSession
+
+
+CSV_HEADER = "Date,Open,High,Low,Close,Adj Close,Volume\n"
+
+
+class BuyOnBarStrategy(AbstractStrategy):
+    """
+    Acquista alla barra numero "entry_bar".
+    """
+    def __init__(self, ticker, events_queue, entry_bar):
+        self.ticker = ticker
+        self.events_queue = events_queue
+        self.entry_bar = entry_bar
+        self.bars = 0
+
+    def calculate_signals(self, event):
+        if event.type == EventType.BAR:
+            if self.bars == self.entry_bar:
+                self.events_queue.put(
+                    SignalEvent(self.ticker, "BOT")
+                )
+            self.bars += 1
+
+
+def create_session(config, entry_bar=0, quantity=10):
+    events_queue = BacktestEventQueue()
+    strategy = BuyOnBarStrategy("AAA", events_queue, entry_bar)
+    return TradingSession(
+        config, strategy, ["AAA"], 10000.0,
+        datetime.datetime(2016, 1, 1), datetime.datetime(2017, 1, 1),
+        events_queue, title=["Sweep test"],
+        position_sizer=FixedPositionSizer(quantity)
+    )
+
+
+class TestSweep(unittest.TestCase):
+    """
+    Verifica la griglia dei parametri e che il risultato della
+    sweep non dipenda dal numero di processi worker.
+    """
+    def setUp(self):
+        self.csv_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.csv_dir, "AAA.csv"), "w") as fd:
+            fd.write(CSV_HEADER)
+            for day, close in enumerate([10.0, 10.5, 10.2, 11.0, 11.4, 10.9]):
+                fd.write(
+                    "2016-01-%02d,%s,%s,%s,%s,%s,1000\n" % (
+                        day + 4, close, close, close, close, close
+                    )
+                )
+        self.config = munchify({
+            "CSV_DATA_DIR": self.csv_dir, "OUTPUT_DIR": self.csv_dir
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.csv_dir)
+
+    def test_parameter_grid(self):
+        self.assertEqual(
+            parameter_grid({"a": [1, 2], "b": ["x"]}),
+            [{"a": 1, "b": "x"}, {"a": 2, "b": "x"}]
+        )
+
+    def test_run_sweep(self):
+        grid = {"entry_bar": [0, 2], "quantity": [10, 20]}
+        serial = run_sweep(create_session, grid, self.config, max_workers=1)
+        parallel = run_sweep(create_session, grid, self.config, max_workers=2)
+        self.assertTrue(serial.equals(parallel))
+        self.assertEqual(
+            list(serial.columns[:2]), ["entry_bar", "quantity"]
+        )
+        self.assertEqual(len(serial), 4)
+        self.assertEqual(list(serial["trades"]), [0, 0, 0, 0])
+        # Acquistando prima e più azioni si guadagna di più
+        final = serial.set_index(["entry_bar", "quantity"])["final_equity"]
+        self.assertGreater(final[(0, 20)], final[(0, 10)])
+        self.assertGreater(final[(0, 10)], final[(2, 10)])
+
+    def test_trade_logs(self):
+        grid = parameter_grid({"entry_bar": [0, 1, 2, 3], "quantity": [10]})
+        run_sweep(create_session, grid, self.config, max_workers=4)
+        # Ogni backtest conserva il proprio log dei trade completo
+        for i, params in enumerate(grid):
+            output_dir = os.path.join(self.csv_dir, "sweep_%04d" % i)
+            logs = [
+                name for name in os.listdir(output_dir)
+                if name.startswith("tradelog_")
+            ]
+            self.assertEqual(len(logs), 1)
+            trades = read_trade_log(os.path.join(output_dir, logs[0]))
+            self.assertEqual(len(trades), 1)
+            self.assertEqual(
+                trades["timestamp"].iloc[0],
+                pd.Timestamp("2016-01-%02d" % (params["entry_bar"] + 4))
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from datatrader import settings
+from datatrader.compat import queue
+from datatrader.portfolio import Portfolio
+from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
+from datatrader.price_parser import PriceParser
+from datatrader.statistics.base import load
+from datatrader.statistics.report import render_tearsheets
+from datatrader.statistics.tearsheet import TearsheetStatistics
+
+from test_portfolio import PriceHandlerMock
+
+
+class PortfolioHandlerMock(object):
+    def __init__(self, portfolio):
+        self.portfolio = portfolio
+        self.price_handler = portfolio.price_handler
+
+
+class LastClosePriceHandler(object):
+    """
+    Espone solo get_last_close, senza le colonne delle barre.
+    """
+    def __init__(self, price_handler):
+        self.price_handler = price_handler
+
+    def get_last_close(self, ticker):
+        return self.price_handler.get_last_close(ticker)
+
+
+class TestTearsheetBenchmark(unittest.TestCase):
+    """
+    Verifica che la chiusura del benchmark ricavata dalle colonne
+    del gestore dei prezzi coincida con quella letta ad ogni update.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        dates = pd.bdate_range("2018-01-01", periods=40)
+        rng = np.random.RandomState(3)
+        # Il benchmark non ha tutte le barre degli altri ticker
+        for ticker, rows in (
+            ("AAA", dates), ("BBB", dates[5:]), ("SPY", dates[::3])
+        ):
+            closes = 100.0 + rng.normal(0, 1, len(rows)).cumsum()
+            with open(os.path.join(self.tmp_dir, ticker + ".csv"), "w") as fd:
+                fd.write("Date,Open,High,Low,Close,Adj Close,Volume\n")
+                for date, close in zip(rows, closes):
+                    fd.write("%s,%.2f,%.2f,%.2f,%.2f,%.2f,1000\n" % (
+                        date.strftime("%Y-%m-%d"), close, close, close,
+                        close, close
+                    ))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_benchmark_series(self):
+        events_queue = queue.Queue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.tmp_dir, events_queue, ["AAA", "BBB", "SPY"],
+            start_date=pd.Timestamp("2018-01-05")
+        )
+        tearsheets = []
+        for handler in (price_handler, LastClosePriceHandler(price_handler)):
+            portfolio = Portfolio(handler, PriceParser.parse(100000.00))
+            tearsheets.append(TearsheetStatistics(
+                settings.TEST, PortfolioHandlerMock(portfolio),
+                title=["Benchmark"], benchmark="SPY"
+            ))
+        self.assertIsNotNone(tearsheets[0].benchmark_columns)
+        self.assertIsNone(tearsheets[1].benchmark_columns)
+        while True:
+            price_handler.stream_next()
+            if not price_handler.continue_backtest:
+                break
+            event = events_queue.get(False)
+            for tearsheet in tearsheets:
+                tearsheet.update(event.time, tearsheet.portfolio_handler)
+        batched, updated = [
+            tearsheet._equity_series("benchmark") for tearsheet in tearsheets
+        ]
+        self.assertEqual(len(batched), 36)
+        pd.testing.assert_series_equal(batched, updated)
+
+
+class TestTearsheetReport(unittest.TestCase):
+    """
+    Verifica il salvataggio del Tearsheet senza display (immagine,
+    JSON, HTML e pickle), anche in parallelo, e che i risultati
+    siano calcolati una sola volta dopo l'ultimo aggiornamento.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config = settings.TEST
+        portfolio = Portfolio(PriceHandlerMock(), PriceParser.parse(100000.00))
+        self.portfolio_handler = PortfolioHandlerMock(portfolio)
+        self.tearsheet = TearsheetStatistics(
+            self.config, self.portfolio_handler,
+            title=["Test", "Tearsheet"], rolling_sharpe=True
+        )
+        rng = np.random.RandomState(5)
+        for i, timestamp in enumerate(pd.bdate_range("2018-01-01", periods=600)):
+            portfolio.equity = PriceParser.parse(
+                100000.00 * (1.0 + 0.1 * np.sin(i / 50.0)) + rng.normal(0, 100)
+            )
+            self.tearsheet.update(timestamp, self.portfolio_handler)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def test_cached_results(self):
+        results = self.tearsheet.get_results()
+        self.assertIs(self.tearsheet.get_results(), results)
+        self.tearsheet.update(pd.Timestamp("2021-01-01"), self.portfolio_handler)
+        self.assertIsNot(self.tearsheet.get_results(), results)
+
+    def test_save(self):
+        figures = plt.get_fignums()
+        self.tearsheet.save(self._path("tearsheet.png"))
+        with open(self._path("tearsheet.png"), "rb") as fd:
+            self.assertEqual(fd.read(8), b"\x89PNG\r\n\x1a\n")
+        # Nessuna figura registrata in pyplot
+        self.assertEqual(plt.get_fignums(), figures)
+
+        results = self.tearsheet.get_results()
+        self.tearsheet.save(self._path("tearsheet.json"))
+        with open(self._path("tearsheet.json")) as fd:
+            exported = json.load(fd)
+        self.assertAlmostEqual(exported["sharpe"], results["sharpe"])
+        self.assertEqual(
+            exported["max_drawdown_duration"], results["max_drawdown_duration"]
+        )
+        self.assertEqual(len(exported["equity"]["values"]), 600)
+        # La Sharpe mobile inizia con NaN, esportati come null
+        self.assertIsNone(exported["rolling_sharpe"]["values"][0])
+
+        self.tearsheet.save(self._path("tearsheet.html"))
+        with open(self._path("tearsheet.html")) as fd:
+            page = fd.read()
+        self.assertIn("Test<br>Tearsheet", page)
+        self.assertIn("max_drawdown_duration", page)
+        self.assertIn("Worst Drawdowns", page)
+
+        self.tearsheet.save(self._path("tearsheet.pkl"))
+        stats = load(self._path("tearsheet.pkl"))
+        self.assertIsNone(stats.portfolio_handler)
+        self.assertEqual(stats.get_results()["sharpe"], results["sharpe"])
+
+    def test_annualisation(self):
+        self.assertEqual(self.tearsheet.get_results()["periods"], 252)
+        # Barre orarie: la curva ricampionata torna giornaliera
+        self.tearsheet.set_bar_period(3600)
+        self.tearsheet.update(pd.Timestamp("2021-01-01"), self.portfolio_handler)
+        self.assertEqual(self.tearsheet.get_results()["periods"], 252 * 6.5)
+        self.tearsheet.resample = "D"
+        self.tearsheet.update(pd.Timestamp("2021-01-04"), self.portfolio_handler)
+        self.assertEqual(self.tearsheet.get_results()["periods"], 252)
+
+    def test_render_tearsheets(self):
+        filenames = [self._path("a.png"), self._path("b.json")]
+        saved = render_tearsheets(
+            [self.tearsheet, self.tearsheet], filenames, max_workers=2
+        )
+        self.assertEqual(saved, filenames)
+        for filename in filenames:
+            self.assertGreater(os.path.getsize(filename), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
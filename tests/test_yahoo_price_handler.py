@@ -0,0 +1,238 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from datatrader.price_parser import PriceParser
+from datatrader.price_handler.columnar import TickColumns, merge_streams
+from datatrader.price_handler.yahoo_daily_csv_bar import YahooDailyCsvBarPriceHandler
+from datatrader.compat import queue
+
+
+CSV_HEADER = "Date,Open,High,Low,Close,Adj Close,Volume\n"
+
+CSV_DATA = {
+    "BBB": [
+        "2016-01-04,10.50,11.00,10.25,10.75,10.70,1000",
+        "2016-01-05,10.75,11.25,10.50,11.00,10.95,2000",
+        "2016-01-06,11.00,11.50,10.75,11.25,11.20,3000",
+    ],
+    "AAA": [
+        "2016-01-04,100.10,101.20,99.30,100.40,90.50,5000",
+        "2016-01-06,100.40,102.00,100.00,101.60,91.55,6000",
+    ],
+}
+
+
+class TestYahooDailyCsvBarPriceHandler(unittest.TestCase):
+    """
+    Verifica che la riproduzione colonnare delle barre giornaliere
+    produca i BarEvent nell'ordine (timestamp, ticker) con i prezzi
+    correttamente convertiti da PriceParser.
+    """
+    def setUp(self):
+        """
+        Crea una directory temporanea con due piccoli file CSV.
+        """
+        self.csv_dir = tempfile.mkdtemp()
+        for ticker, rows in CSV_DATA.items():
+            with open(os.path.join(self.csv_dir, "%s.csv" % ticker), "w") as fd:
+                fd.write(CSV_HEADER)
+                fd.write("\n".join(rows) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.csv_dir)
+
+    def _stream_all(self, price_handler, events_queue):
+        events = []
+        while price_handler.continue_backtest:
+            price_handler.stream_next()
+        while not events_queue.empty():
+            events.append(events_queue.get())
+        return events
+
+    def test_stream_all_bars(self):
+        """
+        Verifica l'ordine deterministico degli eventi e
+        i valori di ogni BarEvent trasmesso.
+        """
+        events_queue = queue.Queue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.csv_dir, events_queue, ["BBB", "AAA"]
+        )
+        events = self._stream_all(price_handler, events_queue)
+        self.assertEqual(
+            [(e.time.strftime("%Y-%m-%d"), e.ticker) for e in events],
+            [
+                ("2016-01-04", "AAA"), ("2016-01-04", "BBB"),
+                ("2016-01-05", "BBB"),
+                ("2016-01-06", "AAA"), ("2016-01-06", "BBB"),
+            ]
+        )
+        first = events[0]
+        self.assertEqual(first.period, 86400)
+        self.assertEqual(first.open_price, PriceParser.parse(100.10))
+        self.assertEqual(first.high_price, PriceParser.parse(101.20))
+        self.assertEqual(first.low_price, PriceParser.parse(99.30))
+        self.assertEqual(first.close_price, PriceParser.parse(100.40))
+        self.assertEqual(first.adj_close_price, PriceParser.parse(90.50))
+        self.assertEqual(first.volume, 5000)
+        self.assertIsInstance(first.close_price, int)
+        self.assertIsInstance(first.volume, int)
+        self.assertEqual(
+            price_handler.get_last_close("AAA"), PriceParser.parse(101.60)
+        )
+        self.assertEqual(
+            price_handler.get_last_close("BBB"), PriceParser.parse(11.25)
+        )
+
+    def test_descending_csv(self):
+        """
+        Verifica che un CSV in ordine decrescente venga trasmesso in
+        ordine cronologico e che i prezzi iniziali siano quelli della
+        prima barra, non della prima riga del file.
+        """
+        with open(os.path.join(self.csv_dir, "CCC.csv"), "w") as fd:
+            fd.write(CSV_HEADER)
+            fd.write("\n".join(reversed(CSV_DATA["BBB"])) + "\n")
+        events_queue = queue.Queue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.csv_dir, events_queue, ["CCC"]
+        )
+        self.assertEqual(
+            price_handler.get_last_close("CCC"), PriceParser.parse(10.75)
+        )
+        self.assertEqual(
+            str(price_handler.get_last_timestamp("CCC").date()), "2016-01-04"
+        )
+        events = self._stream_all(price_handler, events_queue)
+        self.assertEqual(
+            [PriceParser.display(event.close_price) for event in events],
+            [10.75, 11.0, 11.25]
+        )
+
+    def test_exact_prices(self):
+        """
+        Con exact_prices i prezzi coincidono con la conversione
+        esatta delle stringhe del CSV.
+        """
+        events_queue = queue.Queue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.csv_dir, events_queue, ["BBB", "AAA"], exact_prices=True
+        )
+        events = self._stream_all(price_handler, events_queue)
+        for event in events:
+            date = event.time.strftime("%Y-%m-%d")
+            row = [
+                r for r in CSV_DATA[event.ticker] if r.startswith(date)
+            ][0].split(",")
+            self.assertEqual(
+                [
+                    event.open_price, event.high_price, event.low_price,
+                    event.close_price, event.adj_close_price
+                ],
+                [PriceParser.parse_decimal(x) for x in row[1:6]]
+            )
+
+    def test_start_end_dates(self):
+        """
+        Verifica che vengano trasmesse solo le barre comprese
+        tra start_date (inclusa) ed end_date (esclusa).
+        """
+        events_queue = queue.Queue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.csv_dir, events_queue, ["AAA", "BBB"],
+            start_date=datetime.datetime(2016, 1, 5),
+            end_date=datetime.datetime(2016, 1, 6)
+        )
+        events = self._stream_all(price_handler, events_queue)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].ticker, "BBB")
+        self.assertEqual(events[0].volume, 2000)
+
+    def test_bar_slices(self):
+        """
+        Verifica che in modalità bar_slices venga trasmesso un
+        BarSliceEvent per timestamp, con gli stessi valori dei
+        singoli BarEvent.
+        """
+        events_queue = queue.Queue()
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.csv_dir, events_queue, ["BBB", "AAA"]
+        )
+        bars = self._stream_all(price_handler, events_queue)
+        price_handler = YahooDailyCsvBarPriceHandler(
+            self.csv_dir, events_queue, ["BBB", "AAA"], bar_slices=True
+        )
+        slices = self._stream_all(price_handler, events_queue)
+        self.assertEqual(
+            [(s.time.strftime("%Y-%m-%d"), s.tickers) for s in slices],
+            [
+                ("2016-01-04", ["AAA", "BBB"]), ("2016-01-05", ["BBB"]),
+                ("2016-01-06", ["AAA", "BBB"]),
+            ]
+        )
+        self.assertEqual(
+            [str(bev) for s in slices for bev in s.bars()],
+            [str(bev) for bev in bars]
+        )
+        self.assertEqual(slices[0].volume.tolist(), [5000, 1000])
+        prices = slices[1].prices(["AAA", "BBB"], field="close_price")
+        self.assertTrue(np.isnan(prices[0]))
+        self.assertEqual(prices[1], 11.0)
+        self.assertEqual(
+            price_handler.get_last_close("AAA"), PriceParser.parse(101.60)
+        )
+        self.assertIsInstance(price_handler.get_last_close("AAA"), int)
+
+
+class TestMergeStreams(unittest.TestCase):
+    """
+    Verifica che l'unione tramite heap di più flussi ordinati
+    restituisca le righe nell'ordine (timestamp, ticker).
+    """
+    def _columns(self, ticker, days):
+        times = np.array(
+            ["2016-01-%02d" % day for day in days], dtype="datetime64[ns]"
+        )
+        prices = np.arange(len(days), dtype=np.int64)
+        return TickColumns(ticker, times, prices, prices)
+
+    def test_interleave_with_ties(self):
+        streams = [
+            self._columns("CCC", [1, 3, 5]),
+            self._columns("AAA", [2, 3]),
+            self._columns("BBB", []),
+            self._columns("DDD", [1, 6]),
+        ]
+        merged = [
+            (columns.ticker, columns.timestamp(i).day)
+            for columns, i in merge_streams(streams)
+        ]
+        self.assertEqual(
+            merged, [
+                ("CCC", 1), ("DDD", 1), ("AAA", 2), ("AAA", 3),
+                ("CCC", 3), ("CCC", 5), ("DDD", 6),
+            ]
+        )
+
+    def test_start_end_dates(self):
+        streams = [
+            self._columns("AAA", [1, 2, 3, 4]),
+            self._columns("BBB", [2, 4]),
+        ]
+        merged = [
+            (columns.ticker, columns.timestamp(i).day)
+            for columns, i in merge_streams(
+                streams, datetime.datetime(2016, 1, 2),
+                datetime.datetime(2016, 1, 4)
+            )
+        ]
+        self.assertEqual(merged, [("AAA", 2), ("BBB", 2), ("AAA", 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()